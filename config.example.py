@@ -8,11 +8,19 @@ API_TOKEN = "your_api_token_here"       # 替换为你的 API Token
 CONCURRENCY = 10          # 并发数（推荐 10）
 REQUEST_TIMEOUT = 60.0    # 请求超时时间（秒）
 RETRY_DELAY = 1.0         # 重试延迟（秒）
+MAX_RPS = None            # 每秒最多请求数（None 表示不限流）
+SHARDS = 1                # 分片进程数（>1 时多进程爬取并自动合并）
+BUDGET = None             # 每次运行的费用预算（美元，约 $0.001 / 请求），None 表示不限
+BUDGET_MODE = "stop"      # "stop" 达到预算后停止 / "slow" 接近预算时降速
 
 # 文件路径配置
 INPUT_USER_LIST = "data/users.txt"       # 输入用户列表
 OUTPUT_CSV = "output/users.csv"           # 输出 CSV 文件
 LOG_FILE = "logs/scrape.log"              # 日志文件
+SNAPSHOT_DIR = None                       # 快照库目录，例如 "snapshots"
+AVATAR_DIR = None                         # 头像库目录，例如 "avatars"
+NEGATIVE_CACHE = None                     # 失效账号缓存（None 时使用输出目录下的 negative_cache.db）
+IDENTITY_DB = None                        # 身份索引，例如 "output/identity.db"（合并 / 对比 / 分析按实体去重）
 
 # 数据库配置（可选）
 # DATABASE_URL = "sqlite:///data/users.db"
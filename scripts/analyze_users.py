@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+用户数据分析 - 对合并后的 CSV（merged_all_users.csv）做向量化统计
+
+    - 数值列（粉丝、关注、获赞、作品、可见视频）加载为 NumPy 数组
+    - 分布统计：均值、标准差、分位数、数量级直方图
+    - 衍生指标：每个作品平均获赞、粉丝/关注比
+    - 按 category / verified / account_type 分组统计（bincount + lexsort，无逐行 Python 循环）
+
+指定身份索引（identity.py build 事先建立，只读打开）时，同一实体（改名前后的同一账号）
+只统计 scrape_time 最新的一行。
+输入也可以是分片数据集目录（sharded_output.py），各分片在子进程中并行加载后拼接。
+
+用法:
+    python3 analyze_users.py output/merged_all_users.csv [report.json] [identity.db]
+"""
+
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from compressed_io import open_text
+from sharded_output import dataset_files, is_dataset, map_shards
+
+NUMERIC_FIELDS = [
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count'
+]
+
+GROUP_FIELDS = ['category', 'verified', 'account_type']
+
+PERCENTILES = [50, 75, 90, 95, 99, 99.9]
+
+
+def load_dataset(csv_path: str, success_only: bool = True, identity_db: str = None) -> dict:
+    """
+    读取 CSV，数值列转为 int64 数组，分组列转为整数编码
+
+    identity_db 不为 None 时按规范实体去重。csv_path 为分片数据集时并行加载各分片
+    （按实体去重需要全局状态，此时依次读取）。
+
+    Returns:
+        {
+            'size': 行数,
+            'numeric': {字段: np.ndarray[int64]},
+            'groups': {字段: (codes: np.ndarray[int32], labels: list)}
+        }
+    """
+    if is_dataset(csv_path) and not identity_db:
+        return concat_datasets(list(map_shards(_load_shard, [(path, success_only) for path in dataset_files(csv_path)])))
+
+    numeric = {field: [] for field in NUMERIC_FIELDS}
+    group_codes = {field: [] for field in GROUP_FIELDS}
+    group_labels = {field: {} for field in GROUP_FIELDS}
+
+    def add(numeric_values: list, group_values: list):
+        for field, value in zip(NUMERIC_FIELDS, numeric_values):
+            numeric[field].append(value or '0')
+        for field, label in zip(GROUP_FIELDS, group_values):
+            labels = group_labels[field]
+            code = labels.get(label)
+            if code is None:
+                code = labels[label] = len(labels)
+            group_codes[field].append(code)
+
+    identity = None
+    # 实体 → (scrape_time, 数值列, 分组列)，每个实体只保留最新的一行
+    latest = {}
+    if identity_db:
+        from identity import IdentityIndex
+        identity = IdentityIndex(identity_db, read_only=True)
+
+    for path in dataset_files(csv_path):
+        with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            status_index = header.index('scrape_status')
+            time_index = header.index('scrape_time')
+            numeric_columns = [header.index(field) for field in NUMERIC_FIELDS]
+            group_columns = [header.index(field) for field in GROUP_FIELDS]
+            identity_columns = [header.index(field) for field in ('uid', 'sec_uid', 'unique_id', 'username')]
+
+            for row in reader:
+                if success_only and row[status_index] != 'success':
+                    continue
+                numeric_values = [row[i] for i in numeric_columns]
+                group_values = [row[i] for i in group_columns]
+                if identity is None:
+                    add(numeric_values, group_values)
+                    continue
+                # 合并结果按用户名排序，改名前的旧行可能先出现，按 scrape_time 保留最新的一行
+                entity = identity.entity_of(*(row[i] for i in identity_columns))
+                current = latest.get(entity)
+                if current is None or row[time_index] >= current[0]:
+                    latest[entity] = (row[time_index], numeric_values, group_values)
+
+    if identity is not None:
+        identity.close()
+        for _, numeric_values, group_values in latest.values():
+            add(numeric_values, group_values)
+
+    return {
+        'size': len(numeric[NUMERIC_FIELDS[0]]),
+        # 一次性把字符串列表转换为 int64，避免逐行 int()
+        'numeric': {
+            field: np.array(values, dtype=np.str_).astype(np.int64) if values else np.zeros(0, np.int64)
+            for field, values in numeric.items()
+        },
+        'groups': {
+            field: (np.array(group_codes[field], dtype=np.int32), list(group_labels[field]))
+            for field in GROUP_FIELDS
+        }
+    }
+
+
+def _load_shard(args) -> dict:
+    path, success_only = args
+    return load_dataset(path, success_only)
+
+
+def concat_datasets(parts: list) -> dict:
+    """拼接多个分片的 load_dataset 结果（分组编码按合并后的标签表重新映射）"""
+    groups = {}
+    for field in GROUP_FIELDS:
+        labels = {}
+        codes = []
+        for part in parts:
+            part_codes, part_labels = part['groups'][field]
+            remap = np.array([labels.setdefault(label, len(labels)) for label in part_labels], dtype=np.int32)
+            codes.append(remap[part_codes] if len(part_codes) else part_codes)
+        groups[field] = (np.concatenate(codes) if codes else np.zeros(0, np.int32), list(labels))
+
+    return {
+        'size': sum(part['size'] for part in parts),
+        'numeric': {
+            field: np.concatenate([part['numeric'][field] for part in parts]) if parts else np.zeros(0, np.int64)
+            for field in NUMERIC_FIELDS
+        },
+        'groups': groups
+    }
+
+
+def distribution(values: np.ndarray) -> dict:
+    """单列分布统计"""
+    if values.size == 0:
+        return {'count': 0}
+
+    percentiles = np.percentile(values, PERCENTILES)
+    # 数量级直方图: <1, 1-10, 10-100, 100-1000, ...
+    magnitude = np.zeros(values.shape, dtype=np.int64)
+    at_least_one = values >= 1
+    magnitude[at_least_one] = np.floor(np.log10(values[at_least_one])).astype(np.int64) + 1
+    counts = np.bincount(magnitude)
+
+    return {
+        'count': int(values.size),
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'percentiles': {f"p{p:g}": float(v) for p, v in zip(PERCENTILES, percentiles)},
+        'magnitude_histogram': {
+            ('<1' if m == 0 else f"1e{m - 1}-1e{m}"): int(c) for m, c in enumerate(counts) if c
+        }
+    }
+
+
+def safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """逐元素相除，只保留分母大于 0 的元素"""
+    mask = denominator > 0
+    return numerator[mask] / denominator[mask]
+
+
+def group_stats(codes: np.ndarray, labels: list, values: np.ndarray, value_order: np.ndarray = None) -> dict:
+    """
+    按分组编码统计数量、总和、均值和中位数
+
+    Args:
+        codes: 分组编码
+        labels: 编码对应的分组名
+        values: 被统计的数值列
+        value_order: np.argsort(values) 的结果（多个分组字段共用时传入，避免重复排序）
+    """
+    group_count = len(labels)
+    counts = np.bincount(codes, minlength=group_count)
+    sums = np.bincount(codes, weights=values, minlength=group_count)
+
+    # 组内中位数：值已排序的顺序上再按组编码稳定排序（整数基数排序），得到 (组, 值) 顺序
+    if value_order is None:
+        value_order = np.argsort(values, kind='stable')
+    order = value_order[np.argsort(codes[value_order], kind='stable')]
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    nonempty = counts > 0
+    lower = sorted_values[(starts + (counts - 1) // 2)[nonempty]]
+    upper = sorted_values[(starts + counts // 2)[nonempty]]
+    medians = np.zeros(group_count)
+    medians[nonempty] = (lower + upper) / 2
+
+    return {
+        (labels[i] or '(空)'): {
+            'count': int(counts[i]),
+            'sum': float(sums[i]),
+            'mean': float(sums[i] / counts[i]),
+            'median': float(medians[i])
+        }
+        for i in np.argsort(-counts) if counts[i]
+    }
+
+
+def build_report(dataset: dict) -> dict:
+    """生成完整分析报告"""
+    numeric = dataset['numeric']
+    followers = numeric['follower_count']
+
+    report = {
+        'users': dataset['size'],
+        'distributions': {field: distribution(values) for field, values in numeric.items()},
+        'likes_per_video': distribution(
+            safe_ratio(numeric['total_favorited'].astype(np.float64), numeric['aweme_count'])
+        ),
+        'follower_following_ratio': distribution(
+            safe_ratio(followers.astype(np.float64), numeric['following_count'])
+        ),
+        'groups': {}
+    }
+
+    follower_order = np.argsort(followers, kind='stable')
+    for field, (codes, labels) in dataset['groups'].items():
+        report['groups'][field] = group_stats(codes, labels, followers, follower_order)
+
+    return report
+
+
+def print_report(report: dict, top_groups: int = 10):
+    """打印报告摘要"""
+    print("="*60)
+    print(f"用户数据分析（{report['users']:,} 个成功用户）")
+    print("="*60)
+
+    rows = list(report['distributions'].items()) + [
+        ('likes_per_video', report['likes_per_video']),
+        ('follower_following_ratio', report['follower_following_ratio'])
+    ]
+    print(f"{'字段':<26}{'均值':>14}{'中位数':>14}{'p90':>14}{'p99':>14}")
+    for field, stats in rows:
+        if not stats['count']:
+            continue
+        p = stats['percentiles']
+        print(f"{field:<26}{stats['mean']:>14,.1f}{p['p50']:>14,.1f}{p['p90']:>14,.1f}{p['p99']:>14,.1f}")
+
+    for field, groups in report['groups'].items():
+        print()
+        print(f"按 {field} 分组（粉丝数）:")
+        for label, stats in list(groups.items())[:top_groups]:
+            print(f"  {label:<24}{stats['count']:>8,} 人  平均 {stats['mean']:>14,.0f}  中位数 {stats['median']:>12,.0f}")
+
+    print("="*60)
+
+
+def analyze(csv_path: str, json_output: str = None, identity_db: str = None) -> dict:
+    """加载 CSV、生成报告、打印并可选保存为 JSON"""
+    started = time.perf_counter()
+    dataset = load_dataset(csv_path, identity_db=identity_db)
+    loaded = time.perf_counter()
+    report = build_report(dataset)
+    finished = time.perf_counter()
+
+    print_report(report)
+    print(f"加载: {loaded - started:.2f} 秒, 计算: {(finished - loaded)*1000:.1f} ms")
+
+    if json_output:
+        Path(json_output).parent.mkdir(parents=True, exist_ok=True)
+        with open(json_output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✓ 报告已保存到: {json_output}")
+
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法: python3 analyze_users.py <merged_all_users.csv> [report.json] [identity.db]")
+        sys.exit(1)
+
+    analyze(
+        sys.argv[1],
+        sys.argv[2] if len(sys.argv) > 2 else None,
+        sys.argv[3] if len(sys.argv) > 3 else None
+    )
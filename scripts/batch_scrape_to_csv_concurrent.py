@@ -4,23 +4,40 @@
 """
 
 import asyncio
-import csv
-import re
-from datetime import datetime
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from compressed_io import compression_of, output_path as resolve_output_path, strip_compression
+from cost_ledger import BudgetExceeded
+from list_reader import ListCheckpoint, OffsetTracker, read_usernames
+from scheduler import PriorityScheduler, load_priors, load_tiers, make_score
+from records import UserRecord, read_records
+from result_writer import ResultWriter
 from scrape_user_tikhub import TikHubUserScraper
+from sharded_output import hash_partition, is_dataset_output, part_name, write_manifest
+from shutdown import DEFAULT_GRACE_PERIOD, GracefulShutdown
+from sketches import LiveStats, stats_path_for
+import runtime
 
 
-async def extract_username_from_url(url: str) -> str:
-    """从 TikTok URL 中提取用户名"""
-    url = url.strip()
-    match = re.search(r'@([a-zA-Z0-9_\.]+)', url)
-    if match:
-        return match.group(1)
-    return None
+# 每完成多少个用户打印并保存一次实时统计
+STATS_EVERY = 500
 
 
-async def scrape_single_user(scraper, username: str, index: int, total: int) -> dict:
+def shard_of(username: str, shard_count: int) -> int:
+    """按用户名哈希分片（crc32 在各进程间稳定，不受 PYTHONHASHSEED 影响）"""
+    return hash_partition(username, shard_count)
+
+
+def shard_cassette(cassette_path: str, shard_index: int) -> str:
+    """分片各自录制的 cassette: cassettes/nova01.jsonl.gz → cassettes/nova01.shard00.jsonl.gz"""
+    path = Path(cassette_path)
+    stem, dot, suffixes = path.name.partition('.')
+    return str(path.with_name(f"{stem}.shard{shard_index:02d}{dot}{suffixes}"))
+
+
+async def scrape_single_user(scraper, username: str, index: int, total: int) -> UserRecord:
     """爬取单个用户"""
     print(f"[{index}/{total}] 正在爬取: @{username}")
 
@@ -28,54 +45,24 @@ async def scrape_single_user(scraper, username: str, index: int, total: int) ->
         result = await scraper.fetch_user_profile(unique_id=username)
 
         if result and result.get('code') == 200:
-            user_data = result.get('data', {}).get('user', {})
-
-            row = {
-                'username': username,
-                'unique_id': user_data.get('unique_id', ''),
-                'nickname': user_data.get('nickname', ''),
-                'uid': user_data.get('uid', ''),
-                'sec_uid': user_data.get('sec_uid', ''),
-                'signature': user_data.get('signature', '').replace('\n', ' '),
-                'follower_count': user_data.get('follower_count', 0),
-                'following_count': user_data.get('following_count', 0),
-                'total_favorited': user_data.get('total_favorited', 0),
-                'aweme_count': user_data.get('aweme_count', 0),
-                'visible_videos_count': user_data.get('visible_videos_count', 0),
-                'verification_type': user_data.get('verification_type', 0),
-                'verified': 'Yes' if user_data.get('verification_type', 0) > 0 else 'No',
-                'bio_email': user_data.get('bio_email', ''),
-                'category': user_data.get('category', ''),
-                'account_type': user_data.get('account_type', 0),
-                'avatar_larger_url': user_data.get('avatar_larger', {}).get('url_list', [''])[0],
-                'profile_url': f"https://www.tiktok.com/@{username}",
-                'scrape_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'scrape_status': 'success',
-                'error_message': ''
-            }
-
-            print(f"  ✓ 成功 - 粉丝: {row['follower_count']:,}, 视频: {row['aweme_count']}")
+            row = UserRecord.from_profile(username, result.get('data', {}).get('user', {}))
+            print(f"  ✓ 成功 - 粉丝: {row.follower_count:,}, 视频: {row.aweme_count}")
             return row
 
         else:
-            row = {
-                'username': username,
-                'scrape_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'scrape_status': 'failed',
-                'error_message': result.get('message', 'Unknown error') if result else 'No response'
-            }
-            print(f"  ✗ 失败 - {row['error_message']}")
+            row = UserRecord.failure(
+                username,
+                'failed',
+                result.get('message', 'Unknown error') if result else 'No response'
+            )
+            print(f"  ✗ 失败 - {row.error_message}")
             return row
 
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"  ✗ 异常 - {str(e)}")
-        row = {
-            'username': username,
-            'scrape_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'scrape_status': 'error',
-            'error_message': str(e)
-        }
-        return row
+        return UserRecord.failure(username, 'error', str(e))
 
 
 async def scrape_users_to_csv_concurrent(
@@ -84,7 +71,24 @@ async def scrape_users_to_csv_concurrent(
     api_token: str,
     api_base_url: str = "https://api.tikhub.io",
     max_users: int = None,
-    concurrency: int = 20
+    concurrency: int = 20,
+    transport=None,
+    record_cassette: str = None,
+    max_rps: float = None,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    snapshot_dir: str = None,
+    avatar_dir: str = None,
+    avatar_concurrency: int = 20,
+    priority_csvs: list = None,
+    tiers_file: str = None,
+    time_budget: float = None,
+    budget: float = None,
+    budget_mode: str = 'stop',
+    ledger_file: str = None,
+    negative_cache: str = None,
+    grace_period: float = DEFAULT_GRACE_PERIOD,
+    resume: bool = False
 ):
     """
     批量爬取用户并保存为 CSV - 使用并发
@@ -96,31 +100,66 @@ async def scrape_users_to_csv_concurrent(
         api_base_url: API 基础 URL
         max_users: 最大爬取用户数（None 表示全部）
         concurrency: 并发数（同时进行的请求数）
+        transport: 自定义 httpx 传输层（例如 cassette.ReplayTransport 离线回放）
+        record_cassette: 录制请求/响应到该 cassette 文件（None 表示不录制）
+        max_rps: 每秒最多请求数（None 表示不限流）
+        shard_index: 当前分片编号（多进程分片模式使用）
+        shard_count: 分片总数（1 表示不分片）
+        snapshot_dir: 快照库目录，爬取完成后把计数追加为一份时间序列快照（None 表示不保存）
+        avatar_dir: 头像库目录，爬取完成后在共享连接池上下载头像（None 表示不下载）
+        avatar_concurrency: 头像同时下载数
+        priority_csvs: 以前的结果 CSV，按其中的粉丝数和更新时间确定爬取顺序（None 表示按列表顺序）
+        tiers_file: 分级文件（每行 "用户名,等级"），等级高的用户优先爬取（与 priority_csvs 可同时使用）
+        time_budget: 时间预算（秒），到时后不再分发新任务，未爬取的用户保存到 <output_csv>.remaining.txt
+        budget: 费用预算（美元），用完后不再分发新任务，未爬取的用户同样保存到 remaining 文件
+        budget_mode: 'stop' 达到预算后停止 / 'slow' 接近预算时降速
+        ledger_file: 费用账本（默认输出目录下的 cost_ledger.json）
+        negative_cache: 失效账号缓存（默认输出目录下的 negative_cache.db），有效期内的已删除 / 封禁 / 私密账号不再请求
+        grace_period: Ctrl+C / SIGTERM 后等待进行中请求的时间（秒），之后保存已完成的结果，
+            未爬取的用户保存到 remaining 文件
+        resume: 从上次中断处继续（按 <output_csv>.checkpoint.json 中的字节偏移跳过已处理的行，
+            结果追加到已有的 CSV）
     """
     print("="*60)
     print("批量爬取 TikTok 用户资料并保存为 CSV - 并发版本")
     print("="*60)
     print()
 
-    # 读取用户列表
-    print(f"读取用户列表: {user_list_file}")
-    with open(user_list_file, 'r', encoding='utf-8') as f:
-        urls = [line.strip() for line in f if line.strip()]
+    csv_file = resolve_output_path(output_csv)
+    csv_file.parent.mkdir(parents=True, exist_ok=True)
 
-    # 提取用户名
-    usernames = []
-    for url in urls:
-        username = await extract_username_from_url(url)
-        if username:
-            usernames.append(username)
+    # 列表处理进度：此偏移之前的行都已爬取并写入 CSV
+    checkpoint = ListCheckpoint(csv_file.with_name(csv_file.name + '.checkpoint.json'), user_list_file)
+    start_offset = checkpoint.load() if resume else 0
+
+    # 读取用户列表（大文件按块并行解析），记录每个用户所在行的结束偏移
+    print(f"读取用户列表: {user_list_file}")
+    usernames, offsets = read_usernames(user_list_file, start=start_offset)
+    if start_offset:
+        print(f"✓ 从检查点继续: 跳过前 {start_offset:,} 字节")
 
     print(f"✓ 找到 {len(usernames)} 个用户")
 
-    # 限制爬取数量
+    # 限制爬取数量（按输入行计算）
     if max_users:
-        usernames = usernames[:max_users]
+        usernames, offsets = usernames[:max_users], offsets[:max_users]
         print(f"✓ 限制爬取前 {max_users} 个用户")
 
+    # 重复用户（不区分大小写）只请求一次，结果按出现次数写入，输出仍是每个输入行一行
+    line_end = {}
+    copies = Counter()
+    for username, offset in zip(usernames, offsets):
+        line_end.setdefault(username.lower(), (username, offset))
+        copies[username.lower()] += 1
+    if len(line_end) < len(usernames):
+        print(f"✓ {len(usernames) - len(line_end)} 个重复用户共用同一次请求的结果")
+    usernames = [username for username, _ in line_end.values()]
+
+    # 只保留属于当前分片的用户
+    if shard_count > 1:
+        usernames = [u for u in usernames if shard_of(u, shard_count) == shard_index]
+        print(f"✓ 分片 {shard_index + 1}/{shard_count}: {len(usernames)} 个用户")
+
     print(f"✓ 并发数: {concurrency} 个请求同时进行")
     print(f"✓ 预计速度: ~{concurrency} 请求/秒")
     print()
@@ -128,97 +167,358 @@ async def scrape_users_to_csv_concurrent(
     # 创建爬虫实例
     scraper = TikHubUserScraper(
         api_token=api_token,
-        base_url=api_base_url
+        base_url=api_base_url,
+        transport=transport,
+        record_to=record_cassette,
+        max_rps=max_rps,
+        max_connections=max(100, concurrency),
+        ledger_file=ledger_file or csv_file.with_name('cost_ledger.json'),
+        budget=budget,
+        budget_mode=budget_mode,
+        run_label=csv_file.name,
+        negative_cache=negative_cache or csv_file.with_name('negative_cache.db')
     )
+    usernames, dead = scraper.negative_cache.filter(usernames)
+    if dead:
+        print(f"⊘ 跳过 {len(dead)} 个失效账号（已删除 / 封禁 / 私密，有效期内不再请求）")
+    ledger = scraper.ledger
+    print(f"✓ 预计费用: ${ledger.estimate(len(usernames)):.2f}（{len(usernames):,} 次请求 × ${ledger.price_per_call}）")
+    if budget is not None:
+        print(f"✓ 费用预算: ${budget:.2f}（{'达到后停止' if budget_mode == 'stop' else '接近时降速，达到后停止'}）")
+        if ledger.max_calls < len(usernames):
+            print(f"⚠ 预算只够约 {ledger.max_calls:,} 个用户，其余用户将保存到 remaining 文件")
+    print()
 
-    # CSV 字段
-    csv_fields = [
-        'username',
-        'unique_id',
-        'nickname',
-        'uid',
-        'sec_uid',
-        'signature',
-        'follower_count',
-        'following_count',
-        'total_favorited',
-        'aweme_count',
-        'visible_videos_count',
-        'verification_type',
-        'verified',
-        'bio_email',
-        'category',
-        'account_type',
-        'avatar_larger_url',
-        'profile_url',
-        'scrape_time',
-        'scrape_status',
-        'error_message'
-    ]
-
-    # 创建 CSV 文件
-    csv_file = Path(output_csv)
-    csv_file.parent.mkdir(parents=True, exist_ok=True)
-
-    results = []
+    # 结果不在内存中保留，边完成边由后台线程写入 CSV（定期 fsync），中断或崩溃时已完成的结果不会丢失
+    writer = ResultWriter(csv_file, append=bool(start_offset))
 
     print("开始爬取...")
     print("-"*60)
 
-    # 使用 Semaphore 限制并发数
-    semaphore = asyncio.Semaphore(concurrency)
-
-    async def scrape_with_semaphore(username, index, total):
-        async with semaphore:
-            return await scrape_single_user(scraper, username, index, total)
-
-    # 创建所有任务
-    tasks = [
-        scrape_with_semaphore(username, i+1, len(usernames))
-        for i, username in enumerate(usernames)
-    ]
-
-    # 并发执行所有任务
-    results = await asyncio.gather(*tasks)
+    # 优先级调度：concurrency 个 worker 依次从调度器取分数最高的用户
+    tiers = load_tiers(tiers_file) if tiers_file else None
+    prioritized = bool(priority_csvs or tiers_file)
+    scheduler = PriorityScheduler(
+        score_fn=make_score(tiers=tiers) if prioritized else None,
+        priors=load_priors(priority_csvs) if priority_csvs else None,
+        deadline=time.monotonic() + time_budget if time_budget else None
+    )
+    scheduler.extend(usernames)
+    if priority_csvs:
+        print(f"✓ 按优先级爬取（参考 {len(scheduler.priors)} 个历史记录）")
+    if tiers:
+        print(f"✓ 按分级优先爬取（{len(tiers)} 个用户有等级）")
+    if time_budget:
+        print(f"✓ 时间预算: {time_budget:.0f} 秒")
+
+    # 实时统计（分位数草图 + 去重计数），定期保存到 <output_csv>.stats.json
+    stats_file = stats_path_for(csv_file)
+    live_stats = LiveStats.load(stats_file) if writer.append and stats_file.exists() else LiveStats()
+    total = len(usernames)
+    dispatched = 0
+
+    # 检查点只在按列表顺序分发时有效（优先级调度会打乱顺序）
+    tracker = None if prioritized else OffsetTracker(start_offset)
+
+    async def save_checkpoint(synced: bool = False):
+        """等待已完成的结果写入磁盘后再保存偏移，偏移之前的用户都已在 CSV 中"""
+        if tracker and tracker.watermark > start_offset:
+            watermark = tracker.watermark
+            if not synced:
+                await writer.sync()
+            checkpoint.save(watermark)
+
+    shutdown = GracefulShutdown(grace_period)
+    interrupted = 0
+    # 本次运行的结果计数（结束时的统计只用计数，不保留结果行）
+    counts = {'total': 0, 'success': 0}
+
+    async def worker():
+        nonlocal dispatched, interrupted
+        while not ledger.exhausted and not shutdown.requested:
+            username = scheduler.pop()
+            if username is None:
+                return
+            dispatched += 1
+            ticket = tracker.mark(line_end[username.lower()][1]) if tracker else None
+            try:
+                row = await scrape_single_user(scraper, username, dispatched, total)
+            except (BudgetExceeded, asyncio.CancelledError) as e:
+                # 请求没有发出或被中止，放回队列写入 remaining 文件
+                scheduler.push(username)
+                if isinstance(e, asyncio.CancelledError):
+                    interrupted += 1
+                    raise
+                return
+            for _ in range(copies[username.lower()]):
+                counts['total'] += 1
+                counts['success'] += row.get('scrape_status') == 'success'
+                await writer.put(row)
+            if ticket:
+                tracker.done(ticket)
+            live_stats.update(row)
+            if live_stats.total % STATS_EVERY == 0:
+                print(live_stats.format_summary())
+                live_stats.save(stats_file)
+                await save_checkpoint()
+
+    # 并发执行（Ctrl+C / SIGTERM 时停止分发，等待进行中的请求后照常保存结果）
+    try:
+        try:
+            with shutdown:
+                await shutdown.gather(*(worker() for _ in range(min(concurrency, max(1, total)))))
+        finally:
+            await writer.aclose()
+            await save_checkpoint(synced=True)
+        if avatar_dir and not shutdown.requested:
+            from download_avatars import download_avatars
+            print("-"*60)
+            # 头像 URL 从刚写完的 CSV 中流式读取（签名 URL 尚未过期，已下载的头像跳过）
+            await download_avatars(read_records(csv_file), avatar_dir, client=scraper.client, concurrency=avatar_concurrency)
+    finally:
+        await scraper.aclose()
 
     print("-"*60)
     print()
 
-    # 写入 CSV
-    print(f"写入 CSV 文件: {csv_file}")
-    with open(csv_file, 'w', newline='', encoding='utf-8-sig') as f:
-        writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(results)
-
-    print(f"✓ CSV 文件已保存")
+    remaining_file = csv_file.with_name(csv_file.name + '.remaining.txt')
+    if len(scheduler):
+        with open(remaining_file, 'w', encoding='utf-8') as f:
+            f.write(''.join(
+                f"https://www.tiktok.com/@{u}\n" for u in scheduler.remaining() for _ in range(copies[u.lower()])
+            ))
+        reason = (
+            f"⏹ 已中断（{shutdown.signal_name}）" if shutdown.requested else
+            "💰 费用预算用完" if ledger.exhausted else
+            "⏱ 时间预算用完"
+        )
+        print(f"{reason}，{len(scheduler)} 个用户未爬取，已保存到: {remaining_file}")
+        print()
+    elif resume and remaining_file.exists():
+        # 继续的运行已爬完，上次中断留下的 remaining 文件不再需要
+        remaining_file.unlink()
+
+    print(f"✓ CSV 文件已保存: {writer.written} 行" + (f"（磁盘背压等待 {writer.stalls} 次）" if writer.stalls else ""))
+    live_stats.save(stats_file)
+    print(live_stats.format_summary())
     print()
 
+    if snapshot_dir:
+        from snapshot_store import SnapshotStore, load_rows_from_csv
+        written = SnapshotStore(snapshot_dir).append(load_rows_from_csv(csv_file))
+        print(f"✓ 追加 {written} 条快照到: {snapshot_dir}")
+        print()
+
     # 统计
-    success_count = sum(1 for r in results if r.get('scrape_status') == 'success')
-    failed_count = len(results) - success_count
+    success_count = counts['success']
+    failed_count = counts['total'] - success_count
 
     print("="*60)
     print("爬取统计")
     print("="*60)
-    print(f"总计: {len(results)}")
+    print(f"总计: {counts['total']}")
     print(f"成功: {success_count}")
     print(f"失败: {failed_count}")
-    print(f"成功率: {success_count/len(results)*100:.1f}%")
+    print(f"成功率: {success_count/counts['total']*100:.1f}%" if counts['total'] else "成功率: N/A")
+    if scraper.coalesced:
+        print(f"合并重复请求: {scraper.coalesced}")
+    print(ledger.format_summary())
+    if shutdown.requested:
+        cancelled = f"，宽限期后取消 {interrupted} 个进行中的请求" if interrupted else ""
+        print(f"⏹ 因 {shutdown.signal_name} 提前结束{cancelled}；以 remaining 文件作为输入即可继续")
     print()
     print(f"✓ CSV 文件: {csv_file}")
     print("="*60)
 
 
+def _run_shard(kwargs: dict) -> str:
+    """子进程入口：每个分片拥有独立的事件循环和连接池"""
+    runtime.run(scrape_users_to_csv_concurrent(**kwargs))
+    return kwargs['output_csv']
+
+
+async def scrape_users_to_csv_sharded(
+    user_list_file: str,
+    output_csv: str,
+    api_token: str,
+    api_base_url: str = "https://api.tikhub.io",
+    max_users: int = None,
+    concurrency: int = 20,
+    record_cassette: str = None,
+    max_rps: float = None,
+    shards: int = 4,
+    snapshot_dir: str = None,
+    avatar_dir: str = None,
+    priority_csvs: list = None,
+    tiers_file: str = None,
+    time_budget: float = None,
+    budget: float = None,
+    budget_mode: str = 'stop',
+    negative_cache: str = None,
+    grace_period: float = DEFAULT_GRACE_PERIOD,
+    resume: bool = False
+):
+    """
+    多进程分片爬取：按用户名哈希把用户分到 N 个进程，结束后自动合并
+
+    output_csv 以 / 结尾时不合并: 各分片直接写成数据集目录中的 part-XX.csv，结束后生成 manifest.json
+    （见 sharded_output.py），下游工具并行读取各分片。
+
+    每个分片进程使用独立的事件循环和连接池，并发数和 QPS 预算按分片数均分，
+    总请求速率与单进程模式一致，但 JSON 解码、行构建等 CPU 开销分摊到多个核心。
+
+    Args:
+        user_list_file: 用户列表文件路径
+        output_csv: 合并后的输出 CSV 文件路径
+        api_token: TikHub API Token
+        api_base_url: API 基础 URL
+        max_users: 最大爬取用户数（None 表示全部）
+        concurrency: 总并发数（各分片均分）
+        record_cassette: 录制 cassette（每个分片录制到各自的文件，见 shard_cassette）
+        max_rps: 总 QPS 预算（各分片均分，None 表示不限流）
+        shards: 分片（进程）数
+        snapshot_dir: 快照库目录，合并后把计数追加为一份时间序列快照（None 表示不保存）
+        avatar_dir: 头像库目录，各分片爬取完成后下载头像到同一个库（None 表示不下载）
+        priority_csvs: 以前的结果 CSV，各分片按优先级爬取
+        tiers_file: 分级文件，各分片按等级优先爬取
+        time_budget: 时间预算（秒），各分片同时截止
+        budget: 总费用预算（美元，各分片均分），各分片记入同一个费用账本
+        budget_mode: 'stop' / 'slow'
+        negative_cache: 失效账号缓存（默认输出目录下的 negative_cache.db，各分片共用）
+        grace_period: Ctrl+C 后各分片等待进行中请求的时间（秒）；各分片保存已完成的结果后照常合并
+        resume: 各分片从自己的检查点继续，结果追加到分片 CSV 后重新合并
+    """
+    from merge_csv_files import merge_csv_files
+
+    dataset = is_dataset_output(output_csv)
+    if dataset:
+        # output/users/ → output/users/part-00.csv ...
+        output_path = Path(output_csv)
+        output_path.mkdir(parents=True, exist_ok=True)
+        shard_csvs = [str(output_path / part_name(i)) for i in range(shards)]
+    else:
+        output_path = resolve_output_path(output_csv)
+        # users.csv.zst → users.shard00.csv.zst
+        plain_path = strip_compression(output_path)
+        compressed_suffix = output_path.suffix if compression_of(output_path) else ''
+        shard_csvs = [
+            str(plain_path.with_name(f"{plain_path.stem}.shard{i:02d}{plain_path.suffix}{compressed_suffix}"))
+            for i in range(shards)
+        ]
+    output_csv = str(output_path)
+
+    print(f"✓ 多进程分片模式: {shards} 个进程")
+    print(f"✓ 每个分片并发数: {max(1, concurrency // shards)}")
+    if max_rps:
+        print(f"✓ 每个分片 QPS: {max_rps / shards:.2f}")
+    print()
+
+    shard_kwargs = [
+        dict(
+            user_list_file=user_list_file,
+            output_csv=shard_csvs[i],
+            api_token=api_token,
+            api_base_url=api_base_url,
+            max_users=max_users,
+            concurrency=max(1, concurrency // shards),
+            record_cassette=shard_cassette(record_cassette, i) if record_cassette else None,
+            max_rps=max_rps / shards if max_rps else None,
+            shard_index=i,
+            shard_count=shards,
+            avatar_dir=avatar_dir,
+            priority_csvs=priority_csvs,
+            tiers_file=tiers_file,
+            time_budget=time_budget,
+            budget=budget / shards if budget is not None else None,
+            budget_mode=budget_mode,
+            ledger_file=str(output_path.with_name('cost_ledger.json')),
+            negative_cache=negative_cache or str(output_path.with_name('negative_cache.db')),
+            grace_period=grace_period,
+            resume=resume
+        )
+        for i in range(shards)
+    ]
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=shards) as pool:
+        futures = [loop.run_in_executor(pool, _run_shard, kwargs) for kwargs in shard_kwargs]
+        # Ctrl+C 由各分片进程自行处理（同一进程组都会收到），主进程只等待它们保存后继续合并
+        with GracefulShutdown(grace_period):
+            await asyncio.gather(*futures)
+
+    # 合并各分片结果（数据集模式只生成 manifest）和实时统计
+    if dataset:
+        manifest = write_manifest(output_path, shard_csvs, {'by': 'hash', 'key': 'username', 'parts': shards})
+        print(f"✓ 数据集: {manifest['rows']:,} 行，{len(manifest['shards'])} 个分片，manifest: {output_path / 'manifest.json'}")
+    else:
+        merge_csv_files(shard_csvs, output_csv)
+
+    remaining = []
+    for shard_csv in shard_csvs:
+        shard_remaining = Path(shard_csv + '.remaining.txt')
+        if shard_remaining.exists():
+            remaining.append(shard_remaining.read_text(encoding='utf-8'))
+            shard_remaining.unlink()
+    if remaining:
+        remaining_file = output_path.with_name(output_path.name + '.remaining.txt')
+        remaining_file.write_text(''.join(remaining), encoding='utf-8')
+        print(f"✓ 未爬取的用户已保存到: {remaining_file}")
+
+    merged_stats = LiveStats()
+    for shard_csv in shard_csvs:
+        if stats_path_for(shard_csv).exists():
+            merged_stats.merge(LiveStats.load(stats_path_for(shard_csv)))
+    merged_stats.save(stats_path_for(output_csv))
+    print(merged_stats.format_summary())
+
+    if snapshot_dir:
+        from snapshot_store import SnapshotStore, load_rows_from_csv
+        written = SnapshotStore(snapshot_dir).append(load_rows_from_csv(output_csv))
+        print(f"✓ 追加 {written} 条快照到: {snapshot_dir}")
+
+
 async def main():
     """主函数"""
     # 配置
     USER_LIST_FILE = "/Users/jiajun/tiktok_user_scrape/Nova01 User list"
-    OUTPUT_CSV = "/Users/jiajun/tiktok_user_scrape/output/nova01_users.csv"
+    OUTPUT_CSV = "/Users/jiajun/tiktok_user_scrape/output/nova01_users.csv"  # 以 / 结尾时写成分片数据集目录
     API_TOKEN = "YOUR_API_TOKEN_HERE"
     API_BASE_URL = "https://api.tikhub.io"
     MAX_USERS = None  # 爬取全部用户
     CONCURRENCY = 10  # 同时 10 个请求（平衡并发和限流）
+    RECORD_CASSETTE = None  # 例如 "cassettes/nova01.jsonl.gz"，录制真实响应用于离线压测
+    MAX_RPS = None  # 总 QPS 预算（None 表示不限流）
+    SHARDS = 1  # 分片进程数（>1 时按 CPU 核心多进程爬取并自动合并）
+    SNAPSHOT_DIR = None  # 例如 "/Users/jiajun/tiktok_user_scrape/snapshots"，保留每次爬取的计数历史
+    AVATAR_DIR = None  # 例如 "/Users/jiajun/tiktok_user_scrape/avatars"，爬取后下载头像（按内容去重）
+    PRIORITY_CSVS = None  # 例如 [OUTPUT_CSV]，按上次结果的粉丝数 / 更新时间优先爬取重要用户
+    TIERS_FILE = None  # 分级文件（每行 "用户名,等级"），等级高的用户优先爬取
+    TIME_BUDGET = None  # 时间预算（秒），到时停止分发新任务
+    BUDGET = None  # 费用预算（美元），用完后停止分发新任务（约 $0.001 / 请求）
+    BUDGET_MODE = 'stop'  # 'stop' 达到预算后停止 / 'slow' 接近预算时降速
+    RESUME = False  # 从上次中断处继续（跳过检查点之前的行，结果追加到已有 CSV）
+
+    if SHARDS > 1 or is_dataset_output(OUTPUT_CSV):
+        await scrape_users_to_csv_sharded(
+            user_list_file=USER_LIST_FILE,
+            output_csv=OUTPUT_CSV,
+            api_token=API_TOKEN,
+            api_base_url=API_BASE_URL,
+            max_users=MAX_USERS,
+            concurrency=CONCURRENCY,
+            record_cassette=RECORD_CASSETTE,
+            max_rps=MAX_RPS,
+            shards=SHARDS,
+            snapshot_dir=SNAPSHOT_DIR,
+            avatar_dir=AVATAR_DIR,
+            priority_csvs=PRIORITY_CSVS,
+            tiers_file=TIERS_FILE,
+            time_budget=TIME_BUDGET,
+            budget=BUDGET,
+            budget_mode=BUDGET_MODE,
+            resume=RESUME
+        )
+        return
 
     await scrape_users_to_csv_concurrent(
         user_list_file=USER_LIST_FILE,
@@ -226,9 +526,19 @@ async def main():
         api_token=API_TOKEN,
         api_base_url=API_BASE_URL,
         max_users=MAX_USERS,
-        concurrency=CONCURRENCY
+        concurrency=CONCURRENCY,
+        record_cassette=RECORD_CASSETTE,
+        max_rps=MAX_RPS,
+        snapshot_dir=SNAPSHOT_DIR,
+        avatar_dir=AVATAR_DIR,
+        priority_csvs=PRIORITY_CSVS,
+        tiers_file=TIERS_FILE,
+        time_budget=TIME_BUDGET,
+        budget=BUDGET,
+        budget_mode=BUDGET_MODE,
+        resume=RESUME
     )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    runtime.run(main())
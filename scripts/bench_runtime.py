@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+事件循环基准测试 - 对比 asyncio 默认循环和 uvloop 在 50-200 并发下的吞吐
+
+在子进程中启动一个本地模拟 TikHub 服务（固定延迟返回真实大小的用户资料 JSON），
+然后用 TikHubUserScraper 分别在两种事件循环下以不同并发数请求，输出吞吐和循环延迟。
+
+用法:
+    python3 bench_runtime.py [请求数] [模拟延迟毫秒]
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import sys
+import time
+
+import runtime
+from loop_watchdog import LoopWatchdog
+
+CONCURRENCY_LEVELS = [50, 100, 200]
+PORT = 18765
+
+# 与真实响应大小相近的用户资料
+SAMPLE_PROFILE = json.dumps({
+    "code": 200,
+    "message": "success",
+    "data": {"user": {
+        "uid": "6812345678901234567",
+        "sec_uid": "MS4wLjABAAAA" + "x" * 64,
+        "unique_id": "sample_user",
+        "nickname": "Sample User",
+        "signature": "sample signature " * 8,
+        "follower_count": 123456,
+        "following_count": 321,
+        "total_favorited": 9876543,
+        "aweme_count": 210,
+        "visible_videos_count": 200,
+        "verification_type": 0,
+        "bio_email": "",
+        "category": "",
+        "account_type": 0,
+        "avatar_larger": {"url_list": ["https://p16-sign.tiktokcdn.com/" + "a" * 200]},
+        "extra": ["padding" * 20] * 40
+    }}
+}).encode("utf-8")
+
+
+def _serve(port: int, latency: float):
+    """模拟 TikHub 服务（HTTP/1.1 keep-alive）"""
+    response = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        b"Content-Length: " + str(len(SAMPLE_PROFILE)).encode() + b"\r\n\r\n" + SAMPLE_PROFILE
+    )
+
+    async def handle(reader, writer):
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                await asyncio.sleep(latency)
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "127.0.0.1", port, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    runtime.run(main(), lag_monitor=False)
+
+
+async def _bench(total: int, concurrency: int) -> dict:
+    from scrape_user_tikhub import TikHubUserScraper
+
+    monitor = LoopWatchdog(interval=0.05, threshold=float("inf"))
+    monitor.start()
+
+    scraper = TikHubUserScraper(
+        api_token="bench",
+        base_url=f"http://127.0.0.1:{PORT}",
+        max_connections=concurrency
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await scraper.fetch_user_profile(unique_id=f"user{i}")
+
+    # 屏蔽每个请求的打印输出，只测量请求和解析本身
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = await asyncio.gather(*[one(i) for i in range(total)])
+    elapsed = time.perf_counter() - started
+
+    await scraper.aclose()
+    monitor.stop()
+    stats = monitor.metrics()
+    return {
+        "ok": sum(1 for r in results if r),
+        "rps": total / elapsed,
+        "max_lag_ms": stats["max_lag_ms"]
+    }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50.0) / 1000
+
+    server = multiprocessing.Process(target=_serve, args=(PORT, latency), daemon=True)
+    server.start()
+    time.sleep(0.5)
+
+    loops = [False, True] if runtime.loop_name(True) == "uvloop" else [False]
+    if len(loops) == 1:
+        print("⚠ 未安装 uvloop，只测试 asyncio 默认循环（pip install uvloop）")
+
+    print("="*60)
+    print(f"事件循环基准: {total} 个请求, 模拟延迟 {latency*1000:.0f} ms")
+    print("="*60)
+    print(f"{'循环':<10}{'并发':>6}{'成功':>8}{'请求/秒':>12}{'最大延迟(ms)':>16}")
+
+    baseline = {}
+    try:
+        for use_uvloop in loops:
+            name = runtime.loop_name(use_uvloop)
+            for concurrency in CONCURRENCY_LEVELS:
+                result = runtime.run(
+                    _bench(total, concurrency),
+                    use_uvloop=use_uvloop,
+                    lag_monitor=False
+                )
+                gain = ""
+                if use_uvloop and concurrency in baseline:
+                    gain = f"  ({result['rps'] / baseline[concurrency] - 1:+.0%})"
+                else:
+                    baseline[concurrency] = result["rps"]
+                print(
+                    f"{name:<10}{concurrency:>6}{result['ok']:>8}"
+                    f"{result['rps']:>12.1f}{result['max_lag_ms']:>16.1f}{gain}"
+                )
+    finally:
+        server.terminate()
+
+    print("="*60)
+
+
+if __name__ == "__main__":
+    main()
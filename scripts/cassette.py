@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+TikHub 请求/响应录制与回放（cassette）
+
+录制: TikHubUserScraper(record_to="cassettes/nova01.jsonl.gz") 会把每个请求/响应
+      以紧凑的 gzip JSONL 写入 cassette 文件（不会保存 Authorization 头）；
+      条目攒够一批后交给写线程压缩落盘，不占用事件循环
+回放: TikHubUserScraper(transport=ReplayTransport("cassettes/nova01.jsonl.gz", speed=100))
+      完全离线按录制时的延迟（或加速后的延迟）返回真实响应，用于压测解析、提取和写入环节
+
+cassette 文件格式（每行一个 JSON）:
+    第一行: {"version": 1, "created": "..."}
+    之后:   {"t": 相对录制开始的秒数, "d": 请求耗时, "m": 方法, "p": 路径,
+             "q": 查询参数, "s": 状态码, "c": Content-Type, "b": 响应体}
+"""
+
+import asyncio
+import gzip
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+CASSETTE_VERSION = 1
+
+# 录制时每攒够多少条写一次文件
+FLUSH_EVERY = 100
+
+
+def _open_cassette(path, mode: str):
+    """按扩展名打开 cassette（.gz 使用 gzip 压缩）"""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _request_key(method: str, path: str, query: dict) -> tuple:
+    """请求匹配键: 方法 + 路径 + 排序后的查询参数"""
+    return (method, path, tuple(sorted(query.items())))
+
+
+def load_cassette(path) -> list:
+    """读取 cassette 文件，返回录制的条目列表"""
+    entries = []
+    with _open_cassette(path, "r") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"不支持的 cassette 版本: {header.get('version')}")
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """录制传输层：转发请求到真实传输层，并把请求/响应追加写入 cassette"""
+
+    def __init__(self, cassette_path: str, inner: httpx.AsyncBaseTransport = None, limits: httpx.Limits = None):
+        """
+        Args:
+            cassette_path: cassette 文件路径
+            inner: 真实传输层（None 时创建 AsyncHTTPTransport）
+            limits: 创建真实传输层时使用的连接池限制（自定义传输层会替代 AsyncClient 的连接池，
+                    需要在这里传入客户端的 limits）
+        """
+        self.cassette_path = Path(cassette_path)
+        self.cassette_path.parent.mkdir(parents=True, exist_ok=True)
+        if inner is None:
+            inner = httpx.AsyncHTTPTransport(limits=limits) if limits else httpx.AsyncHTTPTransport()
+        self.inner = inner
+        self.count = 0
+        self._buffer = []
+        self._error = None
+        # 单个写线程保证条目按顺序写入
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cassette")
+        self._start = time.monotonic()
+        self._file = _open_cassette(self.cassette_path, "w")
+        self._file.write(json.dumps({
+            "version": CASSETTE_VERSION,
+            "created": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }) + "\n")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = await self.inner.handle_async_request(request)
+        body = await response.aread()
+        await response.aclose()
+        duration = time.monotonic() - started
+
+        # 响应体已解压，只保留 Content-Type，避免回放时重复解码
+        content_type = response.headers.get("content-type", "application/json")
+        entry = {
+            "t": round(started - self._start, 4),
+            "d": round(duration, 4),
+            "m": request.method,
+            "p": request.url.path,
+            "q": dict(request.url.params),
+            "s": response.status_code,
+            "c": content_type,
+            "b": body.decode("utf-8", errors="replace")
+        }
+        self._buffer.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.count += 1
+        if len(self._buffer) >= FLUSH_EVERY:
+            self._flush()
+
+        return httpx.Response(
+            response.status_code,
+            headers={"content-type": content_type},
+            content=body,
+            request=request
+        )
+
+    def _flush(self):
+        """把缓冲的条目交给写线程"""
+        if self._buffer:
+            self._writer.submit(self._write, self._buffer)
+            self._buffer = []
+
+    def _write(self, lines: list):
+        try:
+            self._file.writelines(lines)
+        except Exception as e:
+            self._error = self._error or e
+
+    def _close_file(self):
+        self._writer.submit(self._file.close).result()
+        self._writer.shutdown()
+
+    async def aclose(self):
+        if not self._file.closed:
+            self._flush()
+            await asyncio.get_running_loop().run_in_executor(None, self._close_file)
+            if self._error:
+                print(f"✗ cassette 写入失败: {self._error}")
+            else:
+                print(f"✓ 已录制 {self.count} 个请求到: {self.cassette_path}")
+        await self.inner.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    回放传输层：离线返回 cassette 中录制的响应
+
+    Args:
+        cassette_path: cassette 文件路径
+        speed: 回放加速倍数（100 表示按录制耗时的 1/100 延迟返回；None 表示不等待）
+        strict: True 时未录制的请求返回 404；False 时按同一路径的录制响应轮流返回，
+                便于用任意用户列表压测
+    """
+
+    def __init__(self, cassette_path: str, speed: float = 1.0, strict: bool = False):
+        self.entries = load_cassette(cassette_path)
+        self.speed = speed
+        self.strict = strict
+        self.served = 0
+        self.misses = 0
+
+        self._by_key = defaultdict(list)
+        self._by_path = defaultdict(list)
+        for entry in self.entries:
+            self._by_key[_request_key(entry["m"], entry["p"], entry["q"])].append(entry)
+            self._by_path[(entry["m"], entry["p"])].append(entry)
+        self._cursor = defaultdict(int)
+
+    def _next(self, key, candidates: list) -> dict:
+        """同一个键被多次请求时轮流返回录制的响应"""
+        index = self._cursor[key]
+        self._cursor[key] = index + 1
+        return candidates[index % len(candidates)]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        method, path = request.method, request.url.path
+        key = _request_key(method, path, dict(request.url.params))
+
+        if key in self._by_key:
+            entry = self._next(key, self._by_key[key])
+        elif not self.strict and (method, path) in self._by_path:
+            self.misses += 1
+            entry = self._next((method, path), self._by_path[(method, path)])
+        else:
+            self.misses += 1
+            return httpx.Response(404, json={"code": 404, "message": "Not in cassette"}, request=request)
+
+        if self.speed:
+            await asyncio.sleep(entry["d"] / self.speed)
+
+        self.served += 1
+        return httpx.Response(
+            entry["s"],
+            headers={"content-type": entry["c"]},
+            content=entry["b"].encode("utf-8"),
+            request=request
+        )
+
+
+async def replay_load_test(
+    cassette_path: str,
+    output_csv: str,
+    speed: float = 100.0,
+    concurrency: int = 50
+):
+    """
+    用 cassette 离线压测批量爬取流程（解析、提取、写 CSV）
+
+    Args:
+        cassette_path: cassette 文件路径
+        output_csv: 输出 CSV 文件路径
+        speed: 回放加速倍数
+        concurrency: 并发数
+    """
+    from batch_scrape_to_csv_concurrent import scrape_users_to_csv_concurrent
+
+    transport = ReplayTransport(cassette_path, speed=speed)
+
+    # 用 cassette 中出现过的用户名生成临时用户列表
+    usernames = [e["q"].get("unique_id") for e in transport.entries if e["q"].get("unique_id")]
+    user_list = Path(output_csv).with_suffix(".replay_users.txt")
+    user_list.parent.mkdir(parents=True, exist_ok=True)
+    user_list.write_text(
+        "\n".join(f"https://www.tiktok.com/@{u}" for u in usernames),
+        encoding="utf-8"
+    )
+
+    started = time.monotonic()
+    await scrape_users_to_csv_concurrent(
+        user_list_file=str(user_list),
+        output_csv=output_csv,
+        api_token="replay",
+        concurrency=concurrency,
+        transport=transport
+    )
+    elapsed = time.monotonic() - started
+
+    recorded = sum(e["d"] for e in transport.entries) / max(concurrency, 1)
+    print(f"回放请求数: {transport.served}（未命中 {transport.misses}）")
+    print(f"回放耗时: {elapsed:.2f} 秒（录制时估算 {recorded:.2f} 秒）")
+    print(f"吞吐: {transport.served / elapsed:.1f} 请求/秒")
+
+
+if __name__ == "__main__":
+    import sys
+    import runtime
+
+    if len(sys.argv) < 3:
+        print("用法: python3 cassette.py <cassette.jsonl.gz> <output.csv> [speed] [concurrency]")
+        sys.exit(1)
+
+    runtime.run(replay_load_test(
+        cassette_path=sys.argv[1],
+        output_csv=sys.argv[2],
+        speed=float(sys.argv[3]) if len(sys.argv) > 3 else 100.0,
+        concurrency=int(sys.argv[4]) if len(sys.argv) > 4 else 50
+    ))
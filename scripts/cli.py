@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+统一命令行入口 - 所有功能作为子命令，配置来自 config.py 或命令行参数
+
+子命令只在执行时才导入对应模块，merge / plan / monitor 等离线命令不会导入 httpx，
+启动只需几十毫秒，适合在 cron 或 shell 循环中调用。
+
+配置: 默认读取当前目录或项目根目录下的 config.py（见 config.example.py），
+也可以用 --config 指定；命令行参数优先于配置文件。
+
+用法:
+    python3 scripts/cli.py scrape --input "data/Nova 01 User list" --output output/nova01_users.csv
+    python3 scripts/cli.py plan "data/Nova 01 User list" --csv output/nova01_users.csv --output remaining.txt
+    python3 scripts/cli.py retry --csv output/nova01_users.csv
+    python3 scripts/cli.py videos --csv output/nova01_users.csv --output output/nova01_posts.jsonl.gz
+    python3 scripts/cli.py merge output/nova01_users.csv output/nova02_users.csv --output output/merged_all_users.csv
+    python3 scripts/cli.py monitor --log logs/scrape.log
+    python3 scripts/cli.py analyze output/merged_all_users.csv --report output/report.json
+    python3 scripts/cli.py diff output/run1.csv output/run2.csv output/diff.jsonl
+    python3 scripts/cli.py query output/merged_all_users.csv --where "follower_count>100000"
+    python3 scripts/cli.py cost output/cost_ledger.json
+"""
+
+import argparse
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PROJECT_DIR = SCRIPTS_DIR.parent
+
+# config.py 中可用的配置项（未设置时使用这里的默认值）
+DEFAULTS = {
+    'API_BASE_URL': "https://api.tikhub.io",
+    'API_TOKEN': None,
+    'CONCURRENCY': 10,
+    'MAX_RPS': None,
+    'SHARDS': 1,
+    'INPUT_USER_LIST': None,
+    'OUTPUT_CSV': None,
+    'LOG_FILE': None,
+    'SNAPSHOT_DIR': None,
+    'AVATAR_DIR': None,
+    'IDENTITY_DB': None,
+    'BUDGET': None,
+    'BUDGET_MODE': 'stop',
+    'NEGATIVE_CACHE': None
+}
+
+
+def load_config(path: str = None) -> dict:
+    """读取 config.py（按 --config、当前目录、项目根目录的顺序查找）"""
+    import importlib.util
+
+    config = dict(DEFAULTS)
+    candidates = [Path(path)] if path else [Path.cwd() / 'config.py', PROJECT_DIR / 'config.py']
+    for candidate in candidates:
+        if candidate.exists():
+            spec = importlib.util.spec_from_file_location('config', candidate)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            config.update({key: getattr(module, key) for key in DEFAULTS if hasattr(module, key)})
+            break
+    else:
+        if path:
+            raise SystemExit(f"✗ 配置文件不存在: {path}")
+    return config
+
+
+def _option(args, name: str, config: dict, key: str):
+    """命令行参数优先，其次配置文件"""
+    value = getattr(args, name, None)
+    return value if value is not None else config[key]
+
+
+def _require(value, description: str):
+    if value in (None, '', 'your_api_token_here', 'YOUR_API_TOKEN_HERE'):
+        raise SystemExit(f"✗ 缺少{description}（在 config.py 中设置或通过命令行参数指定）")
+    return value
+
+
+def cmd_scrape(args, config):
+    import runtime
+    from batch_scrape_to_csv_concurrent import scrape_users_to_csv_concurrent, scrape_users_to_csv_sharded
+    from sharded_output import is_dataset_output
+
+    options = dict(
+        user_list_file=_require(_option(args, 'input', config, 'INPUT_USER_LIST'), "用户列表 --input"),
+        output_csv=_require(_option(args, 'output', config, 'OUTPUT_CSV'), "输出文件 --output"),
+        api_token=_require(_option(args, 'token', config, 'API_TOKEN'), " API Token --token"),
+        api_base_url=_option(args, 'base_url', config, 'API_BASE_URL'),
+        max_users=args.max_users,
+        concurrency=_option(args, 'concurrency', config, 'CONCURRENCY'),
+        record_cassette=args.record,
+        max_rps=_option(args, 'max_rps', config, 'MAX_RPS'),
+        snapshot_dir=_option(args, 'snapshot_dir', config, 'SNAPSHOT_DIR'),
+        avatar_dir=_option(args, 'avatar_dir', config, 'AVATAR_DIR'),
+        priority_csvs=args.priority_csv or None,
+        tiers_file=args.tiers,
+        time_budget=args.time_budget,
+        budget=_option(args, 'budget', config, 'BUDGET'),
+        budget_mode=_option(args, 'budget_mode', config, 'BUDGET_MODE'),
+        negative_cache=_option(args, 'negative_cache', config, 'NEGATIVE_CACHE'),
+        resume=args.resume
+    )
+    shards = _option(args, 'shards', config, 'SHARDS')
+    if shards > 1 or is_dataset_output(options['output_csv']):
+        # 输出路径以 / 结尾时写成分片数据集（只有 1 个分片时同样经过分片流程生成 manifest）
+        runtime.run(scrape_users_to_csv_sharded(shards=shards, **options))
+    else:
+        runtime.run(scrape_users_to_csv_concurrent(**options))
+
+
+def cmd_retry(args, config):
+    import runtime
+    from planner import failed_usernames
+    from retry_all_failed_users import retry_failed_users
+
+    csv_files = args.csv or [_require(config['OUTPUT_CSV'], "结果文件 --csv")]
+    failed_files = args.failed_file
+    if not failed_files:
+        # 没有指定失败用户文件时，从结果 CSV 中找出失败的用户
+        usernames = failed_usernames(csv_files)
+        if not usernames:
+            print("🎉 没有失败的用户")
+            return
+        failed_file = Path(csv_files[0]).with_name('failed_users.txt')
+        failed_file.write_text('\n'.join(usernames), encoding='utf-8')
+        print(f"✓ 从结果中找到 {len(usernames)} 个失败用户: {failed_file}")
+        failed_files = [str(failed_file)]
+
+    runtime.run(retry_failed_users(
+        failed_users_files=failed_files,
+        csv_outputs=csv_files,
+        api_token=_require(_option(args, 'token', config, 'API_TOKEN'), " API Token --token"),
+        api_base_url=_option(args, 'base_url', config, 'API_BASE_URL'),
+        concurrency=_option(args, 'concurrency', config, 'CONCURRENCY')
+    ))
+
+
+def cmd_videos(args, config):
+    import runtime
+    from scrape_user_videos import MAX_PAGES, scrape_users_videos
+
+    runtime.run(scrape_users_videos(
+        input_csv=args.csv or _require(config['OUTPUT_CSV'], "结果文件 --csv"),
+        output=args.output,
+        api_token=_require(_option(args, 'token', config, 'API_TOKEN'), " API Token --token"),
+        api_base_url=_option(args, 'base_url', config, 'API_BASE_URL'),
+        concurrency=_option(args, 'concurrency', config, 'CONCURRENCY'),
+        max_rps=_option(args, 'max_rps', config, 'MAX_RPS'),
+        max_pages=args.max_pages or MAX_PAGES,
+        max_users=args.max_users,
+        budget=_option(args, 'budget', config, 'BUDGET'),
+        budget_mode=_option(args, 'budget_mode', config, 'BUDGET_MODE'),
+        cursor_db=args.cursor_db
+    ))
+
+
+def cmd_merge(args, config):
+    from merge_csv_files import merge_csv_files
+
+    merge_csv_files(
+        args.inputs,
+        _require(args.output, "输出文件 --output"),
+        identity_db=_option(args, 'identity_db', config, 'IDENTITY_DB')
+    )
+
+
+def cmd_plan(args, config):
+    from cost_ledger import PRICE_PER_CALL
+    from planner import plan_remaining, print_plan, write_user_list
+
+    user_lists = args.user_lists or [_require(config['INPUT_USER_LIST'], "用户列表")]
+    csv_files = args.csv or [_require(config['OUTPUT_CSV'], "结果文件 --csv")]
+    # 失效账号缓存默认位于结果 CSV 同目录（批量爬取时自动创建）
+    negative_cache = _option(args, 'negative_cache', config, 'NEGATIVE_CACHE') or Path(csv_files[0]).with_name('negative_cache.db')
+    plan = plan_remaining(user_lists, csv_files, include_failed=not args.skip_failed, negative_cache=negative_cache)
+    print_plan(plan, args.price or PRICE_PER_CALL)
+    if args.output:
+        print(f"已保存到: {write_user_list(plan['remaining'], args.output)}")
+
+
+def cmd_cost(args, config):
+    from cost_ledger import print_ledger
+
+    ledger = args.ledger or Path(_require(config['OUTPUT_CSV'], "费用账本")).with_name('cost_ledger.json')
+    if not Path(ledger).exists():
+        raise SystemExit(f"✗ 费用账本不存在: {ledger}")
+    print_ledger(ledger, recent=args.recent)
+
+
+def cmd_monitor(args, config):
+    from monitor_progress_bar import monitor_progress
+
+    monitor_progress(_require(_option(args, 'log', config, 'LOG_FILE'), "日志文件 --log"), refresh_interval=args.interval)
+
+
+def cmd_analyze(args, config):
+    from analyze_users import analyze
+
+    csv_file = args.csv or _require(config['OUTPUT_CSV'], "CSV 文件")
+    analyze(csv_file, args.report, _option(args, 'identity_db', config, 'IDENTITY_DB'))
+
+
+def cmd_diff(args, config):
+    from diff_runs import diff_runs
+
+    diff_runs(args.old, args.new, args.output, args.partitions, _option(args, 'identity_db', config, 'IDENTITY_DB'))
+
+
+def cmd_query(args, config):
+    import query_users
+
+    query_users.main(args.args)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="TikTok 用户资料爬取工具")
+    parser.add_argument('--config', help="配置文件路径（默认查找 config.py）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def api_options(p):
+        p.add_argument('--token', help="TikHub API Token")
+        p.add_argument('--base-url', dest='base_url', help="API 地址")
+        p.add_argument('--concurrency', type=int, help="并发数")
+
+    p = subparsers.add_parser('scrape', help="批量爬取用户列表")
+    p.add_argument('--input', help="用户列表文件")
+    p.add_argument('--output', help="输出 CSV（以 / 结尾时写成分片数据集目录）")
+    api_options(p)
+    p.add_argument('--max-users', dest='max_users', type=int)
+    p.add_argument('--max-rps', dest='max_rps', type=float, help="每秒最多请求数")
+    p.add_argument('--shards', type=int, help="分片进程数")
+    p.add_argument('--snapshot-dir', dest='snapshot_dir', help="快照库目录")
+    p.add_argument('--avatar-dir', dest='avatar_dir', help="头像库目录")
+    p.add_argument('--record', help="录制 cassette 文件（分片模式下每个分片一个文件）")
+    p.add_argument('--priority-csv', dest='priority_csv', action='append', default=[],
+                   help="以前的结果 CSV，按粉丝数和更新时间优先爬取重要用户")
+    p.add_argument('--tiers', help="分级文件（每行 \"用户名,等级\"），等级高的用户优先爬取")
+    p.add_argument('--time-budget', dest='time_budget', type=float, help="时间预算（秒）")
+    p.add_argument('--budget', type=float, help="费用预算（美元）")
+    p.add_argument('--budget-mode', dest='budget_mode', choices=['stop', 'slow'],
+                   help="达到预算后停止 / 接近预算时降速")
+    p.add_argument('--negative-cache', dest='negative_cache', help="失效账号缓存（默认输出目录下的 negative_cache.db）")
+    p.add_argument('--resume', action='store_true',
+                   help="从上次中断处继续（按 <output>.checkpoint.json 跳过已处理的行，结果追加到已有 CSV）")
+    p.set_defaults(handler=cmd_scrape)
+
+    p = subparsers.add_parser('retry', help="重试失败的用户并更新结果 CSV")
+    p.add_argument('--csv', action='append', default=[], help="结果 CSV，可多次指定")
+    p.add_argument('--failed-file', dest='failed_file', action='append', default=[],
+                   help="失败用户文件（默认从结果 CSV 中查找）")
+    api_options(p)
+    p.set_defaults(handler=cmd_retry)
+
+    p = subparsers.add_parser('videos', help="获取用户作品列表（增量翻页）")
+    p.add_argument('--csv', help="资料爬取的结果 CSV（默认 OUTPUT_CSV）")
+    p.add_argument('--output', required=True, help="作品输出文件（.jsonl / .csv，可加 .gz / .zst，只追加）")
+    api_options(p)
+    p.add_argument('--max-rps', dest='max_rps', type=float, help="每秒最多请求数")
+    p.add_argument('--max-pages', dest='max_pages', type=int, help="每个用户每次最多请求的页数（默认 10）")
+    p.add_argument('--max-users', dest='max_users', type=int)
+    p.add_argument('--budget', type=float, help="费用预算（美元）")
+    p.add_argument('--budget-mode', dest='budget_mode', choices=['stop', 'slow'],
+                   help="达到预算后停止 / 接近预算时降速")
+    p.add_argument('--cursor-db', dest='cursor_db', help="翻页进度数据库（默认 <output>.cursors.db）")
+    p.set_defaults(handler=cmd_videos)
+
+    p = subparsers.add_parser('merge', help="合并多个结果 CSV")
+    p.add_argument('inputs', nargs='+')
+    p.add_argument('--output', required=True, help="输出 CSV（以 / 结尾时写成分片数据集目录）")
+    p.add_argument('--identity-db', dest='identity_db', help="按规范实体去重的身份索引")
+    p.set_defaults(handler=cmd_merge)
+
+    p = subparsers.add_parser('plan', help="找出还需要爬取的用户")
+    p.add_argument('user_lists', nargs='*', help="用户列表文件（默认 INPUT_USER_LIST）")
+    p.add_argument('--csv', action='append', default=[], help="已有结果 CSV（默认 OUTPUT_CSV）")
+    p.add_argument('--output', help="待爬取用户保存到该文件")
+    p.add_argument('--skip-failed', dest='skip_failed', action='store_true', help="已失败的用户不计入待爬取")
+    p.add_argument('--price', type=float, help="每次请求价格（美元，默认 0.001），用于预估费用")
+    p.add_argument('--negative-cache', dest='negative_cache', help="失效账号缓存（默认结果 CSV 同目录的 negative_cache.db）")
+    p.set_defaults(handler=cmd_plan)
+
+    p = subparsers.add_parser('cost', help="查看费用账本")
+    p.add_argument('ledger', nargs='?', help="账本 JSON（默认 OUTPUT_CSV 同目录的 cost_ledger.json）")
+    p.add_argument('--recent', type=int, default=10, help="显示最近几次运行")
+    p.set_defaults(handler=cmd_cost)
+
+    p = subparsers.add_parser('monitor', help="进度条监控爬取日志")
+    p.add_argument('--log', help="日志文件（默认 LOG_FILE）")
+    p.add_argument('--interval', type=float, default=2)
+    p.set_defaults(handler=cmd_monitor)
+
+    p = subparsers.add_parser('analyze', help="统计分析结果 CSV")
+    p.add_argument('csv', nargs='?', help="CSV 文件（默认 OUTPUT_CSV）")
+    p.add_argument('--report', help="JSON 报告输出路径")
+    p.add_argument('--identity-db', dest='identity_db')
+    p.set_defaults(handler=cmd_analyze)
+
+    p = subparsers.add_parser('diff', help="对比两次爬取结果")
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('output')
+    p.add_argument('--partitions', type=int, default=64)
+    p.add_argument('--identity-db', dest='identity_db')
+    p.set_defaults(handler=cmd_diff)
+
+    # 参数原样交给 query_users.py 解析（包括 --help 和以选项开头的参数）：子命令不使用 - 作为选项前缀
+    p = subparsers.add_parser('query', help="条件查询（参数同 query_users.py）", add_help=False, prefix_chars='+')
+    p.add_argument('args', nargs='*')
+    p.set_defaults(handler=cmd_query)
+
+    return parser
+
+
+def main(argv: list = None):
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+    args.handler(args, config)
+
+
+if __name__ == "__main__":
+    main()
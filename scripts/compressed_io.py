@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+压缩文件读写 - 按扩展名透明地流式压缩 / 解压，不生成解压后的临时副本
+
+    .zst   zstd（需要 pip install zstandard，多线程压缩）；未安装时写入改为同名 .gz，读取报错提示安装
+    .gz    gzip（标准库）
+    其他   普通文本文件
+
+所有 CSV / 用户列表的读写都经过 open_text()，例如:
+    python3 scripts/cli.py scrape --input users.txt.gz --output output/nova01_users.csv.zst
+    python3 scripts/merge_csv_files.py  # 输入输出路径写成 .csv.gz / .csv.zst 即可
+"""
+
+import gzip
+import io
+import os
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# zstd 压缩级别（3 是 zstd 默认值，速度和压缩率的平衡点）
+ZSTD_LEVEL = 3
+
+# gzip 压缩级别（6 与 gzip 命令默认值一致；9 慢很多，体积只小几个百分点）
+GZIP_LEVEL = 6
+
+
+def compression_of(path) -> str:
+    """按扩展名判断压缩格式: 'zstd' / 'gzip' / None"""
+    suffix = Path(path).suffix.lower()
+    if suffix == '.zst':
+        return 'zstd'
+    if suffix == '.gz':
+        return 'gzip'
+    return None
+
+
+def output_path(path) -> Path:
+    """实际写入的路径（要求 .zst 但没有安装 zstandard 时改为 .gz）"""
+    path = Path(path)
+    if compression_of(path) == 'zstd' and zstandard is None:
+        fallback = path.with_suffix('.gz')
+        print(f"⚠ 未安装 zstandard（pip install zstandard），改为 gzip 压缩: {fallback}")
+        return fallback
+    return path
+
+
+def strip_compression(path) -> Path:
+    """去掉压缩扩展名（users.csv.zst → users.csv），用于判断内容格式"""
+    path = Path(path)
+    return path.with_suffix('') if compression_of(path) else path
+
+
+def open_text(path, mode: str = 'r', encoding: str = 'utf-8', newline: str = None):
+    """
+    打开文本文件（按扩展名自动压缩 / 解压）
+
+    Args:
+        path: 文件路径；写入 .zst 时调用方应先用 output_path() 取得实际路径
+        mode: 'r' / 'w' / 'a'（压缩格式的追加会写入新的压缩帧，读取时自动连接）
+        encoding: 文本编码
+        newline: 同内置 open()（CSV 使用 ''）
+    """
+    if mode not in ('r', 'w', 'a'):
+        raise ValueError(f"不支持的模式: {mode}")
+    compression = compression_of(path)
+
+    if compression == 'gzip':
+        return gzip.open(path, mode + 't', compresslevel=GZIP_LEVEL, encoding=encoding, newline=newline)
+
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f"读写 {path} 需要安装 zstandard: pip install zstandard")
+        raw = open(path, mode + 'b')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        else:
+            # threads=-1: 按 CPU 核心数多线程压缩
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1).stream_writer(raw)
+        return io.TextIOWrapper(stream, encoding=encoding, newline=newline, write_through=False)
+
+    return open(path, mode, encoding=encoding, newline=newline)
+
+
+def open_binary(path):
+    """以二进制方式读取（压缩文件返回解压后的字节流）"""
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError(f"读取 {path} 需要安装 zstandard: pip install zstandard")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True))
+    return open(path, 'rb')
+
+
+def sync(f):
+    """flush（压缩格式会写出当前压缩块）并 fsync 到磁盘"""
+    f.flush()
+    try:
+        os.fsync(f.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+API 费用账本 - 统计计费请求数，按预算停止或降速
+
+TikHub 按请求计费（一轮约 10,600 个用户 ≈ $10.60，即每次请求约 $0.001），重试和重跑会成倍增加费用。
+账本按 Token（只保存哈希）和每次运行统计计费请求数，保存到 JSON 文件；多个分片进程共用同一个文件，
+写入时加文件锁并合并各自的增量。运行中的定期保存在线程池中执行，等锁和重写文件不阻塞事件循环。
+
+计费口径: 收到 HTTP 2xx 响应的请求计费（包括业务 code 不是 200 的响应），
+连接失败、超时和 HTTP 错误不计费，单独统计。实际金额以 TikHub 账单为准。
+
+预算模式:
+    stop   达到预算后拒绝新请求（抛出 BudgetExceeded，批量脚本停止分发，未爬取用户保存到 remaining 文件）
+    slow   花费超过预算的 80% 后逐步拉长请求间隔，达到预算时同样停止
+
+用法:
+    python3 cost_ledger.py output/cost_ledger.json       # 查看各 Token 和最近几次运行的费用
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows 上不加锁
+    fcntl = None
+
+# 每次计费请求的价格（美元）
+PRICE_PER_CALL = 0.001
+
+# slow 模式: 花费超过预算的该比例后开始降速
+SLOW_AT = 0.8
+
+# slow 模式下接近预算时每个请求前的最大等待（秒）
+MAX_SLOW_DELAY = 5.0
+
+# 每多少次计费请求保存一次账本（后台线程）
+SAVE_EVERY = 200
+
+# 账本中保留的运行记录数
+MAX_RUNS = 200
+
+
+class BudgetExceeded(Exception):
+    """费用预算已用完"""
+
+
+def token_id(api_token: str) -> str:
+    """Token 的短哈希（账本中不保存 Token 本身）"""
+    return hashlib.sha256(api_token.encode('utf-8')).hexdigest()[:12]
+
+
+def estimate_cost(pending: int, price_per_call: float = PRICE_PER_CALL, retry_rate: float = 0.0) -> float:
+    """
+    预估费用
+
+    Args:
+        pending: 待爬取用户数（每个用户一次请求）
+        price_per_call: 每次请求价格
+        retry_rate: 预计需要重试的比例（例如历史失败率）
+    """
+    return pending * (1 + retry_rate) * price_per_call
+
+
+class CostLedger:
+    """一次运行的费用账本"""
+
+    def __init__(
+        self,
+        api_token: str,
+        path: str = None,
+        budget: float = None,
+        mode: str = 'stop',
+        price_per_call: float = PRICE_PER_CALL,
+        label: str = None
+    ):
+        """
+        Args:
+            api_token: TikHub API Token（只用于计算哈希）
+            path: 账本 JSON 文件（None 表示只在内存中统计）
+            budget: 本次运行的费用上限（美元，None 表示不限）
+            mode: 'stop' 达到预算后停止 / 'slow' 接近预算时降速，达到后停止
+            price_per_call: 每次请求价格
+            label: 运行说明（例如输出文件名）
+        """
+        if mode not in ('stop', 'slow'):
+            raise ValueError(f"未知的预算模式: {mode}")
+        self.token = token_id(api_token)
+        self.path = Path(path) if path else None
+        self.budget = budget
+        self.mode = mode
+        self.price_per_call = price_per_call
+        self.run_id = f"{time.strftime('%Y%m%d_%H%M%S')}-{os.getpid()}"
+        self.label = label
+        self.started = int(time.time())
+
+        self.calls = 0          # 计费请求
+        self.unbilled = 0       # 未计费请求（连接失败 / HTTP 错误）
+        self._reserved = 0      # 已发出、尚未结算的请求（按计费预留，保证并发下不超预算）
+        self._saved_calls = 0
+        self._saved_unbilled = 0
+        self._save_lock = threading.Lock()
+        self._pending_save = None
+
+    @property
+    def cost(self) -> float:
+        return self.calls * self.price_per_call
+
+    @property
+    def max_calls(self) -> int:
+        """预算内最多可发出的请求数"""
+        if self.budget is None:
+            return None
+        return int(self.budget / self.price_per_call + 1e-9)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.budget is not None and self.calls + self._reserved >= self.max_calls
+
+    async def acquire(self):
+        """发出请求前调用：预算用完时抛出 BudgetExceeded，slow 模式下接近预算时等待"""
+        if self.exhausted:
+            raise BudgetExceeded(f"费用预算 ${self.budget:.2f} 已用完（{self.calls} 次计费请求）")
+        self._reserved += 1
+        if self.mode == 'slow':
+            used = (self.calls + self._reserved) / self.max_calls
+            if used > SLOW_AT:
+                await asyncio.sleep(MAX_SLOW_DELAY * (used - SLOW_AT) / (1 - SLOW_AT))
+
+    def settle(self, billed: bool):
+        """请求结束后调用：billed 表示该请求是否计费"""
+        self._reserved = max(0, self._reserved - 1)
+        if billed:
+            self.calls += 1
+            if self.path and self.calls - self._saved_calls >= SAVE_EVERY and self._pending_save is None:
+                self._save_in_background()
+        else:
+            self.unbilled += 1
+
+    def _save_in_background(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._pending_save = loop.run_in_executor(None, self.save)
+        self._pending_save.add_done_callback(self._save_done)
+
+    def _save_done(self, future):
+        self._pending_save = None
+        if not future.cancelled() and future.exception() is not None:
+            print(f"⚠ 费用账本保存失败: {future.exception()}")
+
+    async def flush(self):
+        """等待后台保存结束后保存剩余的增量（关闭时调用，同样在线程池中执行）"""
+        if self._pending_save is not None:
+            await asyncio.wait([self._pending_save])
+        await asyncio.get_running_loop().run_in_executor(None, self.save)
+
+    def estimate(self, pending: int, retry_rate: float = 0.0) -> float:
+        return estimate_cost(pending, self.price_per_call, retry_rate)
+
+    def _run_entry(self) -> dict:
+        return {
+            'run_id': self.run_id,
+            'label': self.label,
+            'token': self.token,
+            'started': self.started,
+            'updated': int(time.time()),
+            'calls': self.calls,
+            'unbilled': self.unbilled,
+            'cost': round(self.cost, 6),
+            'budget': self.budget
+        }
+
+    def save(self):
+        """把本次运行的增量合并进账本文件（加文件锁，多进程共用同一个文件；可在线程中调用）"""
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._save_lock, open(self.path.with_name(self.path.name + '.lock'), 'w') as lock:
+            # 事件循环在保存期间继续计数，只写入开始时的快照
+            calls, unbilled = self.calls, self.unbilled
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            data = load_ledger(self.path)
+
+            totals = data['tokens'].setdefault(self.token, {'calls': 0, 'unbilled': 0, 'cost': 0.0})
+            totals['calls'] += calls - self._saved_calls
+            totals['unbilled'] += unbilled - self._saved_unbilled
+            totals['cost'] = round(totals['cost'] + (calls - self._saved_calls) * self.price_per_call, 6)
+            totals['last_used'] = int(time.time())
+
+            runs = [run for run in data['runs'] if run.get('run_id') != self.run_id]
+            runs.append(dict(self._run_entry(), calls=calls, unbilled=unbilled, cost=round(calls * self.price_per_call, 6)))
+            data['runs'] = runs[-MAX_RUNS:]
+
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self._saved_calls = calls
+            self._saved_unbilled = unbilled
+
+    def token_total(self) -> dict:
+        """该 Token 在账本中的累计（包含本次运行尚未保存的部分）"""
+        totals = dict(load_ledger(self.path)['tokens'].get(self.token, {})) if self.path else {}
+        calls = totals.get('calls', 0) + self.calls - self._saved_calls
+        return {'calls': calls, 'cost': totals.get('cost', 0.0) + (self.calls - self._saved_calls) * self.price_per_call}
+
+    def format_summary(self) -> str:
+        line = f"💰 本次计费请求: {self.calls:,} 次，约 ${self.cost:.2f}"
+        if self.budget is not None:
+            line += f"（预算 ${self.budget:.2f}）"
+        if self.unbilled:
+            line += f"，未计费 {self.unbilled:,} 次"
+        if self.path:
+            total = self.token_total()
+            line += f"\n   Token {self.token} 累计: {total['calls']:,} 次，约 ${total['cost']:.2f}"
+        return line
+
+
+def load_ledger(path) -> dict:
+    """读取账本文件（不存在时返回空账本）"""
+    path = Path(path)
+    if not path.exists():
+        return {'tokens': {}, 'runs': []}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    data.setdefault('tokens', {})
+    data.setdefault('runs', [])
+    return data
+
+
+def print_ledger(path: str, recent: int = 10):
+    data = load_ledger(path)
+    print("=== 各 Token 累计费用 ===")
+    for token, totals in sorted(data['tokens'].items(), key=lambda item: -item[1].get('cost', 0)):
+        print(f"  {token}: {totals['calls']:,} 次计费请求，约 ${totals['cost']:.2f}（未计费 {totals.get('unbilled', 0):,} 次）")
+    print(f"\n=== 最近 {recent} 次运行 ===")
+    for run in data['runs'][-recent:]:
+        budget = f" / 预算 ${run['budget']:.2f}" if run.get('budget') is not None else ""
+        started = time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started']))
+        print(f"  {started}  {run.get('label') or run['run_id']}: {run['calls']:,} 次，${run['cost']:.2f}{budget}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("用法: python3 cost_ledger.py <账本 JSON>")
+        sys.exit(1)
+    print_ledger(sys.argv[1])
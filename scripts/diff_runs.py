@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+对比两次爬取结果 - 输出变化记录和汇总统计
+
+按 uid 关联两份数据（没有 uid 时依次回退到 sec_uid、username；指定身份索引时按规范实体关联，
+见 identity.py），使用分区哈希连接:
+    1. 两份 CSV 按关联键哈希分到 N 个分区临时文件
+    2. 逐个分区：只把新旧数据的同一个分区载入内存进行匹配
+    3. 第一轮未匹配的行（例如账号被删除后只剩 username 的失败记录）再按 username 做第二轮连接
+内存占用只与单个分区大小有关，分区数足够时可对比千万级数据。
+
+输入也可以是分片数据集目录（sharded_output.py）: 各分片在子进程中并行分区；两份数据集按用户名哈希
+分区方式相同时，SHA-256 相同的分片不读取，其中的行直接计为 unchanged。
+
+变化类型:
+    changed  字段有变化（flags: renamed 改名、verified 新认证、unverified 取消认证、
+             deleted 成功→失败、restored 失败→成功）
+    added    只在新数据中出现
+    removed  只在旧数据中出现
+
+用法:
+    python3 diff_runs.py output/run1.csv output/run2.csv output/diff.jsonl [分区数] [identity.db]
+"""
+
+import csv
+import json
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+from compressed_io import open_text
+from schema import CSV_FIELDS
+from sharded_output import dataset_files, is_dataset, load_manifest, map_shards
+
+# 参与对比的字段（scrape_time、头像签名 URL 等每次都会变化的字段不比较）
+COMPARE_FIELDS = [
+    'unique_id',
+    'nickname',
+    'signature',
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count',
+    'verification_type',
+    'verified',
+    'bio_email',
+    'category',
+    'account_type',
+    'scrape_status'
+]
+
+COUNTER_FIELDS = [
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count'
+]
+
+FIELD_INDEX = {field: i for i, field in enumerate(CSV_FIELDS)}
+COMPARE_INDEXES = [(field, FIELD_INDEX[field]) for field in COMPARE_FIELDS]
+USERNAME = FIELD_INDEX['username']
+UNIQUE_ID = FIELD_INDEX['unique_id']
+UID = FIELD_INDEX['uid']
+SEC_UID = FIELD_INDEX['sec_uid']
+STATUS = FIELD_INDEX['scrape_status']
+
+
+def primary_key(row: list) -> str:
+    """第一轮关联键: uid → sec_uid → username"""
+    if row[UID]:
+        return 'uid:' + row[UID]
+    if row[SEC_UID]:
+        return 'sec:' + row[SEC_UID]
+    return 'user:' + row[USERNAME].lower()
+
+
+def entity_key_fn(index):
+    """第一轮关联键: 身份索引中的规范实体 ID"""
+    def entity_key(row: list) -> str:
+        return 'entity:' + index.entity_of(row[UID], row[SEC_UID], row[UNIQUE_ID], row[USERNAME])
+    return entity_key
+
+
+def username_key(row: list) -> str:
+    """第二轮关联键: username"""
+    return 'user:' + row[USERNAME].lower()
+
+
+def _bucket_of(key: str, partitions: int) -> int:
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+
+class _PartitionWriter:
+    """把行按关联键哈希写入 N 个分区文件"""
+
+    def __init__(self, directory: Path, prefix: str, partitions: int, key_fn):
+        self.partitions = partitions
+        self.key_fn = key_fn
+        self.paths = [directory / f"{prefix}-{i:04d}.csv" for i in range(partitions)]
+        self._files = [open(path, 'w', newline='', encoding='utf-8') for path in self.paths]
+        self._writers = [csv.writer(f) for f in self._files]
+        self.count = 0
+
+    def write(self, row: list):
+        self._writers[_bucket_of(self.key_fn(row), self.partitions)].writerow(row)
+        self.count += 1
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+def _iter_csv(csv_path: str, skip: dict = None):
+    """按 CSV_FIELDS 顺序读取行（缺失的列补空字符串；分片数据集依次读取 skip 以外的分片）"""
+    for path in dataset_files(csv_path):
+        if skip and path.name in skip:
+            continue
+        with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            positions = [header.index(field) if field in header else None for field in CSV_FIELDS]
+            for row in reader:
+                yield [row[p] if p is not None and p < len(row) else '' for p in positions]
+
+
+def _iter_partition(paths: list):
+    for path in paths:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            yield from csv.reader(f)
+
+
+def _partition_shard(args) -> tuple:
+    """子进程: 把一个分片按主关联键写入自己的一组分区文件"""
+    csv_path, work_dir, prefix, partitions = args
+    writer = _PartitionWriter(Path(work_dir), prefix, partitions, primary_key)
+    for row in _iter_csv(csv_path):
+        writer.write(row)
+    writer.close()
+    return writer.paths, writer.count
+
+
+def _partition_input(csv_path: str, work_dir: Path, prefix: str, partitions: int, key_fn, skip: dict = None) -> tuple:
+    """
+    把一份输入按关联键分区
+
+    分片数据集按 uid 关联时各分片并行分区（身份索引不能跨进程共享，此时依次读取）。
+
+    Returns:
+        (每个分区的文件列表, 行数)
+    """
+    if is_dataset(csv_path) and key_fn is primary_key:
+        shards = [path for path in dataset_files(csv_path) if not skip or path.name not in skip]
+        items = [(str(path), str(work_dir), f"{prefix}-s{n:03d}", partitions) for n, path in enumerate(shards)]
+        paths = [[] for _ in range(partitions)]
+        count = 0
+        for shard_paths, shard_count in map_shards(_partition_shard, items):
+            for i, path in enumerate(shard_paths):
+                paths[i].append(path)
+            count += shard_count
+        return paths, count
+
+    writer = _PartitionWriter(work_dir, prefix, partitions, key_fn)
+    for row in _iter_csv(csv_path, skip):
+        writer.write(row)
+    writer.close()
+    return [[path] for path in writer.paths], writer.count
+
+
+def identical_shards(old_csv: str, new_csv: str) -> dict:
+    """
+    两份数据集中内容相同的分片 {文件名: 行数}
+
+    只在两边都按用户名哈希、分区数相同时成立: 同一用户在两边落在同名分片中。
+    """
+    if not (is_dataset(old_csv) and is_dataset(new_csv)):
+        return {}
+    old, new = load_manifest(old_csv), load_manifest(new_csv)
+    if old['partitioning'] != new['partitioning'] or old['partitioning'].get('by') != 'hash':
+        return {}
+    new_checksums = {shard['file']: shard['sha256'] for shard in new['shards']}
+    return {shard['file']: shard['rows'] for shard in old['shards'] if new_checksums.get(shard['file']) == shard['sha256']}
+
+
+def _prefer(existing: list, row: list) -> list:
+    """同一份数据内关联键重复时，保留成功的记录，其次保留后出现的记录"""
+    if existing is None or row[STATUS] == 'success' or existing[STATUS] != 'success':
+        return row
+    return existing
+
+
+def compare_rows(old: list, new: list) -> dict:
+    """对比两行，没有变化时返回 None"""
+    fields = {}
+    for field, index in COMPARE_INDEXES:
+        if old[index] != new[index]:
+            fields[field] = [old[index], new[index]]
+    if not fields:
+        return None
+
+    flags = []
+    old_success = old[STATUS] == 'success'
+    new_success = new[STATUS] == 'success'
+    if old_success and not new_success:
+        flags.append('deleted')
+    elif new_success and not old_success:
+        flags.append('restored')
+    elif 'unique_id' in fields and all(fields['unique_id']):
+        flags.append('renamed')
+    if 'verified' in fields and old_success and new_success:
+        flags.append('verified' if new[FIELD_INDEX['verified']] == 'Yes' else 'unverified')
+
+    return {
+        'change': 'changed',
+        'username': new[USERNAME] or old[USERNAME],
+        'uid': new[UID] or old[UID],
+        'flags': flags,
+        'fields': fields
+    }
+
+
+class DiffSummary:
+    """变化汇总统计"""
+
+    def __init__(self):
+        self.counts = {'changed': 0, 'added': 0, 'removed': 0, 'unchanged': 0}
+        self.flags = {}
+        self.fields = {}
+        self.counter_deltas = {field: 0 for field in COUNTER_FIELDS}
+
+    def add(self, record: dict):
+        self.counts[record['change']] += 1
+        for flag in record.get('flags', []):
+            self.flags[flag] = self.flags.get(flag, 0) + 1
+        for field, (old, new) in record.get('fields', {}).items():
+            self.fields[field] = self.fields.get(field, 0) + 1
+            if field in self.counter_deltas and old and new:
+                self.counter_deltas[field] += int(new) - int(old)
+
+    def to_dict(self) -> dict:
+        return {
+            'counts': self.counts,
+            'flags': self.flags,
+            'changed_fields': dict(sorted(self.fields.items(), key=lambda x: -x[1])),
+            'counter_deltas': self.counter_deltas
+        }
+
+
+def _join_partition(old_paths: list, new_paths: list, key_fn, emit, leftover_old=None, leftover_new=None):
+    """
+    连接一个分区: 新旧数据的同一分区载入内存后匹配
+
+    未匹配的行写入 leftover_*（第二轮连接），为 None 时直接输出为 added/removed。
+    """
+    old_rows = {}
+    for row in _iter_partition(old_paths):
+        key = key_fn(row)
+        old_rows[key] = _prefer(old_rows.get(key), row)
+
+    new_rows = {}
+    for row in _iter_partition(new_paths):
+        key = key_fn(row)
+        new_rows[key] = _prefer(new_rows.get(key), row)
+
+    for key, new in new_rows.items():
+        old = old_rows.pop(key, None)
+        if old is not None:
+            emit(compare_rows(old, new) or {'change': 'unchanged'})
+        elif leftover_new is not None:
+            leftover_new.write(new)
+        else:
+            emit({'change': 'added', 'username': new[USERNAME], 'uid': new[UID]})
+
+    for old in old_rows.values():
+        if leftover_old is not None:
+            leftover_old.write(old)
+        else:
+            emit({'change': 'removed', 'username': old[USERNAME], 'uid': old[UID]})
+
+
+def diff_runs(old_csv: str, new_csv: str, output_jsonl: str, partitions: int = 64, identity_db: str = None) -> dict:
+    """
+    对比两次爬取结果
+
+    Args:
+        old_csv: 旧数据 CSV（或分片数据集目录）
+        new_csv: 新数据 CSV（或分片数据集目录）
+        output_jsonl: 变化记录输出文件（每行一个 JSON）
+        partitions: 分区数（越大单分区内存越小，千万级数据建议 256 以上）
+        identity_db: 身份索引数据库，设置后先用两份数据更新索引，再按规范实体关联
+
+    Returns:
+        汇总统计
+    """
+    print("="*60)
+    print("对比两次爬取结果")
+    print("="*60)
+    print(f"旧数据: {old_csv}")
+    print(f"新数据: {new_csv}")
+    print(f"分区数: {partitions}")
+    print()
+
+    started = time.perf_counter()
+    output_path = Path(output_jsonl)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(prefix='diff_', dir=output_path.parent))
+    summary = DiffSummary()
+
+    index = None
+    first_key = primary_key
+    if identity_db:
+        from identity import build_identity_index
+        index = build_identity_index([old_csv, new_csv], identity_db)
+        first_key = entity_key_fn(index)
+
+    # 按 manifest 跳过两边内容相同的分片（规范实体关联可能跨分片，不跳过）
+    skip = identical_shards(old_csv, new_csv) if index is None else {}
+    if skip:
+        summary.counts['unchanged'] += sum(skip.values())
+        print(f"✓ 按 manifest 跳过 {len(skip)} 个内容相同的分片（{sum(skip.values()):,} 行）")
+
+    try:
+        # 1. 按主关联键分区
+        old_parts, old_count = _partition_input(old_csv, work_dir, 'old', partitions, first_key, skip)
+        new_parts, new_count = _partition_input(new_csv, work_dir, 'new', partitions, first_key, skip)
+        print(f"✓ 分区完成: 旧 {old_count:,} 行, 新 {new_count:,} 行")
+
+        with open(output_path, 'w', encoding='utf-8') as out:
+            def emit(record):
+                summary.add(record)
+                if record['change'] != 'unchanged':
+                    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+            if index is not None:
+                # 规范实体已经包含 username 关联（且不会关联被其他账号重新使用的用户名），只需一轮
+                for old_paths, new_paths in zip(old_parts, new_parts):
+                    _join_partition(old_paths, new_paths, first_key, emit)
+            else:
+                # 2. 第一轮: uid / sec_uid 关联，未匹配的行按 username 重新分区
+                leftover_old = _PartitionWriter(work_dir, 'left-old', partitions, username_key)
+                leftover_new = _PartitionWriter(work_dir, 'left-new', partitions, username_key)
+                for old_paths, new_paths in zip(old_parts, new_parts):
+                    _join_partition(old_paths, new_paths, first_key, emit, leftover_old, leftover_new)
+                leftover_old.close()
+                leftover_new.close()
+                print(f"✓ 第一轮关联完成，未匹配: 旧 {leftover_old.count:,} 行, 新 {leftover_new.count:,} 行")
+
+                # 3. 第二轮: username 关联
+                for old_path, new_path in zip(leftover_old.paths, leftover_new.paths):
+                    _join_partition([old_path], [new_path], username_key, emit)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if index is not None:
+            index.close()
+
+    result = summary.to_dict()
+    elapsed = time.perf_counter() - started
+
+    print()
+    print("="*60)
+    print("对比统计")
+    print("="*60)
+    for change, count in result['counts'].items():
+        print(f"{change}: {count:,}")
+    for flag, count in result['flags'].items():
+        print(f"  {flag}: {count:,}")
+    print(f"粉丝净变化: {result['counter_deltas']['follower_count']:+,}")
+    print(f"变化记录: {output_jsonl}")
+    print(f"耗时: {elapsed:.1f} 秒")
+    print("="*60)
+
+    with open(output_path.with_name(output_path.stem + '.summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("用法: python3 diff_runs.py <old.csv> <new.csv> <diff.jsonl> [分区数] [identity.db]")
+        sys.exit(1)
+
+    diff_runs(
+        sys.argv[1],
+        sys.argv[2],
+        sys.argv[3],
+        int(sys.argv[4]) if len(sys.argv) > 4 else 64,
+        sys.argv[5] if len(sys.argv) > 5 else None
+    )
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+批量下载头像 - 按内容哈希存储，相同图片（例如默认头像）只保存一份
+
+存储结构:
+    <avatar_dir>/blobs/ab/<sha256>   图片内容，文件名为 sha256
+    <avatar_dir>/index.jsonl         每行一条记录: 用户 → 头像 → blob
+
+    - 头像 URL 带签名且会过期（x-expires 参数），按过期时间从早到晚下载，已过期的直接跳过（需重新爬取资料）
+    - 以 uid + URL 路径（不含签名参数）作为头像标识，已在索引中的头像不会重复下载，中断后重新运行即可续传
+    - 同一批中 URL 路径相同的头像（例如默认头像）只请求一次
+    - 独立的并发数和 QPS 限制，不占用资料接口的限流额度
+    - 429 / 5xx / 网络错误按 Retry-After 或指数退避重试，等待时间会超过 URL 过期时间时放弃
+
+用法:
+    python3 download_avatars.py output/nova01_users.csv avatars [并发数] [每秒请求数]
+"""
+
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+from compressed_io import open_text
+from rate_limiter import AsyncRateLimiter
+import runtime
+
+# 暂时性错误的最多重试次数
+MAX_RETRIES = 3
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 指数退避的基础等待时间（秒），第 n 次重试等待 RETRY_BACKOFF * 2^(n-1)
+RETRY_BACKOFF = 1.0
+
+# Retry-After 的上限（秒）
+MAX_RETRY_AFTER = 60.0
+
+
+def avatar_key(row: dict) -> str:
+    """头像标识: uid（没有时用 username）+ URL 路径，换头像后路径会变化"""
+    owner = row.get('uid') or row.get('username', '').lower()
+    return f"{owner}:{urlsplit(row['avatar_larger_url']).path}"
+
+
+def retry_delay(response, attempt: int) -> float:
+    """第 attempt 次重试前的等待时间（优先使用 Retry-After 秒数）"""
+    if response is not None:
+        try:
+            return min(float(response.headers.get('retry-after', '')), MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return RETRY_BACKOFF * 2 ** (attempt - 1)
+
+
+def url_expires(url: str) -> int:
+    """签名 URL 的过期时间戳（没有 x-expires 参数时返回 0，视为不过期）"""
+    values = parse_qs(urlsplit(url).query).get('x-expires')
+    try:
+        return int(values[0]) if values else 0
+    except ValueError:
+        return 0
+
+
+class AvatarStore:
+    """按内容哈希存储的头像库"""
+
+    def __init__(self, avatar_dir: str):
+        self.root = Path(avatar_dir)
+        self.blob_dir = self.root / 'blobs'
+        self.index_path = self.root / 'index.jsonl'
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+
+        # 头像标识 → sha256
+        self.index = {}
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中断时可能留下写了一半的最后一行
+                        continue
+                    self.index[entry['key']] = entry['sha256']
+        self._index_file = open(self.index_path, 'a', encoding='utf-8')
+
+    def blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    def put_blob(self, content: bytes) -> tuple:
+        """
+        保存图片内容（在线程池中调用），返回 (sha256, 是否新写入)
+
+        先写临时文件再重命名，多个进程同时写同一个 blob 也不会留下不完整的文件。
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(sha256)
+        if path.exists():
+            return sha256, False
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(f"{sha256}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        tmp.replace(path)
+        return sha256, True
+
+    def record(self, key: str, row: dict, sha256: str, size: int, content_type: str):
+        """追加索引记录（每条记录一次写入并立即 flush，崩溃时不会丢失 blob 已落盘的记录）"""
+        self.index[key] = sha256
+        entry = {
+            'key': key,
+            'username': row.get('username', ''),
+            'uid': row.get('uid', ''),
+            'sha256': sha256,
+            'size': size,
+            'content_type': content_type,
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self._index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._index_file.flush()
+
+    def close(self):
+        self._index_file.close()
+
+
+def pending_avatars(rows, store: AvatarStore, now: float = None) -> tuple:
+    """
+    需要下载的头像，按过期时间排序
+
+    Returns:
+        (待下载列表 [(expires, key, row)], 已下载数, 已过期数)
+    """
+    now = now or time.time()
+    pending = {}
+    done = expired = 0
+    for row in rows:
+        if row.get('scrape_status') != 'success' or not row.get('avatar_larger_url'):
+            continue
+        key = avatar_key(row)
+        if key in store.index:
+            done += 1
+            continue
+        expires = url_expires(row['avatar_larger_url'])
+        if expires and expires <= now:
+            expired += 1
+            continue
+        pending[key] = (expires or float('inf'), key, row)
+    return sorted(pending.values(), key=lambda item: item[0]), done, expired
+
+
+async def download_avatars(
+    rows,
+    avatar_dir: str,
+    client: httpx.AsyncClient = None,
+    concurrency: int = 20,
+    max_rps: float = None
+) -> dict:
+    """
+    下载一批用户的头像
+
+    Args:
+        rows: 爬取结果（scrape_single_user 的返回值或 CSV 行）
+        avatar_dir: 头像库目录
+        client: 共享的 httpx.AsyncClient（例如爬虫的连接池），None 时自行创建
+        concurrency: 同时下载数
+        max_rps: 每秒最多请求数（None 表示不限流）
+
+    Returns:
+        统计 {'downloaded', 'new_blobs', 'skipped', 'expired', 'failed', 'retried', 'bytes'}
+    """
+    store = AvatarStore(avatar_dir)
+    pending, skipped, expired = pending_avatars(rows, store)
+    stats = {'downloaded': 0, 'new_blobs': 0, 'skipped': skipped, 'expired': expired, 'failed': 0, 'retried': 0, 'bytes': 0}
+
+    print(f"头像: 待下载 {len(pending)}，已下载 {skipped}，已过期 {expired}")
+    if not pending:
+        store.close()
+        return stats
+
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+    rate_limiter = AsyncRateLimiter(max_rps) if max_rps else None
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+
+    # 相同 URL 路径（例如默认头像）只下载一次，结果记录到所有引用它的用户
+    by_path = {}
+    for _, key, row in pending:
+        by_path.setdefault(urlsplit(row['avatar_larger_url']).path, []).append((key, row))
+
+    async def fetch(row):
+        """下载一个头像，暂时性错误重试；返回 (响应, 错误说明)"""
+        expires = url_expires(row['avatar_larger_url'])
+        for attempt in range(MAX_RETRIES + 1):
+            response, error = None, None
+            async with semaphore:
+                if rate_limiter:
+                    await rate_limiter.acquire()
+                try:
+                    response = await client.get(row['avatar_larger_url'])
+                except httpx.HTTPError as e:
+                    error = type(e).__name__
+            if error is None and response.status_code not in RETRY_STATUS:
+                return response, None if response.status_code == 200 else f"HTTP {response.status_code}"
+            error = error or f"HTTP {response.status_code}"
+            delay = retry_delay(response, attempt + 1)
+            if attempt == MAX_RETRIES or (expires and time.time() + delay >= expires):
+                return None, error
+            stats['retried'] += 1
+            await asyncio.sleep(delay)
+
+    async def download_one(owners):
+        key, row = owners[0]
+        response, error = await fetch(row)
+        if error:
+            print(f"  ✗ 头像下载失败 @{row.get('username', '')}: {error}")
+            stats['failed'] += len(owners)
+            return
+
+        content = response.content
+        # 哈希和写文件在线程池中进行，不阻塞事件循环
+        sha256, new_blob = await loop.run_in_executor(None, store.put_blob, content)
+        for owner_key, owner_row in owners:
+            store.record(owner_key, owner_row, sha256, len(content), response.headers.get('content-type', ''))
+        stats['downloaded'] += len(owners)
+        stats['new_blobs'] += new_blob
+        stats['bytes'] += len(content) if new_blob else 0
+
+    try:
+        await asyncio.gather(*(download_one(owners) for owners in by_path.values()))
+    finally:
+        store.close()
+        if own_client:
+            await client.aclose()
+
+    print(
+        f"✓ 头像下载 {stats['downloaded']} 个（新图片 {stats['new_blobs']} 个, "
+        f"{stats['bytes'] / 1024 / 1024:.1f} MB），失败 {stats['failed']} 个"
+        + (f"，重试 {stats['retried']} 次" if stats['retried'] else "")
+    )
+    return stats
+
+
+async def main():
+    if len(sys.argv) < 3:
+        print("用法: python3 download_avatars.py <users.csv> <avatar_dir> [并发数] [每秒请求数]")
+        sys.exit(1)
+
+    with open_text(sys.argv[1], 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    await download_avatars(
+        rows,
+        sys.argv[2],
+        concurrency=int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+        max_rps=float(sys.argv[4]) if len(sys.argv) > 4 else None
+    )
+
+
+if __name__ == "__main__":
+    runtime.run(main())
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+跨多次爬取的身份解析 - 把改名前后的同一个账号归为同一个实体
+
+每行结果中的标识符作为并查集节点:
+    uid:<uid>          账号唯一数字 ID
+    sec:<sec_uid>      账号 sec_uid
+    handle:<用户名>    unique_id 和输入列表中的 username（小写，同一命名空间）
+同一行中出现的标识符合并为一个簇，例如改名后 username=旧名、unique_id=新名、uid 相同，
+两个用户名就会归到同一个实体。用户名可能被其他账号重新注册，因此两个已有不同 uid 的簇不会合并。
+
+并查集存放在 SQLite 文件中（按需缓存），可处理千万级记录；合并、对比和分析工具通过
+IdentityIndex.entity_of() 或 canonical_rows() 使用规范实体视图。
+
+用法:
+    python3 identity.py build identity.db output/nova01_users.csv output/nova02_users.csv
+    python3 identity.py canonical identity.db output/entities.csv output/nova01_users.csv output/nova02_users.csv
+"""
+
+import csv
+import sqlite3
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+from compressed_io import open_text
+from sharded_output import dataset_files
+from schema import CSV_FIELDS
+
+
+def identity_keys(uid: str = '', sec_uid: str = '', unique_id: str = '', username: str = '') -> list:
+    """一行结果对应的并查集节点（uid 在最前）"""
+    keys = []
+    if uid:
+        keys.append('uid:' + str(uid))
+    if sec_uid:
+        keys.append('sec:' + sec_uid)
+    for handle in (unique_id, username):
+        if handle:
+            key = 'handle:' + handle.lstrip('@').lower()
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+
+class IdentityIndex:
+    """SQLite 持久化的并查集"""
+
+    def __init__(self, db_path: str, cache_limit: int = 500000, read_only: bool = False):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            cache_limit: 内存缓存的节点数上限，超过时写回数据库并清空
+            read_only: 只读打开已建立的索引（分析报告等只查询实体的场景，不修改数据库）
+        """
+        self.db_path = db_path
+        self.cache_limit = cache_limit
+        self.conflicts = 0
+        self.read_only = read_only
+        # key -> [parent, size, uid]，修改过的节点记录在 _dirty 中
+        self._cache = {}
+        self._dirty = set()
+        if read_only:
+            if not Path(db_path).exists():
+                raise FileNotFoundError(f"身份索引不存在: {db_path}（先用 identity.py build 建立）")
+            self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            return
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS nodes (
+                key TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                size INTEGER NOT NULL DEFAULT 1,
+                uid TEXT
+            ) WITHOUT ROWID;
+        """)
+
+    def _node(self, key: str):
+        node = self._cache.get(key)
+        if node is None:
+            row = self.conn.execute(
+                "SELECT parent, size, uid FROM nodes WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            node = self._cache[key] = list(row)
+        return node
+
+    def _set(self, key: str, node: list):
+        self._cache[key] = node
+        self._dirty.add(key)
+
+    def _find(self, key: str) -> str:
+        """查找根节点（路径压缩），节点不存在时返回 None"""
+        node = self._node(key)
+        if node is None:
+            return None
+        path = []
+        while node[0] != key:
+            path.append(key)
+            key = node[0]
+            node = self._node(key)
+        for child in path:
+            child_node = self._cache[child]
+            if child_node[0] != key:
+                child_node[0] = key
+                self._dirty.add(child)
+        return key
+
+    def _ensure(self, key: str) -> str:
+        root = self._find(key)
+        if root is None:
+            uid = key[4:] if key.startswith('uid:') else None
+            self._set(key, [key, 1, uid])
+            root = key
+        return root
+
+    def _union(self, a: str, b: str) -> bool:
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return True
+        node_a, node_b = self._cache[root_a], self._cache[root_b]
+        if node_a[2] and node_b[2] and node_a[2] != node_b[2]:
+            # 用户名被另一个账号重新使用，不合并两个不同 uid 的簇
+            self.conflicts += 1
+            return False
+        if node_a[1] < node_b[1]:
+            root_a, root_b, node_a, node_b = root_b, root_a, node_b, node_a
+        node_b[0] = root_a
+        node_a[1] += node_b[1]
+        node_a[2] = node_a[2] or node_b[2]
+        self._dirty.update((root_a, root_b))
+        return True
+
+    def add(self, uid: str = '', sec_uid: str = '', unique_id: str = '', username: str = ''):
+        """加入一行结果的标识符并合并"""
+        keys = identity_keys(uid, sec_uid, unique_id, username)
+        if not keys:
+            return
+        for key in keys:
+            self._ensure(key)
+        for key in keys[1:]:
+            self._union(keys[0], key)
+        if len(self._cache) > self.cache_limit:
+            self.flush()
+
+    def add_row(self, row: dict):
+        self.add(row.get('uid', ''), row.get('sec_uid', ''), row.get('unique_id', ''), row.get('username', ''))
+
+    def add_csv(self, csv_path: str) -> int:
+        """加入一个 CSV（或分片数据集）中的所有行，返回行数"""
+        count = 0
+        for path in dataset_files(csv_path):
+            with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+                for row in csv.DictReader(f):
+                    self.add_row(row)
+                    count += 1
+        self.flush()
+        return count
+
+    def flush(self):
+        """把修改过的节点写回数据库并清空缓存（只读时只清空缓存）"""
+        if self._dirty and not self.read_only:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO nodes (key, parent, size, uid) VALUES (?, ?, ?, ?)",
+                ((key, *self._cache[key]) for key in self._dirty)
+            )
+            self.conn.commit()
+        self._cache.clear()
+        self._dirty.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def entity_of(self, uid: str = '', sec_uid: str = '', unique_id: str = '', username: str = '') -> str:
+        """
+        规范实体 ID: 簇中有 uid 时为 'uid:<uid>'，否则为簇的根节点
+
+        未建立索引的标识符回退为第一个标识符本身。
+        """
+        if len(self._cache) > self.cache_limit:
+            self.flush()
+        keys = identity_keys(uid, sec_uid, unique_id, username)
+        for key in keys:
+            root = self._find(key)
+            if root is not None:
+                cluster_uid = self._cache[root][2]
+                return 'uid:' + cluster_uid if cluster_uid else root
+        return keys[0] if keys else ''
+
+    def entity_of_row(self, row: dict) -> str:
+        return self.entity_of(row.get('uid', ''), row.get('sec_uid', ''), row.get('unique_id', ''), row.get('username', ''))
+
+
+def build_identity_index(csv_files: list, db_path: str) -> IdentityIndex:
+    """用多个 CSV 建立（或增量更新）身份索引"""
+    index = IdentityIndex(db_path)
+    for csv_file in csv_files:
+        count = index.add_csv(csv_file)
+        print(f"✓ {csv_file}: {count:,} 行")
+    if index.conflicts:
+        print(f"⚠ {index.conflicts} 个用户名对应不同 uid（被其他账号重新使用），未合并")
+    return index
+
+
+def _better(existing: dict, row: dict) -> bool:
+    """同一实体的多行中选择成功的、较新的一行"""
+    existing_ok = existing.get('scrape_status') == 'success'
+    row_ok = row.get('scrape_status') == 'success'
+    if row_ok != existing_ok:
+        return row_ok
+    return row.get('scrape_time', '') >= existing.get('scrape_time', '')
+
+
+def canonical_rows(csv_files: list, index: IdentityIndex, partitions: int = 16):
+    """
+    规范实体视图: 每个实体只输出一行（成功且最新的一行）
+
+    先按实体 ID 哈希分区写入临时文件，再逐个分区去重，内存只与单个分区大小有关。
+    """
+    with tempfile.TemporaryDirectory(prefix='entities_') as work_dir:
+        paths = [Path(work_dir) / f"part-{i:04d}.csv" for i in range(partitions)]
+        files = [open(path, 'w', newline='', encoding='utf-8') for path in paths]
+        writers = [csv.writer(f) for f in files]
+
+        for csv_file in csv_files:
+            for path in dataset_files(csv_file):
+                with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+                    for row in csv.DictReader(f):
+                        entity = index.entity_of_row(row)
+                        bucket = zlib.crc32(entity.encode('utf-8')) % partitions
+                        writers[bucket].writerow([entity] + [row.get(field, '') for field in CSV_FIELDS])
+        for f in files:
+            f.close()
+
+        for path in paths:
+            best = {}
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                for values in csv.reader(f):
+                    row = dict(zip(CSV_FIELDS, values[1:]))
+                    existing = best.get(values[0])
+                    if existing is None or _better(existing, row):
+                        best[values[0]] = row
+            for entity, row in best.items():
+                yield entity, row
+
+
+def write_canonical_csv(csv_files: list, db_path: str, output_csv: str):
+    """输出规范实体 CSV（增加 entity_id 列）"""
+    index = build_identity_index(csv_files, db_path)
+    output_path = Path(output_csv)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    with open_text(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=['entity_id'] + CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for entity, row in canonical_rows(csv_files, index):
+            writer.writerow({'entity_id': entity, **row})
+            count += 1
+    index.close()
+
+    print(f"✓ {count:,} 个规范实体已保存到: {output_csv}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in ('build', 'canonical'):
+        print("用法:")
+        print("  python3 identity.py build <identity.db> <csv...>")
+        print("  python3 identity.py canonical <identity.db> <output.csv> <csv...>")
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        build_identity_index(sys.argv[3:], sys.argv[2]).close()
+    else:
+        write_canonical_csv(sys.argv[4:], sys.argv[2], sys.argv[3])
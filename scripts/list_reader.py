@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+大用户列表读取 - mmap 按换行对齐分块，并行解析或惰性逐行读取，支持字节偏移检查点
+
+    - 按行读取千万行列表会先把所有行读进内存；这里用 mmap 映射文件，按 chunk_size 切成
+      以换行结尾的块，多个进程各自解析一块（read_usernames），或在一个进程中惰性读取（iter_usernames）
+    - 每个用户带有所在行结束的字节偏移；ListCheckpoint 记录"此偏移之前的用户都已处理"，
+      中断后的运行可以直接从该偏移继续，不必重新读取和过滤前面的行
+    - 与批量爬取原有规则相同，只接受含 @用户名 的行（通常是 TikTok URL），表头、注释等其他行跳过；
+      bare=True 时同时接受单独一个用户名的行（planner 的规则，见 planner.extract_username）
+    - .gz / .zst 列表无法 mmap，按顺序流式解压（偏移为解压后的字节数）
+
+用法:
+    python3 list_reader.py "data/Nova 01 User list"           # 统计用户数和读取速度
+    python3 list_reader.py big_list.txt --workers 8
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from compressed_io import compression_of, open_binary
+
+# 每块大小（字节）
+CHUNK_SIZE = 32 * 1024 * 1024
+
+# 检查点指纹使用的文件头长度
+FINGERPRINT_BYTES = 64 * 1024
+
+URL_USERNAME_RE = re.compile(rb'@([a-zA-Z0-9_\.]+)')
+BARE_USERNAME_RE = re.compile(rb'^@?([a-zA-Z0-9_\.]+)$')
+
+
+def _parse_lines(data, base: int, usernames: list, offsets: list, bare: bool = False):
+    """解析一段以换行结尾的字节，用户名和行结束偏移分别追加到两个列表"""
+    position = base
+    for line in data.split(b'\n'):
+        position += len(line) + 1
+        line = line.strip()
+        if not line:
+            continue
+        if bare and b'/' not in line:
+            match = BARE_USERNAME_RE.match(line)
+        else:
+            match = URL_USERNAME_RE.search(line)
+        if match:
+            usernames.append(match.group(1).decode('ascii'))
+            offsets.append(position)
+
+
+def _map(path):
+    """只读 mmap（空文件返回 None）"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def chunk_boundaries(path, chunk_size: int = CHUNK_SIZE, start: int = 0) -> list:
+    """把文件从 start 开始切成以换行结尾的块 [(起点, 终点), ...]"""
+    data = _map(path)
+    if data is None:
+        return []
+    try:
+        size = len(data)
+        bounds = []
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = data.find(b'\n', end)
+                end = size if newline < 0 else newline + 1
+            bounds.append((start, end))
+            start = end
+        return bounds
+    finally:
+        data.close()
+
+
+def _read_chunk(args) -> tuple:
+    """子进程: 解析一块，返回 (用户名列表, 行结束偏移列表)"""
+    path, start, end, bare = args
+    usernames, offsets = [], []
+    data = _map(path)
+    try:
+        _parse_lines(data[start:end], start, usernames, offsets, bare)
+    finally:
+        data.close()
+    return usernames, offsets
+
+
+def iter_chunks(path, start: int = 0, chunk_size: int = CHUNK_SIZE, bare: bool = False):
+    """惰性逐块读取，每次产生 (用户名列表, 行结束偏移列表)；内存只保留一块"""
+    if compression_of(path):
+        # 压缩文件不能 mmap，流式解压并跳过 start 之前的字节
+        with open_binary(path) as f:
+            position = 0
+            pending = b''
+            while True:
+                block = f.read(chunk_size)
+                if not block:
+                    break
+                data = pending + block
+                cut = data.rfind(b'\n') + 1
+                pending = data[cut:]
+                usernames, offsets = [], []
+                if cut:
+                    _parse_lines(data[:cut - 1], position, usernames, offsets, bare)
+                    position += cut
+                yield _skip_before(usernames, offsets, start)
+            if pending:
+                usernames, offsets = [], []
+                _parse_lines(pending, position, usernames, offsets, bare)
+                yield _skip_before(usernames, offsets, start)
+        return
+
+    for chunk_start, chunk_end in chunk_boundaries(path, chunk_size, start):
+        yield _read_chunk((str(path), chunk_start, chunk_end, bare))
+
+
+def _skip_before(usernames: list, offsets: list, start: int) -> tuple:
+    if not start or not offsets or offsets[0] > start:
+        return usernames, offsets
+    keep = next((i for i, offset in enumerate(offsets) if offset > start), len(offsets))
+    return usernames[keep:], offsets[keep:]
+
+
+def iter_usernames(path, start: int = 0, chunk_size: int = CHUNK_SIZE, bare: bool = False):
+    """惰性逐个读取 (用户名, 行结束偏移)，从字节偏移 start 开始"""
+    for usernames, offsets in iter_chunks(path, start, chunk_size, bare):
+        yield from zip(usernames, offsets)
+
+
+def read_usernames(path, start: int = 0, workers: int = None, chunk_size: int = CHUNK_SIZE, bare: bool = False) -> tuple:
+    """
+    读取整个列表（保持原顺序），大文件多进程并行解析
+
+    Args:
+        path: 用户列表文件
+        start: 从该字节偏移开始（检查点）
+        workers: 进程数（默认 CPU 核心数；文件只有一块时不启动子进程）
+        chunk_size: 每块大小
+        bare: 是否接受只有用户名（没有 @ 和 URL）的行
+
+    Returns:
+        (用户名列表, 行结束偏移列表)
+    """
+    usernames, offsets = [], []
+    bounds = [] if compression_of(path) else chunk_boundaries(path, chunk_size, start)
+    if len(bounds) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(bounds))) as pool:
+            for chunk_usernames, chunk_offsets in pool.map(_read_chunk, [(str(path), s, e, bare) for s, e in bounds]):
+                usernames.extend(chunk_usernames)
+                offsets.extend(chunk_offsets)
+    else:
+        for chunk_usernames, chunk_offsets in iter_chunks(path, start, chunk_size, bare):
+            usernames.extend(chunk_usernames)
+            offsets.extend(chunk_offsets)
+    return usernames, offsets
+
+
+def _fingerprint(path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(FINGERPRINT_BYTES)).hexdigest()
+
+
+class ListCheckpoint:
+    """用户列表的处理进度（字节偏移），保存为 JSON"""
+
+    def __init__(self, checkpoint_file, list_file):
+        self.path = Path(checkpoint_file)
+        self.list_file = str(list_file)
+
+    def load(self) -> int:
+        """上次保存的偏移；列表文件被替换（文件头变化或变短）时返回 0"""
+        if not self.path.exists():
+            return 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('list_file') != self.list_file:
+            return 0
+        if data.get('fingerprint') != _fingerprint(self.list_file) or os.path.getsize(self.list_file) < data.get('size', 0):
+            print(f"⚠ 用户列表已变化，忽略检查点: {self.path}")
+            return 0
+        return data.get('offset', 0)
+
+    def save(self, offset: int):
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'list_file': self.list_file,
+                'fingerprint': _fingerprint(self.list_file),
+                'size': os.path.getsize(self.list_file),
+                'offset': offset,
+                'updated': int(time.time())
+            }, f)
+        os.replace(tmp, self.path)
+
+
+class OffsetTracker:
+    """
+    按列表顺序分发、乱序完成时的低水位偏移
+
+    mark(offset) 在分发时调用，done(ticket) 在完成时调用；watermark 之前的用户都已完成。
+    """
+
+    def __init__(self, start: int = 0):
+        self.watermark = start
+        self._pending = deque()     # [行结束偏移, 是否完成]，按分发顺序
+
+    def mark(self, offset: int) -> list:
+        entry = [offset, False]
+        self._pending.append(entry)
+        return entry
+
+    def done(self, ticket: list):
+        ticket[1] = True
+        while self._pending and self._pending[0][1]:
+            self.watermark = self._pending.popleft()[0]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="读取用户列表（统计用户数和速度）")
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, help="并行进程数（默认 CPU 核心数，1 表示单进程）")
+    parser.add_argument('--start', type=int, default=0, help="起始字节偏移")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    usernames, offsets = read_usernames(args.path, args.start, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"✓ {len(usernames):,} 个用户（去重后 {len({u.lower() for u in usernames}):,}），用时 {elapsed:.2f} 秒")
+    if offsets:
+        print(f"✓ 最后一行结束偏移: {offsets[-1]:,}")
+
+
+if __name__ == "__main__":
+    main()
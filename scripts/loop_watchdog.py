@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟与卡顿检测
+
+持续测量事件循环调度延迟：循环内的心跳任务每 interval 秒醒来一次，实际醒来时间比预期晚多少
+就是调度延迟。另有一个后台线程检查心跳，如果循环超过 threshold 秒没有心跳，说明有代码正在阻塞
+事件循环（例如协程里的同步文件 I/O、巨大的 gather 簿记），此时立即抓取事件循环线程的调用栈。
+
+延迟分布和卡顿次数记录为指标（metrics()），每次卡顿连同调用栈打印并写入 JSONL 日志，
+用来区分 "API 变慢" 和 "我们自己阻塞了循环"。
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+# 延迟直方图分桶上限（毫秒）
+LAG_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 5000]
+
+
+class LoopWatchdog:
+    """事件循环看门狗：延迟指标 + 卡顿调用栈"""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        log_file: str = None,
+        report_interval: float = 60.0
+    ):
+        """
+        Args:
+            interval: 心跳间隔（秒）
+            threshold: 延迟超过该值（秒）视为卡顿，抓取调用栈
+            log_file: 卡顿事件和周期指标写入的 JSONL 文件（None 表示只打印）
+            report_interval: 周期性写入延迟指标的间隔（秒）
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.log_file = Path(log_file) if log_file else None
+        self.report_interval = report_interval
+
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.stall_seconds = 0.0
+        self.histogram = [0] * (len(LAG_BUCKETS_MS) + 1)
+
+        self._beat = time.monotonic()
+        self._stall_stack = None
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 事件循环内：心跳和延迟测量
+    # ------------------------------------------------------------------
+
+    async def _heartbeat(self):
+        last_report = time.monotonic()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            self._record(max(0.0, now - expected))
+
+            if now - last_report >= self.report_interval:
+                last_report = now
+                self._emit({"event": "loop_lag", **self.metrics()})
+
+    def _record(self, lag: float):
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+        lag_ms = lag * 1000
+        bucket = next((i for i, b in enumerate(LAG_BUCKETS_MS) if lag_ms <= b), len(LAG_BUCKETS_MS))
+        self.histogram[bucket] += 1
+
+        if lag > self.threshold:
+            self.stall_count += 1
+            self.stall_seconds += lag
+            with self._lock:
+                stack, self._stall_stack = self._stall_stack, None
+            self._emit({
+                "event": "loop_stall",
+                "lag_ms": round(lag_ms, 1),
+                "stack": stack or []
+            })
+            where = stack[-1].strip().splitlines()[0] if stack else "未捕获到调用栈"
+            print(f"⚠ 事件循环卡顿 {lag_ms:.0f} ms - {where}")
+
+    # ------------------------------------------------------------------
+    # 后台线程：检测正在发生的卡顿并抓取调用栈
+    # ------------------------------------------------------------------
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval / 2):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue <= self.threshold:
+                continue
+            with self._lock:
+                if self._stall_stack is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._stall_stack = traceback.format_stack(frame)
+
+    # ------------------------------------------------------------------
+
+    def _emit(self, event: dict):
+        if not self.log_file:
+            return
+        event = {"ts": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **event}
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def start(self):
+        """在运行中的事件循环里启动看门狗"""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self.samples:
+            self._emit({"event": "loop_lag", **self.metrics()})
+
+    def metrics(self) -> dict:
+        """延迟指标"""
+        labels = [f"<={b}ms" for b in LAG_BUCKETS_MS] + [f">{LAG_BUCKETS_MS[-1]}ms"]
+        return {
+            "samples": self.samples,
+            "mean_lag_ms": self.total_lag / self.samples * 1000 if self.samples else 0.0,
+            "max_lag_ms": self.max_lag * 1000,
+            "stall_count": self.stall_count,
+            "stall_seconds": round(self.stall_seconds, 3),
+            "histogram": dict(zip(labels, self.histogram))
+        }
@@ -6,42 +6,39 @@
 import csv
 from pathlib import Path
 
+from compressed_io import open_text, output_path as resolve_output_path
+from records import read_records
+from schema import CSV_FIELDS
+from sharded_output import is_dataset, is_dataset_output, read_dataset, write_dataset
+
+
 def merge_csv_files(
     input_files: list,
-    output_file: str
+    output_file: str,
+    identity_db: str = None
 ):
-    """合并多个 CSV 文件"""
+    """
+    合并多个 CSV 文件
+
+    Args:
+        input_files: 输入 CSV 列表（也可以是分片数据集目录，各分片并行读取）
+        output_file: 输出 CSV（以 / 结尾时写成按用户名哈希分区的数据集目录）
+        identity_db: 身份索引数据库（见 identity.py），设置后按规范实体去重，
+                     改名前后的同一账号只保留一行；为 None 时按 username 去重
+    """
     print("="*60)
     print("合并 CSV 文件")
     print("="*60)
     print()
 
-    # CSV 字段
-    csv_fields = [
-        'username',
-        'unique_id',
-        'nickname',
-        'uid',
-        'sec_uid',
-        'signature',
-        'follower_count',
-        'following_count',
-        'total_favorited',
-        'aweme_count',
-        'visible_videos_count',
-        'verification_type',
-        'verified',
-        'bio_email',
-        'category',
-        'account_type',
-        'avatar_larger_url',
-        'profile_url',
-        'scrape_time',
-        'scrape_status',
-        'error_message'
-    ]
+    index = None
+    if identity_db:
+        from identity import build_identity_index
+        print(f"建立身份索引: {identity_db}")
+        index = build_identity_index([f for f in input_files if Path(f).exists()], identity_db)
+        print()
 
-    # 使用字典去重（以 username 为 key）
+    # 使用字典去重（以 username 或规范实体 ID 为 key）
     all_data = {}
 
     # 读取所有 CSV 文件
@@ -52,24 +49,29 @@ def merge_csv_files(
             continue
 
         print(f"读取: {csv_file}")
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            for row in reader:
-                username = row.get('username', '')
-                if username:
-                    # 如果用户已存在，保留成功的记录或更新的记录
-                    if username in all_data:
-                        # 如果新记录是成功的，或者旧记录是失败的，则更新
-                        old_status = all_data[username].get('scrape_status')
-                        new_status = row.get('scrape_status')
-                        if new_status == 'success' or old_status != 'success':
-                            all_data[username] = row
-                    else:
+        count = 0
+        # 紧凑记录（__slots__、计数转 int、状态字符串驻留），百万行合并时内存是字典的几分之一
+        rows = read_dataset(csv_path) if is_dataset(csv_path) else read_records(csv_path)
+        for row in rows:
+            username = row.username
+            if username:
+                if index is not None:
+                    username = index.entity_of_row(row)
+                # 如果用户已存在，保留成功的记录或更新的记录
+                if username in all_data:
+                    # 如果新记录是成功的，或者旧记录是失败的，则更新
+                    old_status = all_data[username].scrape_status
+                    new_status = row.scrape_status
+                    if new_status == 'success' or old_status != 'success':
                         all_data[username] = row
-                    count += 1
+                else:
+                    all_data[username] = row
+                count += 1
         print(f"  ✓ 读取 {count} 条记录")
 
+    if index is not None:
+        index.close()
+
     print()
     print(f"合并后总计: {len(all_data)} 个唯一用户")
 
@@ -77,21 +79,33 @@ def merge_csv_files(
     success_count = sum(1 for r in all_data.values() if r.get('scrape_status') == 'success')
     failed_count = len(all_data) - success_count
 
-    print(f"  成功: {success_count} ({success_count/len(all_data)*100:.1f}%)")
-    print(f"  失败: {failed_count} ({failed_count/len(all_data)*100:.1f}%)")
+    # 没有任何记录时（例如分片刚开始就被中断）仍写出只有表头的文件
+    total = len(all_data) or 1
+    print(f"  成功: {success_count} ({success_count/total*100:.1f}%)")
+    print(f"  失败: {failed_count} ({failed_count/total*100:.1f}%)")
     print()
 
-    # 写入合并后的 CSV
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    print(f"写入合并后的文件: {output_file}")
-    with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
-        writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction='ignore')
-        writer.writeheader()
-        # 按 username 排序
-        sorted_data = sorted(all_data.values(), key=lambda x: x.get('username', '').lower())
-        writer.writerows(sorted_data)
+    # 按 username 排序
+    sorted_data = sorted(all_data.values(), key=lambda x: x.username.lower())
+
+    if is_dataset_output(output_file):
+        # 分片数据集: 按用户名哈希分区，附带 manifest.json
+        output_path = Path(output_file)
+        print(f"写入合并后的数据集: {output_path}")
+        manifest = write_dataset(sorted_data, output_path)
+        output_size = sum(shard['bytes'] for shard in manifest['shards'])
+    else:
+        # 写入合并后的 CSV
+        # .csv.gz / .csv.zst 输出时流式压缩
+        output_path = resolve_output_path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        print(f"写入合并后的文件: {output_path}")
+        with open_text(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(sorted_data)
+        output_size = output_path.stat().st_size
 
     print(f"✓ 合并完成！")
     print()
@@ -104,7 +118,7 @@ def merge_csv_files(
     print(f"成功用户数: {success_count}")
     print(f"失败用户数: {failed_count}")
     print(f"输出文件: {output_file}")
-    print(f"文件大小: {output_path.stat().st_size / 1024:.1f} KB")
+    print(f"文件大小: {output_size / 1024:.1f} KB")
     print("="*60)
 
 
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+失效账号缓存 - 记住已删除、封禁、私密等账号，在有效期内不再请求
+
+每次运行都会重试上次失败的账号（still_failed_users_final.txt 中的 9 个永久失败），
+每次都占用并发槽位并计费。这里按规范化用户名（小写、去掉 @）记录失败类别，
+每个类别有自己的有效期，过期后重新尝试一次；账号恢复（再次爬取成功）时自动移除。
+
+失败类别（按 API 返回的错误信息判断）:
+    not_found   账号不存在 / 已删除      30 天
+    banned      账号被封禁               30 天
+    private     私密账号                 7 天
+只记录能识别为以上类别的失败。TikHub 对暂时性错误和参数错误同样会返回非 200 code 或 400 / 404，
+这些失败不记录，按正常流程重试；网络错误、超时、429、5xx 和认证错误（401 / 403）也不记录。
+
+数据保存在 SQLite 文件中（与工作队列相同），多个分片进程可以共用。
+
+用法:
+    python3 negative_cache.py output/negative_cache.db               # 列出有效的记录
+    python3 negative_cache.py output/negative_cache.db --clear user  # 移除某个账号
+    python3 negative_cache.py output/negative_cache.db --purge       # 删除已过期的记录
+"""
+
+import argparse
+import re
+import sqlite3
+import time
+
+SECONDS_PER_DAY = 86400
+
+# 累积多少个待移除的账号后批量删除一次（关闭时删除剩余的）
+DISCARD_BATCH = 100
+
+# 各失败类别的有效期（秒）
+CLASS_TTL = {
+    'not_found': 30 * SECONDS_PER_DAY,
+    'banned': 30 * SECONDS_PER_DAY,
+    'private': 7 * SECONDS_PER_DAY
+}
+
+# 错误信息关键词 → 失败类别（按顺序匹配）
+CLASS_PATTERNS = [
+    ('banned', re.compile(r'banned|suspend|封禁|违规', re.IGNORECASE)),
+    ('private', re.compile(r'private|私密', re.IGNORECASE)),
+    ('not_found', re.compile(r'not\s*found|not\s*exist|doesn\'t exist|does not exist|no such user|deleted|不存在|已注销', re.IGNORECASE))
+]
+
+# 暂时性的 HTTP 状态码（不记录）
+TRANSIENT_STATUS = {401, 402, 403, 408, 429}
+
+
+def normalize_username(username: str) -> str:
+    return username.strip().lstrip('@').lower()
+
+
+def classify_failure(status_code: int, code=None, message: str = '') -> str:
+    """
+    判断失败类别，不能识别为账号失效（不存在 / 封禁 / 私密）时返回 None
+
+    Args:
+        status_code: HTTP 状态码
+        code: API 返回的业务 code（HTTP 错误时可能没有）
+        message: 错误信息
+    """
+    if status_code in TRANSIENT_STATUS or status_code >= 500:
+        return None
+    for failure_class, pattern in CLASS_PATTERNS:
+        if message and pattern.search(message):
+            return failure_class
+    return None
+
+
+class NegativeCache:
+    """SQLite 后端的失效账号缓存（有效记录在打开时载入内存，查询不访问数据库）"""
+
+    def __init__(self, db_path: str, class_ttl: dict = None, timeout: float = 30.0):
+        """
+        Args:
+            db_path: SQLite 文件路径
+            class_ttl: 覆盖默认的类别有效期 {类别: 秒}
+            timeout: 等待数据库锁的超时时间（秒）
+        """
+        self.db_path = db_path
+        self.class_ttl = dict(CLASS_TTL, **(class_ttl or {}))
+        self.conn = sqlite3.connect(db_path, timeout=timeout)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dead (
+                username TEXT PRIMARY KEY,
+                class TEXT NOT NULL,
+                reason TEXT,
+                first_seen INTEGER NOT NULL,
+                last_seen INTEGER NOT NULL,
+                expires INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 1
+            ) WITHOUT ROWID;
+        """)
+        now = int(time.time())
+        # 旧版本记录的 invalid / api_error 等类别不再生效
+        self._entries = {
+            username: (failure_class, expires)
+            for username, failure_class, expires in self.conn.execute(
+                "SELECT username, class, expires FROM dead WHERE expires > ?", (now,)
+            )
+            if failure_class in self.class_ttl
+        }
+        # 已确认有记录、等待批量删除的账号
+        self._pending_discards = set()
+
+    def lookup(self, username: str) -> str:
+        """账号在有效期内的失败类别，没有记录或已过期时返回 None"""
+        entry = self._entries.get(normalize_username(username))
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def __contains__(self, username: str) -> bool:
+        return self.lookup(username) is not None
+
+    def __len__(self) -> int:
+        now = time.time()
+        return sum(1 for _, expires in self._entries.values() if expires > now)
+
+    def record(self, username: str, failure_class: str, reason: str = ''):
+        """记录一次失败（已有记录时更新类别、延长有效期）"""
+        key = normalize_username(username)
+        now = int(time.time())
+        expires = now + self.class_ttl[failure_class]
+        # 之后又失败的账号不能被等待中的批量删除移除
+        self._pending_discards.discard(key)
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO dead (username, class, reason, first_seen, last_seen, expires)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(username) DO UPDATE SET
+                    class = excluded.class, reason = excluded.reason,
+                    last_seen = excluded.last_seen, expires = excluded.expires, hits = hits + 1
+            """, (key, failure_class, (reason or '')[:500], now, now, expires))
+        self._entries[key] = (failure_class, expires)
+
+    def discard(self, username: str):
+        """
+        账号恢复正常（爬取成功）时移除记录
+
+        大多数成功的账号从未失败过，先查内存和主键索引，确认有记录时才加入待删除集合，
+        累积 DISCARD_BATCH 个后在一个事务中删除（其他进程写入、不在本进程内存中的记录同样删除）。
+        """
+        key = normalize_username(username)
+        if self._entries.pop(key, None) is None and key not in self._pending_discards:
+            if self.conn.execute("SELECT 1 FROM dead WHERE username = ?", (key,)).fetchone() is None:
+                return
+        self._pending_discards.add(key)
+        if len(self._pending_discards) >= DISCARD_BATCH:
+            self.flush()
+
+    def flush(self):
+        """删除等待中的已恢复账号"""
+        if not self._pending_discards:
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM dead WHERE username = ?", ((key,) for key in self._pending_discards))
+        self._pending_discards.clear()
+
+    def purge(self) -> int:
+        """删除已过期的记录，返回删除数量"""
+        with self.conn:
+            deleted = self.conn.execute("DELETE FROM dead WHERE expires <= ?", (int(time.time()),)).rowcount
+        now = time.time()
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[1] > now}
+        return deleted
+
+    def filter(self, usernames) -> tuple:
+        """把用户分为 (需要爬取的, 跳过的)"""
+        keep, skipped = [], []
+        for username in usernames:
+            (skipped if username in self else keep).append(username)
+        return keep, skipped
+
+    def entries(self):
+        """有效记录（按失败类别、用户名排序）"""
+        return [
+            entry for entry in self.conn.execute("""
+                SELECT username, class, reason, last_seen, expires, hits FROM dead
+                WHERE expires > ? ORDER BY class, username
+            """, (int(time.time()),))
+            if entry[1] in self.class_ttl
+        ]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看和维护失效账号缓存")
+    parser.add_argument('db', help="缓存 SQLite 文件")
+    parser.add_argument('--clear', action='append', default=[], help="移除某个账号，可多次指定")
+    parser.add_argument('--purge', action='store_true', help="删除已过期的记录")
+    args = parser.parse_args()
+
+    cache = NegativeCache(args.db)
+    try:
+        for username in args.clear:
+            cache.discard(username)
+            print(f"✓ 已移除: @{normalize_username(username)}")
+        if args.purge:
+            print(f"✓ 删除 {cache.purge()} 条过期记录")
+        if args.clear or args.purge:
+            return
+
+        entries = cache.entries()
+        print(f"=== 失效账号: {len(entries)} ===")
+        for username, failure_class, reason, last_seen, expires, hits in entries:
+            until = time.strftime('%Y-%m-%d', time.localtime(expires))
+            print(f"  @{username:<30} {failure_class:<10} 失败 {hits} 次，{until} 前跳过  {reason}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+爬取计划 - 对比用户列表和已有结果，找出还需要爬取的用户
+
+通用版的 utils/find_remaining_nova02_users.py: 支持多个用户列表和多个结果 CSV，
+用户列表每行可以是 TikTok URL 或用户名（失败用户文件的格式）。
+
+用法:
+    python3 planner.py "data/Nova 01 User list" --csv output/nova01_users.csv --output remaining.txt
+    python3 planner.py "data/Nova 01 User list" --csv output/nova01_users.csv --skip-failed
+    python3 planner.py "data/Nova 01 User list" --csv output/nova01_users.csv --negative-cache output/negative_cache.db
+"""
+
+import argparse
+import csv
+import re
+from pathlib import Path
+
+from compressed_io import open_text, output_path
+from cost_ledger import PRICE_PER_CALL, estimate_cost
+from list_reader import read_usernames
+
+USERNAME_RE = re.compile(r'@([a-zA-Z0-9_\.]+)')
+BARE_USERNAME_RE = re.compile(r'^@?([a-zA-Z0-9_\.]+)$')
+
+
+def extract_username(line: str) -> str:
+    """从一行中提取用户名（URL 或用户名），无法识别时返回 None"""
+    line = line.strip()
+    if not line:
+        return None
+    match = USERNAME_RE.search(line) if '/' in line else BARE_USERNAME_RE.match(line)
+    return match.group(1) if match else None
+
+
+def read_user_list(path: str) -> list:
+    """读取用户列表（去重，保持原顺序）"""
+    usernames = {}
+    for username in read_usernames(path, bare=True)[0]:
+        usernames.setdefault(username.lower(), username)
+    return list(usernames.values())
+
+
+def scraped_status(csv_files: list) -> dict:
+    """结果 CSV 中每个用户名（小写）的状态，同一用户多行时成功优先"""
+    status = {}
+    for csv_file in csv_files:
+        if not Path(csv_file).exists():
+            print(f"⚠ 文件不存在: {csv_file}")
+            continue
+        with open_text(csv_file, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                username = row.get('username', '').lower()
+                if username and status.get(username) != 'success':
+                    status[username] = row.get('scrape_status', '')
+    return status
+
+
+def failed_usernames(csv_files: list) -> list:
+    """结果 CSV 中失败（且没有任何一次成功）的用户"""
+    return [username for username, state in scraped_status(csv_files).items() if state != 'success']
+
+
+def plan_remaining(user_lists: list, csv_files: list, include_failed: bool = True, negative_cache: str = None) -> dict:
+    """
+    计算待爬取的用户
+
+    Args:
+        user_lists: 用户列表文件
+        csv_files: 已有结果 CSV
+        include_failed: 失败的用户是否也算待爬取（False 时只返回从未爬取过的用户）
+        negative_cache: 失效账号缓存，有效期内的已删除 / 封禁 / 私密账号不计入待爬取
+
+    Returns:
+        {'total': 列表用户数, 'success': 已成功数, 'failed': 已失败数, 'dead': 跳过的失效账号数, 'remaining': [用户名...]}
+    """
+    usernames = {}
+    for user_list in user_lists:
+        for username in read_user_list(user_list):
+            usernames.setdefault(username.lower(), username)
+
+    status = scraped_status(csv_files)
+    success = failed = 0
+    remaining = []
+    for key, username in usernames.items():
+        state = status.get(key)
+        if state == 'success':
+            success += 1
+        elif state is not None:
+            failed += 1
+            if include_failed:
+                remaining.append(username)
+        else:
+            remaining.append(username)
+
+    dead = []
+    if negative_cache and Path(negative_cache).exists():
+        from negative_cache import NegativeCache
+
+        cache = NegativeCache(negative_cache)
+        try:
+            remaining, dead = cache.filter(remaining)
+        finally:
+            cache.close()
+
+    return {'total': len(usernames), 'success': success, 'failed': failed, 'dead': len(dead), 'remaining': remaining}
+
+
+def print_plan(plan: dict, price_per_call: float = PRICE_PER_CALL):
+    total = plan['total']
+    print("=== 爬取计划 ===")
+    print(f"总用户数: {total:,}")
+    print(f"已成功: {plan['success']:,}")
+    print(f"已失败: {plan['failed']:,}")
+    if plan.get('dead'):
+        print(f"失效账号（跳过）: {plan['dead']:,}")
+    print(f"待爬取: {len(plan['remaining']):,}")
+    if total:
+        print(f"进度: {plan['success'] / total * 100:.1f}%")
+
+    # 预估费用：每个待爬取用户一次请求，另按历史失败率估计重试
+    pending = len(plan['remaining'])
+    attempted = plan['success'] + plan['failed']
+    retry_rate = plan['failed'] / attempted if attempted else 0.0
+    print(f"预计费用: ${estimate_cost(pending, price_per_call):.2f}（{pending:,} 次请求 × ${price_per_call}）")
+    if retry_rate:
+        print(f"含重试预计: ${estimate_cost(pending, price_per_call, retry_rate):.2f}（历史失败率 {retry_rate * 100:.1f}%）")
+
+
+def write_user_list(usernames: list, output_file: str) -> Path:
+    """保存为 URL 列表（可直接作为批量爬取的输入），返回实际写入的路径"""
+    path = output_path(output_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open_text(path, 'w', encoding='utf-8') as f:
+        for username in usernames:
+            f.write(f"https://www.tiktok.com/@{username}\n")
+    return path
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="找出还需要爬取的用户")
+    parser.add_argument('user_lists', nargs='+', help="用户列表文件")
+    parser.add_argument('--csv', action='append', default=[], help="已有结果 CSV，可多次指定")
+    parser.add_argument('--output', help="待爬取用户保存到该文件")
+    parser.add_argument('--skip-failed', action='store_true', help="已失败的用户不再计入待爬取")
+    parser.add_argument('--price', type=float, default=PRICE_PER_CALL, help="每次请求价格（美元）")
+    parser.add_argument('--negative-cache', help="失效账号缓存，有效期内的失效账号不计入待爬取")
+    args = parser.parse_args(argv)
+
+    plan = plan_remaining(args.user_lists, args.csv, include_failed=not args.skip_failed, negative_cache=args.negative_cache)
+    print_plan(plan, args.price)
+    if args.output:
+        print(f"已保存到: {write_user_list(plan['remaining'], args.output)}")
+    return plan
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+查询用户数据 - 按条件筛选、只输出需要的列，流式写出 CSV / JSONL
+
+数据源（按路径自动识别）:
+    CSV 文件            爬取结果 / 合并结果
+    分片数据集目录      sharded_output.py 的 manifest.json + 分片（按 manifest 跳过分片，其余并行扫描）
+    快照库目录          snapshot_store.py 的 latest.npz（uid、first_ts、last_ts 和计数列）
+    SQLite 文件 (.db)   work_queue.py 的工作队列（已完成条目的 result JSON）
+
+条件和列尽量下推到数据源，只解码需要的部分:
+    - CSV: 字符串等值条件先在原始文本上做子串检查，不包含该值的行不做 CSV 解析；只转换用到的列
+    - 分片数据集: 计数列范围、成功行数不满足条件的分片不读取；username= 条件只读取一个哈希分区
+    - 快照库: 先只解压条件列计算筛选结果，再解压输出列中被选中的行
+    - SQLite: 条件和列转换为 json_extract() 在 SQL 中执行
+
+条件语法: 字段 运算符 值，运算符为 = != > >= < <= ~（~ 表示包含，不区分大小写）
+
+用法:
+    python3 query_users.py output/merged_all_users.csv \\
+        --where "verified=Yes" --where "follower_count>100000" --where "category=Beauty" \\
+        --select username,nickname,follower_count --format csv > result.csv
+    python3 query_users.py snapshots --where "follower_count>=1000000" --format jsonl
+    python3 query_users.py queue.db --where "bio_email~gmail.com" --select username,bio_email
+"""
+
+import argparse
+import csv
+import json
+import re
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from compressed_io import open_text
+from schema import CSV_FIELDS
+
+PREDICATE_RE = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<|~)\s*(.*?)\s*$')
+
+SQL_OPERATORS = {'=': '=', '!=': '!=', '>': '>', '>=': '>=', '<': '<', '<=': '<='}
+
+# 标识符列的等值条件按字符串比较（19 位 uid 转换为 float 会丢失精度）
+IDENTIFIER_FIELDS = frozenset(['uid', 'sec_uid', 'username', 'unique_id'])
+
+
+def _to_number(value: str):
+    """整数文本解析为 int（精确比较），其他数值为 float，不是数值时返回 None"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Predicate:
+    """单个筛选条件"""
+
+    def __init__(self, field: str, op: str, value: str):
+        self.field = field
+        self.op = op
+        self.value = value
+        self.number = _to_number(value) if op != '~' else None
+        if op in ('>', '>=', '<', '<=') and self.number is None:
+            raise ValueError(f"条件 {field}{op}{value}: 比较运算需要数值")
+        # 标识符的 = / != 按字符串比较；快照库的 uid 列仍使用 self.number（整数）
+        self.text = op in ('=', '!=') and field in IDENTIFIER_FIELDS
+
+    @classmethod
+    def parse(cls, text: str) -> "Predicate":
+        match = PREDICATE_RE.match(text)
+        if not match:
+            raise ValueError(f"无法解析条件: {text}（格式: 字段 运算符 值）")
+        return cls(*match.groups())
+
+    def literal(self) -> str:
+        """
+        匹配的行中必然出现的原始文本（用于解析 CSV 前的快速跳过），没有时返回 None
+
+        只对字符串等值条件有效；数值可能有不同写法（100 / 100.0），不做文本预筛。
+        """
+        if self.op == '=' and (self.number is None or self.text) and self.value and '"' not in self.value:
+            return self.value
+        return None
+
+    def matches(self, raw) -> bool:
+        if self.op == '~':
+            return self.value.lower() in str(raw).lower()
+        if self.number is not None and not self.text:
+            actual = _to_number(raw if raw != '' else 0)
+            if actual is None:
+                return self.op == '!='
+            a, b = actual, self.number
+        else:
+            a, b = str(raw), self.value
+        if self.op == '=':
+            return a == b
+        if self.op == '!=':
+            return a != b
+        if self.op == '>':
+            return a > b
+        if self.op == '>=':
+            return a >= b
+        if self.op == '<':
+            return a < b
+        return a <= b
+
+
+def _csv_records(f):
+    """按记录读取 CSV 原始文本（引号内有换行的记录会合并为一条）"""
+    pending = None
+    for line in f:
+        if pending is not None:
+            pending += line
+            if pending.count('"') % 2 == 0:
+                yield pending
+                pending = None
+        elif line.count('"') % 2:
+            pending = line
+        else:
+            yield line
+    if pending is not None:
+        yield pending
+
+
+def scan_csv(path: str, select: list, predicates: list):
+    """CSV 数据源"""
+    with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+        header = next(csv.reader([f.readline()]))
+        positions = {field: i for i, field in enumerate(header)}
+        select = select or header
+        for field in select + [p.field for p in predicates]:
+            if field not in positions:
+                raise ValueError(f"CSV 中没有列: {field}")
+
+        literals = [p.literal() for p in predicates if p.literal()]
+        checks = [(positions[p.field], p) for p in predicates]
+        outputs = [(field, positions[field]) for field in select]
+
+        for record in _csv_records(f):
+            if any(literal not in record for literal in literals):
+                continue
+            row = next(csv.reader([record]), None)
+            if not row:
+                continue
+            if len(row) < len(header):
+                row += [''] * (len(header) - len(row))
+            if all(p.matches(row[i]) for i, p in checks):
+                yield {field: row[i] for field, i in outputs}
+
+
+def _scan_shard(args) -> list:
+    path, select, predicates = args
+    return list(scan_csv(path, select, predicates))
+
+
+def scan_dataset(dataset_dir: str, select: list, predicates: list):
+    """分片数据集数据源（各分片在子进程中扫描，结果按分片顺序输出）"""
+    from sharded_output import map_shards, select_shards
+
+    shards, skipped = select_shards(dataset_dir, predicates)
+    if skipped:
+        print(f"✓ 按 manifest 跳过 {skipped} 个分片，扫描 {len(shards)} 个", file=sys.stderr)
+    for rows in map_shards(_scan_shard, [(str(path), select, predicates) for path in shards]):
+        yield from rows
+
+
+def _format_ts(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _column_scalar(column, number):
+    """条件值转换为整数列的类型，uint64 的 uid 按整数精确比较（不经过 float64）"""
+    import numpy as np
+
+    if isinstance(number, int) and column.dtype.kind in 'iu':
+        info = np.iinfo(column.dtype)
+        if info.min <= number <= info.max:
+            return column.dtype.type(number)
+    return number
+
+
+def scan_snapshot(store_dir: str, select: list, predicates: list):
+    """快照库数据源（latest.npz，按列延迟解压）"""
+    import numpy as np
+    from snapshot_store import LATEST_FILE
+
+    path = Path(store_dir) / LATEST_FILE
+    if not path.exists():
+        raise ValueError(f"快照库中没有 {LATEST_FILE}: {store_dir}")
+
+    with np.load(path) as data:
+        available = list(data.files)
+        select = select or available
+        for field in select + [p.field for p in predicates]:
+            if field not in available:
+                raise ValueError(f"快照库中没有列: {field}（可用: {', '.join(available)}）")
+
+        # 1. 只解压条件列，计算筛选结果
+        mask = None
+        for p in predicates:
+            column = data[p.field]
+            if p.number is None:
+                raise ValueError(f"快照库只支持数值条件: {p.field}{p.op}{p.value}")
+            value = _column_scalar(column, p.number)
+            condition = {
+                '=': column == value, '!=': column != value,
+                '>': column > value, '>=': column >= value,
+                '<': column < value, '<=': column <= value
+            }[p.op]
+            mask = condition if mask is None else mask & condition
+            if not mask.any():
+                return
+
+        # 2. 只解压输出列，并且只取选中的行
+        columns = {}
+        for field in select:
+            column = data[field]
+            columns[field] = (column[mask] if mask is not None else column).tolist()
+
+    for values in zip(*columns.values()):
+        row = dict(zip(columns, values))
+        for field in ('first_ts', 'last_ts'):
+            if field in row:
+                row[field] = _format_ts(row[field])
+        yield row
+
+
+def scan_sqlite(db_path: str, select: list, predicates: list):
+    """工作队列数据源（条件在 SQL 中用 json_extract 执行）"""
+    select = select or CSV_FIELDS
+    for field in select + [p.field for p in predicates]:
+        if field not in CSV_FIELDS:
+            raise ValueError(f"未知字段: {field}")
+
+    where = ["state IN ('done', 'failed')", "result IS NOT NULL"]
+    params = []
+    for p in predicates:
+        column = f"json_extract(result, '$.{p.field}')"
+        if p.op == '~':
+            where.append(f"instr(lower({column}), lower(?)) > 0")
+            params.append(p.value)
+        elif p.text:
+            where.append(f"CAST({column} AS TEXT) {SQL_OPERATORS[p.op]} ?")
+            params.append(p.value)
+        elif p.number is not None:
+            # NUMERIC: 整数保持为 INTEGER（精确比较），小数为 REAL
+            where.append(f"CAST({column} AS NUMERIC) {SQL_OPERATORS[p.op]} ?")
+            params.append(p.number)
+        else:
+            where.append(f"{column} {SQL_OPERATORS[p.op]} ?")
+            params.append(p.value)
+
+    columns = ', '.join(f"json_extract(result, '$.{field}')" for field in select)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(f"SELECT {columns} FROM items WHERE {' AND '.join(where)} ORDER BY rowid", params)
+        for values in cursor:
+            yield {field: ('' if value is None else value) for field, value in zip(select, values)}
+    finally:
+        conn.close()
+
+
+def scan(source: str, select: list = None, predicates: list = None):
+    """按数据源类型选择扫描方式"""
+    predicates = predicates or []
+    path = Path(source)
+    if (path / 'manifest.json').exists():
+        return scan_dataset(source, select, predicates)
+    if path.is_dir():
+        return scan_snapshot(source, select, predicates)
+    if path.suffix in ('.db', '.sqlite', '.sqlite3'):
+        return scan_sqlite(source, select, predicates)
+    return scan_csv(source, select, predicates)
+
+
+def write_rows(rows, output, output_format: str, limit: int = None) -> int:
+    """流式写出结果，返回行数"""
+    count = 0
+    writer = None
+    for row in rows:
+        if limit is not None and count >= limit:
+            break
+        if output_format == 'jsonl':
+            output.write(json.dumps(row, ensure_ascii=False) + '\n')
+        else:
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+        count += 1
+    return count
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="查询用户数据（CSV / 快照库 / 工作队列）")
+    parser.add_argument('source', help="CSV 文件、分片数据集目录、快照库目录或工作队列 .db 文件")
+    parser.add_argument('--where', action='append', default=[], help="筛选条件，可多次指定（AND）")
+    parser.add_argument('--select', help="输出列，逗号分隔（默认全部）")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--output', help="输出文件（默认标准输出）")
+    args = parser.parse_args(argv)
+
+    try:
+        predicates = [Predicate.parse(text) for text in args.where]
+        select = [field.strip() for field in args.select.split(',')] if args.select else None
+        output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        try:
+            count = write_rows(scan(args.source, select, predicates), output, args.format, args.limit)
+        finally:
+            if args.output:
+                output.close()
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"✓ {count:,} 行", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
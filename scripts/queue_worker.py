@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+分布式队列 worker - 多台机器从同一个工作队列领取用户并提交结果
+
+用法:
+    # 1. 把用户列表导入队列（可重复执行，已存在的用户会被忽略）
+    python3 queue_worker.py enqueue queue.db "Nova 01 User list" "Nova 02 User List"
+
+    # 2. 在每台机器上启动 worker（队列文件放在共享文件系统上）
+    python3 queue_worker.py work queue.db --token YOUR_API_TOKEN
+
+    # 3. 查看进度 / 导出结果
+    python3 queue_worker.py stats queue.db
+    python3 queue_worker.py export queue.db output/all_users.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import os
+import socket
+from pathlib import Path
+
+import runtime
+from compressed_io import open_text
+from list_reader import iter_chunks
+from schema import CSV_FIELDS
+from work_queue import SQLiteWorkQueue
+
+
+def enqueue_user_lists(queue_db: str, user_list_files: list):
+    """把用户列表文件导入队列"""
+    queue = SQLiteWorkQueue(queue_db)
+    for user_list_file in user_list_files:
+        # 按块流式读取并逐块入队，大列表不必整个读进内存
+        found = added = 0
+        for usernames, _ in iter_chunks(user_list_file):
+            found += len(usernames)
+            added += queue.enqueue(usernames)
+        print(f"✓ {user_list_file}: {found} 个用户，新增 {added} 个")
+    print(f"✓ 队列状态: {queue.stats()}")
+    queue.close()
+
+
+async def run_queue_worker(
+    queue_db: str,
+    api_token: str,
+    api_base_url: str = "https://api.tikhub.io",
+    worker_id: str = None,
+    batch_size: int = 50,
+    concurrency: int = 10,
+    visibility_timeout: float = 120.0,
+    max_rps: float = None,
+    idle_poll: float = 5.0
+):
+    """
+    从队列领取用户批次并爬取，直到队列中没有待处理或处理中的用户
+
+    Args:
+        queue_db: 队列 SQLite 文件路径
+        api_token: TikHub API Token
+        api_base_url: API 基础 URL
+        worker_id: worker 标识（默认 主机名-进程号）
+        batch_size: 每次领取的用户数
+        concurrency: 并发数
+        visibility_timeout: 租约时长（秒），处理期间每 1/3 租约时长续约一次
+        max_rps: 每秒最多请求数（None 表示不限流）
+        idle_poll: 队列暂时为空（其他 worker 持有租约）时的轮询间隔（秒）
+    """
+    from batch_scrape_to_csv_concurrent import scrape_single_user
+    from scrape_user_tikhub import TikHubUserScraper
+    from shutdown import GracefulShutdown
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = SQLiteWorkQueue(queue_db)
+    scraper = TikHubUserScraper(
+        api_token=api_token,
+        base_url=api_base_url,
+        max_rps=max_rps,
+        max_connections=max(100, concurrency)
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    counts = {'acked': 0, 'retried': 0, 'lost': 0}
+
+    print("="*60)
+    print(f"队列 worker: {worker_id}")
+    print("="*60)
+    print(f"✓ 队列: {queue_db}")
+    print(f"✓ 批大小: {batch_size}，并发数: {concurrency}，租约: {visibility_timeout:.0f} 秒")
+    print()
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(visibility_timeout / 3)
+            if in_flight:
+                queue.heartbeat(worker_id, list(in_flight), visibility_timeout)
+
+    shutdown = GracefulShutdown()
+
+    async def process(username, index, total):
+        async with semaphore:
+            if shutdown.requested:
+                # 不再开始新的请求，租约到期后由其他 worker 领取
+                return
+            row = await scrape_single_user(scraper, username, index, total)
+        if row.get('scrape_status') == 'success':
+            ok = queue.ack(worker_id, username, row.to_row())
+            counts['acked' if ok else 'lost'] += 1
+        else:
+            queue.nack(worker_id, username, row.get('error_message', ''), row.to_row())
+            counts['retried'] += 1
+        in_flight.discard(username)
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        shutdown.install()
+        while not shutdown.requested:
+            keys = queue.lease(worker_id, batch_size, visibility_timeout)
+            if not keys:
+                stats = queue.stats()
+                if stats['pending'] == 0 and stats['leased'] == 0:
+                    break
+                # 其他 worker 仍持有租约，等待其完成或过期
+                await asyncio.sleep(idle_poll)
+                continue
+
+            in_flight.update(keys)
+            await shutdown.gather(*[
+                process(username, i + 1, len(keys)) for i, username in enumerate(keys)
+            ])
+    finally:
+        shutdown.uninstall()
+        heartbeat_task.cancel()
+        await scraper.aclose()
+
+    print()
+    print("="*60)
+    print(f"✓ 提交成功: {counts['acked']}")
+    print(f"✓ 失败重新入队: {counts['retried']}")
+    if counts['lost']:
+        print(f"⚠ 租约已被接管（结果丢弃）: {counts['lost']}")
+    if shutdown.requested:
+        print(f"⏹ 因 {shutdown.signal_name} 提前结束，未处理的 {len(in_flight)} 个用户在租约到期后重新入队")
+    print(f"✓ 队列状态: {queue.stats()}")
+    print("="*60)
+    queue.close()
+
+
+def export_results(queue_db: str, output_csv: str):
+    """把队列中的结果导出为 CSV"""
+    queue = SQLiteWorkQueue(queue_db)
+    output_path = Path(output_csv)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    with open_text(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for row in queue.results():
+            writer.writerow(row)
+            count += 1
+
+    print(f"✓ 导出 {count} 条记录到: {output_csv}")
+    queue.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式队列 worker")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("enqueue", help="导入用户列表")
+    p.add_argument("queue_db")
+    p.add_argument("user_lists", nargs="+")
+
+    p = subparsers.add_parser("work", help="启动 worker")
+    p.add_argument("queue_db")
+    p.add_argument("--token", required=True)
+    p.add_argument("--base-url", default="https://api.tikhub.io")
+    p.add_argument("--worker-id")
+    p.add_argument("--batch-size", type=int, default=50)
+    p.add_argument("--concurrency", type=int, default=10)
+    p.add_argument("--visibility-timeout", type=float, default=120.0)
+    p.add_argument("--max-rps", type=float)
+
+    p = subparsers.add_parser("stats", help="查看队列状态")
+    p.add_argument("queue_db")
+
+    p = subparsers.add_parser("export", help="导出结果为 CSV")
+    p.add_argument("queue_db")
+    p.add_argument("output_csv")
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        enqueue_user_lists(args.queue_db, args.user_lists)
+    elif args.command == "work":
+        runtime.run(run_queue_worker(
+            queue_db=args.queue_db,
+            api_token=args.token,
+            api_base_url=args.base_url,
+            worker_id=args.worker_id,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            visibility_timeout=args.visibility_timeout,
+            max_rps=args.max_rps
+        ))
+    elif args.command == "stats":
+        queue = SQLiteWorkQueue(args.queue_db)
+        print(queue.stats())
+        queue.close()
+    elif args.command == "export":
+        export_results(args.queue_db, args.output_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+异步令牌桶限流器 - 控制每秒请求数（QPS）
+"""
+
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """令牌桶限流器：平均速率为 rate 请求/秒，允许最多 burst 个请求的突发"""
+
+    def __init__(self, rate: float, burst: int = None):
+        """
+        Args:
+            rate: 每秒允许的请求数
+            burst: 令牌桶容量（默认等于 rate，至少为 1）
+        """
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: int = 1):
+        """获取令牌，令牌不足时等待"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
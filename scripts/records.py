@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+紧凑的用户记录 - 代替每行一个 21 键字典
+
+    - __slots__ 存储，没有每个实例的 __dict__
+    - 计数列保存为 int，scrape_status / category / verified 等取值很少的字符串做驻留（所有行共享同一个对象）
+    - scrape_time 保存为 epoch 秒，只在写出时格式化（同一秒的格式化结果有缓存）
+    - 兼容字典读取方式: record['username']、record.get('scrape_status')，可直接传给 csv.DictWriter
+      （extrasaction='ignore'）、LiveStats.update 等现有代码
+
+百万行合并时每行内存约为 DictReader 字典的几分之一。
+"""
+
+import csv
+import sys
+import time
+from functools import lru_cache
+
+from compressed_io import open_text
+from schema import CSV_FIELDS
+from sharded_output import dataset_files, is_dataset
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+PROFILE_URL_PREFIX = "https://www.tiktok.com/@"
+
+INT_FIELDS = frozenset([
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count',
+    'verification_type',
+    'account_type'
+])
+
+FIELD_SET = frozenset(CSV_FIELDS)
+
+# 取值很少、在大量行之间重复的字段
+INTERNED_FIELDS = frozenset(['scrape_status', 'verified', 'category', 'error_message'])
+
+
+@lru_cache(maxsize=4096)
+def format_time(epoch: int) -> str:
+    """epoch 秒 → 本地时间字符串（与原来的 datetime.now().strftime 一致）"""
+    return time.strftime(TIME_FORMAT, time.localtime(epoch))
+
+
+@lru_cache(maxsize=4096)
+def parse_time(value: str):
+    """本地时间字符串 → epoch 秒，无法解析时返回 None"""
+    try:
+        return int(time.mktime(time.strptime(value, TIME_FORMAT)))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def _to_int(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _convert_time(value):
+    if isinstance(value, str):
+        parsed = parse_time(value)
+        return parsed if parsed is not None else (sys.intern(value) if value else None)
+    return value
+
+
+def _convert_str(value):
+    return value if value != '' else None
+
+
+def _convert_interned(value):
+    if isinstance(value, str):
+        return sys.intern(value) if value else None
+    return value
+
+
+def _convert_uid(value):
+    """uid 是纯数字，保存为 int 比字符串省内存"""
+    if isinstance(value, str) and value.isdigit() and value[0] != '0':
+        return int(value)
+    return value if value != '' else None
+
+
+_CONVERTERS = {
+    field: (
+        _convert_time if field == 'scrape_time' else
+        _to_int if field in INT_FIELDS else
+        _convert_interned if field in INTERNED_FIELDS else
+        _convert_uid if field == 'uid' else
+        _convert_str
+    )
+    for field in CSV_FIELDS
+}
+
+
+class UserRecord:
+    """一个用户的爬取结果"""
+
+    __slots__ = tuple(CSV_FIELDS)
+
+    def __init__(self, **fields):
+        for field in CSV_FIELDS:
+            setattr(self, field, None)
+        for field, value in fields.items():
+            self[field] = value
+
+    def __setitem__(self, field: str, value):
+        if field == 'profile_url' and value and value == PROFILE_URL_PREFIX + (self.username or ''):
+            # 主页地址可由用户名推出，只记一个标记
+            value = True
+        else:
+            value = _CONVERTERS[field](value)
+        setattr(self, field, value)
+
+    def get(self, field: str, default=None):
+        """与 dict.get 相同的读取方式；scrape_time 返回格式化后的字符串"""
+        if field not in FIELD_SET:
+            return default
+        value = getattr(self, field)
+        if value is None:
+            return default
+        if field == 'scrape_time' and isinstance(value, int):
+            return format_time(value)
+        if value is True and field == 'profile_url':
+            return PROFILE_URL_PREFIX + self.username
+        return value
+
+    def __getitem__(self, field: str):
+        if field not in FIELD_SET:
+            raise KeyError(field)
+        return self.get(field, '')
+
+    def __contains__(self, field: str) -> bool:
+        return field in FIELD_SET and getattr(self, field) is not None
+
+    def to_row(self) -> dict:
+        """转换为普通字典（只包含有值的字段，用于 JSON 序列化）"""
+        return {field: self.get(field) for field in CSV_FIELDS if getattr(self, field) is not None}
+
+    def __repr__(self) -> str:
+        return f"UserRecord(username={self.username!r}, scrape_status={self.scrape_status!r})"
+
+    @classmethod
+    def from_profile(cls, username: str, user_data: dict, scrape_time: int = None) -> "UserRecord":
+        """由 API 返回的 user 对象构建成功记录"""
+        verification_type = user_data.get('verification_type', 0)
+        return cls(
+            username=username,
+            unique_id=user_data.get('unique_id', ''),
+            nickname=user_data.get('nickname', ''),
+            uid=user_data.get('uid', ''),
+            sec_uid=user_data.get('sec_uid', ''),
+            signature=user_data.get('signature', '').replace('\n', ' '),
+            follower_count=user_data.get('follower_count', 0),
+            following_count=user_data.get('following_count', 0),
+            total_favorited=user_data.get('total_favorited', 0),
+            aweme_count=user_data.get('aweme_count', 0),
+            visible_videos_count=user_data.get('visible_videos_count', 0),
+            verification_type=verification_type,
+            verified='Yes' if verification_type > 0 else 'No',
+            bio_email=user_data.get('bio_email', ''),
+            category=user_data.get('category', ''),
+            account_type=user_data.get('account_type', 0),
+            avatar_larger_url=user_data.get('avatar_larger', {}).get('url_list', [''])[0],
+            profile_url=PROFILE_URL_PREFIX + username,
+            scrape_time=scrape_time if scrape_time is not None else int(time.time()),
+            scrape_status='success',
+            error_message=''
+        )
+
+    @classmethod
+    def failure(cls, username: str, status: str, error_message: str, scrape_time: int = None) -> "UserRecord":
+        """失败 / 异常记录"""
+        return cls(
+            username=username,
+            scrape_time=scrape_time if scrape_time is not None else int(time.time()),
+            scrape_status=status,
+            error_message=error_message
+        )
+
+
+def read_records(csv_path: str):
+    """逐行读取结果 CSV 为 UserRecord（CSV 中不认识的列忽略；.gz / .zst 自动解压；分片数据集依次读取各分片）"""
+    if is_dataset(csv_path):
+        for path in dataset_files(csv_path):
+            yield from read_records(path)
+        return
+
+    with open_text(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        positions = {field: i for i, field in enumerate(header) if field in FIELD_SET}
+        # username 最先设置（profile_url 的压缩依赖它），其余列使用预先选好的转换函数
+        ordered = sorted(positions, key=lambda field: field != 'username')
+        # 直接使用 slot 描述符的 __set__，比 setattr 按名字查找快
+        columns = [
+            (getattr(UserRecord, field).__set__, positions[field], _CONVERTERS[field])
+            for field in ordered if field != 'profile_url'
+        ]
+        missing = [getattr(UserRecord, field).__set__ for field in CSV_FIELDS if field not in positions]
+        profile_index = positions.get('profile_url')
+        width = max(positions.values(), default=-1) + 1
+
+        for values in reader:
+            if len(values) < width:
+                values += [''] * (width - len(values))
+            record = UserRecord.__new__(UserRecord)
+            for set_value, i, convert in columns:
+                set_value(record, convert(values[i]))
+            for set_value in missing:
+                set_value(record, None)
+            if profile_index is not None:
+                record['profile_url'] = values[profile_index]
+            yield record
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+后台结果写入 - 爬取结果边完成边写入文件，磁盘 I/O 不占用事件循环
+
+    - 结果先放入有界队列，由单独的写线程批量序列化（CSV / JSONL，按扩展名）并写入
+    - 每隔 flush_interval 秒 flush + fsync 一次，进程崩溃时最多丢失最近一个周期的结果
+    - 队列满时（磁盘跟不上）put() 会等待，爬取 worker 随之放慢，内存不会无限增长
+
+用法:
+    writer = ResultWriter("output/users.csv")
+    await writer.put(row)      # UserRecord 或字典
+    await writer.sync()        # 等待已加入的结果写入磁盘（例如保存检查点之前）
+    await writer.aclose()      # 写完剩余结果并关闭文件
+"""
+
+import asyncio
+import csv
+import json
+import queue
+import threading
+import time
+
+from compressed_io import open_text, output_path, strip_compression, sync
+from schema import CSV_FIELDS
+
+_STOP = object()
+
+
+class ResultWriter:
+    """有界队列 + 后台写线程"""
+
+    def __init__(
+        self,
+        path: str,
+        fieldnames: list = CSV_FIELDS,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        fsync: bool = True,
+        append: bool = False
+    ):
+        """
+        Args:
+            path: 输出文件（.jsonl 写 JSON Lines，其他写 CSV；.gz / .zst 后缀时流式压缩）
+            fieldnames: CSV 列
+            max_queue: 队列容量（满时 put() 等待写线程）
+            batch_size: 每次最多写入的行数
+            flush_interval: flush + fsync 的间隔（秒）
+            fsync: 是否调用 os.fsync（关闭时只 flush 到操作系统缓存）
+            append: 追加到已有文件（继续中断的运行；文件为空时才写表头）
+        """
+        self.path = output_path(path)
+        self.fieldnames = fieldnames
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.jsonl = strip_compression(self.path).suffix == '.jsonl'
+        self.append = append and self.path.exists() and self.path.stat().st_size > 0
+
+        self.written = 0
+        self.stalls = 0          # put() 因队列满而等待的次数
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._error = None
+        self._closed = False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self._open()
+        self._writer = None if self.jsonl else csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction='ignore')
+        if self._writer and not self.append:
+            self._writer.writeheader()
+        self._thread = threading.Thread(target=self._run, name=f"ResultWriter-{self.path.name}", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        mode = 'a' if self.append else 'w'
+        if self.jsonl:
+            return open_text(self.path, mode, encoding='utf-8')
+        # 追加时用 utf-8，避免在文件中间再写一个 BOM
+        return open_text(self.path, mode, newline='', encoding='utf-8' if self.append else 'utf-8-sig')
+
+    def _write_batch(self, batch: list):
+        if self.jsonl:
+            self._file.write(''.join(
+                json.dumps(row.to_row() if hasattr(row, 'to_row') else row, ensure_ascii=False) + '\n'
+                for row in batch
+            ))
+        else:
+            self._writer.writerows(batch)
+        self.written += len(batch)
+
+    def _sync(self):
+        if self.fsync:
+            sync(self._file)
+        else:
+            self._file.flush()
+
+    def _run(self):
+        """写线程：批量取出结果写入，按周期 fsync"""
+        last_sync = time.monotonic()
+        stopping = False
+        flushed = None
+        try:
+            while not stopping:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+                batch = []
+                flushed = None
+                while item is not None:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        flushed = item
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        item = None
+                if batch:
+                    self._write_batch(batch)
+                if stopping or flushed or (self.written and time.monotonic() - last_sync >= self.flush_interval):
+                    self._sync()
+                    last_sync = time.monotonic()
+                if flushed:
+                    flushed.set()
+        except BaseException as e:
+            self._error = e
+            if flushed:
+                flushed.set()
+            # 写入失败后继续取出队列中的结果，避免 put() / sync() 永久等待
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+        finally:
+            self._file.close()
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError(f"结果写入失败: {self.path}") from self._error
+        if self._closed:
+            raise RuntimeError(f"结果文件已关闭: {self.path}")
+
+    async def put(self, row):
+        """加入一行结果；队列满时等待（把磁盘的背压传给爬取 worker）"""
+        self._check()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.stalls += 1
+            await asyncio.get_running_loop().run_in_executor(None, self._queue.put, row)
+
+    async def sync(self):
+        """等待此前加入的结果全部写入并 fsync"""
+        self._check()
+        flushed = threading.Event()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._queue.put, flushed)
+        await loop.run_in_executor(None, flushed.wait)
+        self._check()
+
+    def close(self):
+        """写完队列中剩余的结果并关闭文件（阻塞）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"结果写入失败: {self.path}") from self._error
+
+    async def aclose(self):
+        """close() 的异步版本（在线程池中等待写线程结束）"""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -5,12 +5,16 @@
 
 import asyncio
 import csv
-from datetime import datetime
 from pathlib import Path
+from compressed_io import open_text
+from records import UserRecord, read_records
+from schema import CSV_FIELDS
 from scrape_user_tikhub import TikHubUserScraper
+from shutdown import GracefulShutdown
+import runtime
 
 
-async def scrape_single_user(scraper, username: str, index: int, total: int) -> dict:
+async def scrape_single_user(scraper, username: str, index: int, total: int) -> UserRecord:
     """爬取单个用户"""
     print(f"[{index}/{total}] 正在重试: @{username}")
 
@@ -18,54 +22,22 @@ async def scrape_single_user(scraper, username: str, index: int, total: int) ->
         result = await scraper.fetch_user_profile(unique_id=username)
 
         if result and result.get('code') == 200:
-            user_data = result.get('data', {}).get('user', {})
-
-            row = {
-                'username': username,
-                'unique_id': user_data.get('unique_id', ''),
-                'nickname': user_data.get('nickname', ''),
-                'uid': user_data.get('uid', ''),
-                'sec_uid': user_data.get('sec_uid', ''),
-                'signature': user_data.get('signature', '').replace('\n', ' '),
-                'follower_count': user_data.get('follower_count', 0),
-                'following_count': user_data.get('following_count', 0),
-                'total_favorited': user_data.get('total_favorited', 0),
-                'aweme_count': user_data.get('aweme_count', 0),
-                'visible_videos_count': user_data.get('visible_videos_count', 0),
-                'verification_type': user_data.get('verification_type', 0),
-                'verified': 'Yes' if user_data.get('verification_type', 0) > 0 else 'No',
-                'bio_email': user_data.get('bio_email', ''),
-                'category': user_data.get('category', ''),
-                'account_type': user_data.get('account_type', 0),
-                'avatar_larger_url': user_data.get('avatar_larger', {}).get('url_list', [''])[0],
-                'profile_url': f"https://www.tiktok.com/@{username}",
-                'scrape_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'scrape_status': 'success',
-                'error_message': ''
-            }
-
-            print(f"  ✓ 成功 - 粉丝: {row['follower_count']:,}, 视频: {row['aweme_count']}")
+            row = UserRecord.from_profile(username, result.get('data', {}).get('user', {}))
+            print(f"  ✓ 成功 - 粉丝: {row.follower_count:,}, 视频: {row.aweme_count}")
             return row
 
         else:
-            row = {
-                'username': username,
-                'scrape_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'scrape_status': 'failed',
-                'error_message': result.get('message', 'Unknown error') if result else 'No response'
-            }
-            print(f"  ✗ 失败 - {row['error_message']}")
+            row = UserRecord.failure(
+                username,
+                'failed',
+                result.get('message', 'Unknown error') if result else 'No response'
+            )
+            print(f"  ✗ 失败 - {row.error_message}")
             return row
 
     except Exception as e:
         print(f"  ✗ 异常 - {str(e)}")
-        row = {
-            'username': username,
-            'scrape_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'scrape_status': 'error',
-            'error_message': str(e)
-        }
-        return row
+        return UserRecord.failure(username, 'error', str(e))
 
 
 async def retry_failed_users(
@@ -85,55 +57,46 @@ async def retry_failed_users(
     all_failed_usernames = []
     for failed_file in failed_users_files:
         if Path(failed_file).exists():
-            with open(failed_file, 'r', encoding='utf-8') as f:
+            with open_text(failed_file, 'r', encoding='utf-8') as f:
                 usernames = [line.strip() for line in f if line.strip()]
                 all_failed_usernames.extend(usernames)
                 print(f"✓ {failed_file}: {len(usernames)} 个失败用户")
 
-    print(f"\n✓ 总计需要重试: {len(all_failed_usernames)} 个用户")
-    print(f"✓ 并发数: {concurrency} 个请求同时进行")
-    print(f"✓ 预计完成时间: ~{len(all_failed_usernames)/concurrency:.1f} 秒 ({len(all_failed_usernames)/concurrency/60:.1f} 分钟)")
-    print()
-
     # 创建爬虫实例
+    output_dir = Path(csv_outputs[0]).parent if csv_outputs else None
     scraper = TikHubUserScraper(
         api_token=api_token,
-        base_url=api_base_url
+        base_url=api_base_url,
+        max_connections=max(100, concurrency),
+        ledger_file=output_dir / 'cost_ledger.json' if output_dir else None,
+        run_label='retry',
+        negative_cache=output_dir / 'negative_cache.db' if output_dir else None
     )
 
-    # CSV 字段
-    csv_fields = [
-        'username',
-        'unique_id',
-        'nickname',
-        'uid',
-        'sec_uid',
-        'signature',
-        'follower_count',
-        'following_count',
-        'total_favorited',
-        'aweme_count',
-        'visible_videos_count',
-        'verification_type',
-        'verified',
-        'bio_email',
-        'category',
-        'account_type',
-        'avatar_larger_url',
-        'profile_url',
-        'scrape_time',
-        'scrape_status',
-        'error_message'
-    ]
+    # 已知失效的账号（已删除 / 封禁 / 私密）在有效期内不再重试
+    dead = []
+    if scraper.negative_cache is not None:
+        all_failed_usernames, dead = scraper.negative_cache.filter(all_failed_usernames)
+        if dead:
+            print(f"⊘ 跳过 {len(dead)} 个失效账号（有效期内不再请求）")
+
+    print(f"\n✓ 总计需要重试: {len(all_failed_usernames)} 个用户")
+    print(f"✓ 并发数: {concurrency} 个请求同时进行")
+    print(f"✓ 预计完成时间: ~{len(all_failed_usernames)/concurrency:.1f} 秒 ({len(all_failed_usernames)/concurrency/60:.1f} 分钟)")
+    print()
+
 
     print("开始重试...")
     print("-"*60)
 
     # 使用 Semaphore 限制并发数
     semaphore = asyncio.Semaphore(concurrency)
+    shutdown = GracefulShutdown()
 
     async def scrape_with_semaphore(username, index, total):
         async with semaphore:
+            if shutdown.requested:
+                return None
             return await scrape_single_user(scraper, username, index, total)
 
     # 创建所有任务
@@ -142,8 +105,19 @@ async def retry_failed_users(
         for i, username in enumerate(all_failed_usernames)
     ]
 
-    # 并发执行所有任务
-    results = await asyncio.gather(*tasks)
+    # 并发执行所有任务（Ctrl+C / SIGTERM 时不再开始新的请求，已完成的结果照常写回 CSV）
+    try:
+        with shutdown:
+            results = await shutdown.gather(*tasks)
+    finally:
+        await scraper.aclose()
+
+    # 被中断、没有重试的用户（下次继续重试）
+    not_attempted = [username for username, row in zip(all_failed_usernames, results) if row is None]
+    results = [row for row in results if row is not None]
+    if shutdown.requested:
+        print(shutdown.format_summary())
+        print(f"⏹ {len(not_attempted)} 个用户未重试")
 
     print("-"*60)
     print()
@@ -160,12 +134,10 @@ async def retry_failed_users(
 
         print(f"更新 CSV 文件: {csv_file}")
 
-        # 读取现有数据
+        # 读取现有数据（紧凑记录，避免每行一个字典）
         existing_data = {}
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                existing_data[row['username']] = row
+        for row in read_records(csv_path):
+            existing_data[row.username] = row
 
         # 更新成功的记录
         updated_count = 0
@@ -175,8 +147,8 @@ async def retry_failed_users(
                 updated_count += 1
 
         # 写回 CSV
-        with open(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
-            writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction='ignore')
+        with open_text(csv_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
             writer.writeheader()
             writer.writerows(existing_data.values())
 
@@ -197,11 +169,11 @@ async def retry_failed_users(
     print(f"重试总数: {len(results)}")
     print(f"本次成功: {success_count}")
     print(f"仍然失败: {failed_count}")
-    print(f"成功率: {success_count/len(results)*100:.1f}%")
+    print(f"成功率: {success_count/len(results)*100:.1f}%" if results else "成功率: N/A")
     print()
 
-    # 保存仍然失败的用户
-    still_failed = [r['username'] for r in results if r.get('scrape_status') != 'success']
+    # 保存仍然失败的用户（包括跳过的失效账号）
+    still_failed = [r['username'] for r in results if r.get('scrape_status') != 'success'] + not_attempted + dead
     if still_failed:
         with open('still_failed_users_final.txt', 'w') as f:
             f.write('\n'.join(still_failed))
@@ -238,4 +210,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    runtime.run(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+异步脚本运行时 - 所有异步入口统一使用 runtime.run(main()) 代替 asyncio.run(main())
+
+    - 安装了 uvloop 时自动使用 uvloop 事件循环（未安装时回退到 asyncio 默认循环）
+    - 设置默认线程池大小（run_in_executor / to_thread 使用）
+    - 开启事件循环看门狗（loop_watchdog.LoopWatchdog），结束时打印延迟统计
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from loop_watchdog import LoopWatchdog
+
+# 默认线程池大小（与 Python 默认值一致，可通过环境变量调整）
+DEFAULT_EXECUTOR_WORKERS = int(
+    os.environ.get("TIKHUB_EXECUTOR_WORKERS", min(32, (os.cpu_count() or 1) + 4))
+)
+
+# 卡顿事件日志（JSONL），为空时只打印
+DEFAULT_STALL_LOG = os.environ.get("TIKHUB_STALL_LOG") or None
+
+
+def _import_uvloop():
+    try:
+        import uvloop
+        return uvloop
+    except ImportError:
+        return None
+
+
+def loop_name(use_uvloop: bool = True) -> str:
+    """实际会使用的事件循环名称"""
+    return "uvloop" if use_uvloop and _import_uvloop() else "asyncio"
+
+
+async def _bootstrap(coro, executor_workers: int, watchdog: LoopWatchdog):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=executor_workers))
+
+    if watchdog:
+        watchdog.start()
+    try:
+        return await coro
+    finally:
+        if watchdog:
+            watchdog.stop()
+            stats = watchdog.metrics()
+            if stats["samples"]:
+                print(
+                    f"事件循环延迟: 平均 {stats['mean_lag_ms']:.1f} ms, "
+                    f"最大 {stats['max_lag_ms']:.1f} ms, "
+                    f"卡顿 {stats['stall_count']} 次（共 {stats['stall_seconds']:.1f} 秒）"
+                )
+
+
+def run(
+    coro,
+    use_uvloop: bool = True,
+    executor_workers: int = None,
+    lag_monitor: bool = True,
+    lag_threshold: float = 0.25,
+    stall_log: str = None
+):
+    """
+    运行异步入口（代替 asyncio.run）
+
+    Args:
+        coro: 入口协程，例如 main()
+        use_uvloop: 安装了 uvloop 时是否使用
+        executor_workers: 默认线程池大小（None 使用 DEFAULT_EXECUTOR_WORKERS）
+        lag_monitor: 是否开启事件循环看门狗
+        lag_threshold: 卡顿阈值（秒），超过时抓取阻塞代码的调用栈
+        stall_log: 卡顿事件 JSONL 日志（None 使用环境变量 TIKHUB_STALL_LOG）
+
+    Returns:
+        入口协程的返回值
+    """
+    uvloop = _import_uvloop() if use_uvloop else None
+    watchdog = LoopWatchdog(
+        threshold=lag_threshold,
+        log_file=stall_log or DEFAULT_STALL_LOG
+    ) if lag_monitor else None
+    main = _bootstrap(coro, executor_workers or DEFAULT_EXECUTOR_WORKERS, watchdog)
+
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None) as runner:
+        return runner.run(main)
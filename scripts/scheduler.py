@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+优先级调度 - 按分数从高到低分发爬取任务，支持截止时间
+
+运行被预算或时间截断时，已完成的是最重要的用户，而不是列表前面的任意一部分。
+
+分数可替换（score_fn(username, prior) -> float），默认综合:
+    - 上次爬取的粉丝数（log10）
+    - 距上次爬取的天数（越久越优先，从未爬取的按最旧计算）
+    - 显式分级（tier 文件: 每行 "用户名,等级"，等级越大越优先）
+历史信息来自以前的结果 CSV。
+
+用法（批量脚本中）:
+    PRIORITY_CSVS = ["output/nova01_users.csv"]  # 用上次的结果排序
+    TIME_BUDGET = 3600                           # 一小时后停止分发新任务
+"""
+
+import heapq
+import itertools
+import math
+import time
+
+from compressed_io import open_text
+from records import read_records
+
+SECONDS_PER_DAY = 86400
+
+# 多少天未更新视为最旧（staleness 分量为 1）
+STALE_DAYS = 30
+
+
+def load_priors(csv_files: list) -> dict:
+    """以前的结果 → {用户名小写: (粉丝数, 爬取时间 epoch)}，同一用户保留最新的成功记录"""
+    priors = {}
+    for csv_file in csv_files:
+        for record in read_records(csv_file):
+            if record.scrape_status != 'success' or not record.username:
+                continue
+            key = record.username.lower()
+            scraped = record.scrape_time if isinstance(record.scrape_time, int) else 0
+            if key not in priors or scraped >= priors[key][1]:
+                priors[key] = (record.follower_count or 0, scraped)
+    return priors
+
+
+def load_tiers(path: str) -> dict:
+    """分级文件（每行 "用户名,等级"）→ {用户名小写: 等级}"""
+    tiers = {}
+    with open_text(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            username, _, tier = line.strip().partition(',')
+            if username:
+                tiers[username.lstrip('@').lower()] = float(tier or 1)
+    return tiers
+
+
+def make_score(
+    followers_weight: float = 1.0,
+    staleness_weight: float = 1.0,
+    tiers: dict = None,
+    tier_weight: float = 10.0,
+    now: float = None
+):
+    """
+    默认评分函数
+
+    score = tier_weight * 等级 + followers_weight * log10(粉丝数 + 1) + staleness_weight * min(天数 / 30, 1)
+    """
+    now = now or time.time()
+    tiers = tiers or {}
+
+    def score(username: str, prior) -> float:
+        followers, scraped = prior if prior else (0, 0)
+        staleness = min((now - scraped) / SECONDS_PER_DAY / STALE_DAYS, 1.0) if scraped else 1.0
+        return (
+            tier_weight * tiers.get(username.lower(), 0)
+            + followers_weight * math.log10(followers + 1)
+            + staleness_weight * staleness
+        )
+
+    return score
+
+
+class PriorityScheduler:
+    """堆实现的优先级队列，分数相同时保持加入顺序"""
+
+    def __init__(self, score_fn=None, priors: dict = None, deadline: float = None):
+        """
+        Args:
+            score_fn: 评分函数 score_fn(username, prior)，None 时按加入顺序（FIFO）
+            priors: load_priors() 的结果
+            deadline: 截止时间（time.monotonic() 时间），到达后 pop() 不再返回任务
+        """
+        self.score_fn = score_fn
+        self.priors = priors or {}
+        self.deadline = deadline
+        self._heap = []
+        self._counter = itertools.count()
+
+    def push(self, username: str, score: float = None):
+        """加入任务（可在运行中继续加入）"""
+        if score is None:
+            score = self.score_fn(username, self.priors.get(username.lower())) if self.score_fn else 0.0
+        heapq.heappush(self._heap, (-score, next(self._counter), username))
+
+    def extend(self, usernames):
+        for username in usernames:
+            self.push(username)
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def pop(self) -> str:
+        """取出分数最高的任务；队列为空或已到截止时间时返回 None"""
+        if not self._heap or self.expired():
+            return None
+        return heapq.heappop(self._heap)[2]
+
+    def remaining(self) -> list:
+        """尚未分发的任务（按优先级排序）"""
+        return [username for _, _, username in sorted(self._heap)]
+
+    def __len__(self) -> int:
+        return len(self._heap)
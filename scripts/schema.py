@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+输出数据字段定义（不依赖 httpx，离线工具可以直接导入）
+"""
+
+# 输出格式版本（分片数据集的 manifest 中记录；增删字段或改变含义时加 1）
+SCHEMA_VERSION = 1
+
+# CSV 字段
+CSV_FIELDS = [
+    'username',
+    'unique_id',
+    'nickname',
+    'uid',
+    'sec_uid',
+    'signature',
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count',
+    'verification_type',
+    'verified',
+    'bio_email',
+    'category',
+    'account_type',
+    'avatar_larger_url',
+    'profile_url',
+    'scrape_time',
+    'scrape_status',
+    'error_message'
+]
+
+# 作品列表字段（scrape_user_videos.py，每行一个作品）
+POST_FIELDS = [
+    'aweme_id',
+    'username',
+    'sec_uid',
+    'create_time',
+    'desc',
+    'duration',
+    'play_count',
+    'digg_count',
+    'comment_count',
+    'share_count',
+    'collect_count',
+    'is_top',
+    'share_url',
+    'scrape_time'
+]
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 TikTok User Profile Scraper - TikHub API
-使用 TikHub API v3 handler_user_profile 接口爬取用户资料
+使用 TikHub API v3 handler_user_profile 接口爬取用户资料，fetch_user_post_videos 接口按 cursor 翻页获取作品列表
 API 文档: https://api.tikhub.io/
 """
 
@@ -10,12 +10,60 @@ import json
 import httpx
 from datetime import datetime
 from pathlib import Path
+from cost_ledger import PRICE_PER_CALL, BudgetExceeded, CostLedger
+from negative_cache import NegativeCache, classify_failure
+from rate_limiter import AsyncRateLimiter
+
+# 作品列表每页数量
+POSTS_PAGE_SIZE = 20
+
+# 可以重试的 HTTP 状态码（限流、服务端暂时错误）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 第一次重试前的等待时间（秒），之后每次翻倍；响应带 Retry-After 时以它为准
+RETRY_BACKOFF = 1.0
+
+
+def _retry_delay(response, attempt: int) -> float:
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        return RETRY_BACKOFF * 2 ** attempt
+
+
+def inflight_key(unique_id: str = "", sec_user_id: str = "", user_id: str = "") -> tuple:
+    """按 API 使用的优先级（sec_user_id > user_id > unique_id）取规范化标识"""
+    if sec_user_id:
+        return ('sec_user_id', sec_user_id)
+    if user_id:
+        return ('user_id', str(user_id))
+    return ('unique_id', unique_id.strip().lstrip('@').lower())
+
+
+def save_json(filename, data: dict):
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
 
 
 class TikHubUserScraper:
     """TikHub TikTok 用户资料爬虫"""
 
-    def __init__(self, api_token: str, base_url: str = "https://api.tikhub.io"):
+    def __init__(
+        self,
+        api_token: str,
+        base_url: str = "https://api.tikhub.io",
+        transport=None,
+        record_to: str = None,
+        max_rps: float = None,
+        max_connections: int = 100,
+        ledger_file: str = None,
+        budget: float = None,
+        budget_mode: str = 'stop',
+        price_per_call: float = PRICE_PER_CALL,
+        run_label: str = None,
+        negative_cache: str = None
+    ):
         """
         初始化爬虫
 
@@ -24,10 +72,81 @@ class TikHubUserScraper:
             base_url: API 服务器地址
                 - 国际用户: https://api.tikhub.io
                 - 中国大陆用户: https://api.tikhub.dev
+            transport: 自定义 httpx 传输层（例如 cassette.ReplayTransport 离线回放）
+            record_to: 录制模式，把请求/响应写入该 cassette 文件（.jsonl.gz）
+            max_rps: 每秒最多请求数（None 表示不限流，只靠并发数控制）
+            max_connections: 连接池大小（应不小于并发数，否则请求会排队等待连接）
+            ledger_file: 费用账本 JSON 文件，按 Token 和运行累计计费请求（None 表示只在内存中统计）
+            budget: 本次运行的费用上限（美元，None 表示不限），用完后请求抛出 BudgetExceeded
+            budget_mode: 'stop' 达到预算后停止 / 'slow' 接近预算时降速
+            price_per_call: 每次计费请求的价格（美元）
+            run_label: 账本中本次运行的说明
+            negative_cache: 失效账号缓存 SQLite 文件，按用户名查询时跳过有效期内的已删除 / 封禁 / 私密账号
         """
         self.base_url = base_url
         self.api_token = api_token
         self.api_endpoint = f"{base_url}/api/v1/tiktok/app/v3/handler_user_profile"
+        self.posts_endpoint = f"{base_url}/api/v1/tiktok/app/v3/fetch_user_post_videos"
+
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        if record_to:
+            from cassette import RecordingTransport
+            # 录制传输层替代了客户端的连接池，连接数限制需要传给它创建的真实传输层
+            transport = RecordingTransport(record_to, inner=transport, limits=self.limits)
+        self.transport = transport
+        self._client = None
+        self.rate_limiter = AsyncRateLimiter(max_rps) if max_rps else None
+        self.ledger = CostLedger(
+            api_token,
+            path=ledger_file,
+            budget=budget,
+            mode=budget_mode,
+            price_per_call=price_per_call,
+            label=run_label
+        )
+        # 进行中的请求 {规范化标识: Task}，同一用户的并发请求共享一次网络调用
+        self._inflight = {}
+        # 每个进行中请求的等待者数，最后一个等待者被取消时取消请求本身
+        self._waiters = {}
+        self.coalesced = 0
+        self.negative_cache = NegativeCache(negative_cache) if negative_cache else None
+        self.skipped = 0
+        self.retried = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取共享的 AsyncClient（首次使用时创建，复用连接池）"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=60.0, transport=self.transport, limits=self.limits)
+        return self._client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享的 AsyncClient（供同一进程内的其他下载阶段复用连接池）"""
+        return self._get_client()
+
+    async def aclose(self):
+        """取消剩余的进行中请求，关闭共享客户端（录制模式下同时落盘 cassette），保存费用账本"""
+        pending = list(self._inflight.values())
+        for task in pending:
+            task.cancel()
+        if pending:
+            # 等请求结束（释放预算占用）后再保存账本和关闭客户端
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self.ledger.flush()
+        if self.negative_cache is not None:
+            self.negative_cache.close()
+            self.negative_cache = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        elif self.transport is not None:
+            await self.transport.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
 
     async def fetch_user_profile(
         self,
@@ -50,11 +169,47 @@ class TikHubUserScraper:
 
         Returns:
             用户资料数据字典，失败返回 None
+
+        Raises:
+            BudgetExceeded: 费用预算已用完（请求不会发出）
+
+        同一用户已有请求在进行时不再发出新请求，等待并共享该请求的结果
+        （列表中的重复用户、与主任务重叠的重试只计费一次）。
         """
         if not any([unique_id, sec_user_id, user_id]):
             print("✗ 错误：至少需要提供 unique_id、sec_user_id 或 user_id 中的一个")
             return None
 
+        if unique_id and not (sec_user_id or user_id) and self.negative_cache is not None:
+            failure_class = self.negative_cache.lookup(unique_id)
+            if failure_class:
+                self.skipped += 1
+                print(f"⊘ 跳过失效账号: @{unique_id}（{failure_class}）")
+                return None
+
+        key = inflight_key(unique_id, sec_user_id, user_id)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            print(f"↺ 合并重复请求: {key[0]}={key[1]}")
+        else:
+            task = asyncio.ensure_future(self._fetch_user_profile(unique_id, sec_user_id, user_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: 某个等待者被取消时不影响共享同一请求的其他等待者；
+        # 所有等待者都被取消时（例如中断后超过宽限期）取消请求，不再为无人使用的结果计费
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    async def _fetch_user_profile(self, unique_id: str, sec_user_id: str, user_id: str) -> dict:
+        """实际发出请求（由 fetch_user_profile 合并重复调用后执行）"""
         # 显示使用的参数
         params_display = []
         if sec_user_id:
@@ -66,11 +221,6 @@ class TikHubUserScraper:
 
         print(f"正在获取用户资料: {', '.join(params_display)}")
 
-        # 构建请求头（使用 Bearer Token 认证）
-        headers = {
-            "Authorization": f"Bearer {self.api_token}"
-        }
-
         # 构建请求参数
         params = {
             "unique_id": unique_id if unique_id else "",
@@ -78,43 +228,137 @@ class TikHubUserScraper:
             "user_id": user_id if user_id else ""
         }
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            try:
-                response = await client.get(
-                    self.api_endpoint,
-                    params=params,
-                    headers=headers
-                )
-
-                print(f"请求 URL: {response.url}")
-                print(f"响应状态码: {response.status_code}")
-
-                response.raise_for_status()
-
-                data = response.json()
-
-                if data.get("code") == 200:
-                    print(f"✓ 成功获取用户资料")
-                    return data
-                else:
-                    print(f"✗ API 返回错误 (code={data.get('code')}): {data.get('message', 'Unknown error')}")
-                    return None
-
-            except httpx.HTTPStatusError as e:
-                print(f"✗ HTTP 状态错误: {e.response.status_code}")
-                try:
-                    error_data = e.response.json()
-                    print(f"错误详情: {json.dumps(error_data, indent=2, ensure_ascii=False)}")
-                except:
-                    print(f"响应内容: {e.response.text[:500]}")
-                return None
-            except httpx.HTTPError as e:
-                print(f"✗ HTTP 请求错误: {e}")
-                return None
-            except Exception as e:
-                print(f"✗ 未知错误: {e}")
+        try:
+            response = await self._request(self.api_endpoint, params)
+
+            print(f"请求 URL: {response.url}")
+            print(f"响应状态码: {response.status_code}")
+
+            response.raise_for_status()
+
+            data = response.json()
+
+            if data.get("code") == 200:
+                print(f"✓ 成功获取用户资料")
+                if unique_id and self.negative_cache is not None:
+                    self.negative_cache.discard(unique_id)
+                return data
+            else:
+                print(f"✗ API 返回错误 (code={data.get('code')}): {data.get('message', 'Unknown error')}")
+                self._record_failure(unique_id, response.status_code, data.get('code'), data.get('message', ''))
                 return None
 
+        except httpx.HTTPStatusError as e:
+            print(f"✗ HTTP 状态错误: {e.response.status_code}")
+            try:
+                error_data = e.response.json()
+                print(f"错误详情: {json.dumps(error_data, indent=2, ensure_ascii=False)}")
+            except:
+                error_data = None
+                print(f"响应内容: {e.response.text[:500]}")
+            message = json.dumps(error_data, ensure_ascii=False) if error_data else e.response.text[:500]
+            code = error_data.get('code') if isinstance(error_data, dict) else None
+            self._record_failure(unique_id, e.response.status_code, code, message)
+            return None
+        except httpx.HTTPError as e:
+            print(f"✗ HTTP 请求错误: {e}")
+            return None
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            print(f"✗ 未知错误: {e}")
+            return None
+
+    async def _request(self, endpoint: str, params: dict, retries: int = 0) -> httpx.Response:
+        """
+        发出一次 GET 请求: 共享连接池、限流器和费用账本（每次尝试单独计费）
+
+        Args:
+            endpoint: 接口地址
+            params: 查询参数
+            retries: 网络错误、429、5xx 时的最多重试次数（指数退避，遵守 Retry-After）
+
+        Returns:
+            最后一次尝试的响应（状态码由调用方检查）
+
+        Raises:
+            BudgetExceeded: 费用预算已用完
+            httpx.HTTPError: 网络错误且重试用完
+        """
+        client = self._get_client()
+        headers = {"Authorization": f"Bearer {self.api_token}"}
+        for attempt in range(retries + 1):
+            await self.ledger.acquire()
+            billed = False
+            response = None
+            try:
+                if self.rate_limiter:
+                    await self.rate_limiter.acquire()
+                response = await client.get(endpoint, params=params, headers=headers)
+                billed = response.is_success
+                if response.status_code not in RETRY_STATUS or attempt == retries:
+                    return response
+            except httpx.TransportError as e:
+                if attempt == retries:
+                    raise
+                print(f"  ↻ 网络错误: {e}")
+            finally:
+                self.ledger.settle(billed)
+
+            delay = _retry_delay(response, attempt)
+            self.retried += 1
+            print(f"  ↻ {delay:.1f} 秒后重试（第 {attempt + 1}/{retries} 次）" +
+                  (f": HTTP {response.status_code}" if response is not None else ""))
+            await asyncio.sleep(delay)
+
+    async def fetch_user_posts(
+        self,
+        sec_user_id: str,
+        max_cursor: int = 0,
+        count: int = POSTS_PAGE_SIZE,
+        retries: int = 2
+    ) -> dict:
+        """
+        获取用户作品列表的一页（按发布时间从新到旧）
+
+        Args:
+            sec_user_id: 用户 sec_user_id（作品接口只接受 sec_user_id）
+            max_cursor: 翻页 cursor，0 表示第一页；下一页使用返回的 max_cursor
+            count: 每页数量
+            retries: 网络错误、429、5xx 时的重试次数（翻到一半失败会中断该用户的翻页，值得重试）
+
+        Returns:
+            data 字典（aweme_list、has_more、max_cursor），失败返回 None
+
+        Raises:
+            BudgetExceeded: 费用预算已用完（请求不会发出）
+        """
+        params = {"sec_user_id": sec_user_id, "max_cursor": max_cursor, "count": count}
+        try:
+            response = await self._request(self.posts_endpoint, params, retries=retries)
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPStatusError as e:
+            print(f"  ✗ 作品列表 HTTP {e.response.status_code}: {e.response.text[:200]}")
+            return None
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"  ✗ 作品列表请求错误: {e}")
+            return None
+
+        if data.get("code") != 200:
+            print(f"  ✗ 作品列表 API 错误 (code={data.get('code')}): {data.get('message', 'Unknown error')}")
+            return None
+        return data.get("data") or {}
+
+    def _record_failure(self, unique_id: str, status_code: int, code, message: str):
+        """永久性失败（账号不存在 / 封禁 / 私密等）记入失效账号缓存"""
+        if not unique_id or self.negative_cache is None:
+            return
+        failure_class = classify_failure(status_code, code, message)
+        if failure_class:
+            self.negative_cache.record(unique_id, failure_class, message)
+            print(f"⊘ 记为失效账号: @{unique_id}（{failure_class}）")
+
     async def scrape_user(self, username: str, save_to_file: bool = True) -> dict:
         """
         爬取指定用户名的资料
@@ -141,8 +385,8 @@ class TikHubUserScraper:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = output_dir / f"{username}_{timestamp}.json"
 
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            # 序列化和写文件放到线程池，不阻塞其他并发请求
+            await asyncio.get_running_loop().run_in_executor(None, save_json, filename, result)
 
             print(f"✓ 数据已保存到: {filename}")
 
@@ -248,7 +492,8 @@ async def main():
     )
 
     # 爬取用户资料
-    result = await scraper.scrape_user(TARGET_USERNAME)
+    async with scraper:
+        result = await scraper.scrape_user(TARGET_USERNAME)
 
     if result:
         # 打印摘要
@@ -259,4 +504,5 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import runtime
+    runtime.run(main())
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+批量获取用户作品列表 - 按 cursor 翻页，多个用户的 cursor 同时推进
+
+    - 同一用户的翻页只能串行（下一页的 max_cursor 来自上一页的响应），并发来自同时推进
+      concurrency 个用户的 cursor: 一个用户翻完（或达到页数上限）后 worker 立即接手下一个用户
+    - 与资料爬取共用 TikHubUserScraper 的连接池、限流器、费用账本和重试（429 / 5xx / 网络错误）
+    - 作品逐页追加写入 JSONL（或 CSV）文件，不改写已有内容
+    - 每个用户的翻页进度保存在 <output>.cursors.db（SQLite）:
+        newest    已保存的最新作品发布时间: 再次运行时从第一页开始，遇到不比它新的作品即停止（只取新作品）
+        cursor    向更早作品回填的 cursor: 达到每用户页数上限时记下，下次运行继续回填
+        complete  已翻到最后一页
+    - 进度在结果写入磁盘后才保存；两次保存之间中断时，部分作品会在下次运行时再次写入，按 aweme_id 去重即可
+
+输入是资料爬取的结果 CSV（或分片数据集），使用其中成功且有 sec_uid 的用户。
+
+用法:
+    python3 scrape_user_videos.py output/nova01_users.csv output/nova01_posts.jsonl.gz --token YOUR_API_TOKEN
+    python3 scrape_user_videos.py output/nova01_users.csv output/nova01_posts.jsonl.gz --token ... --max-pages 5 --budget 2
+"""
+
+import argparse
+import sqlite3
+import time
+from collections import deque
+
+import runtime
+from cost_ledger import BudgetExceeded
+from records import format_time, read_records
+from result_writer import ResultWriter
+from schema import POST_FIELDS
+from scrape_user_tikhub import TikHubUserScraper
+from shutdown import DEFAULT_GRACE_PERIOD, GracefulShutdown
+
+# 每个用户每次运行最多翻的页数（新作品和回填合计）
+MAX_PAGES = 10
+
+# 每完成多少个用户保存一次翻页进度
+COMMIT_EVERY = 100
+
+
+def post_row(username: str, sec_uid: str, item: dict, scrape_time: int) -> dict:
+    """API 返回的作品对象 → 一行"""
+    stats = item.get('statistics') or {}
+    create_time = item.get('create_time') or 0
+    return {
+        'aweme_id': str(item.get('aweme_id', '')),
+        'username': username,
+        'sec_uid': sec_uid,
+        'create_time': format_time(create_time) if create_time else '',
+        'desc': (item.get('desc') or '').replace('\n', ' '),
+        'duration': (item.get('video') or {}).get('duration', 0),
+        'play_count': stats.get('play_count', 0),
+        'digg_count': stats.get('digg_count', 0),
+        'comment_count': stats.get('comment_count', 0),
+        'share_count': stats.get('share_count', 0),
+        'collect_count': stats.get('collect_count', 0),
+        'is_top': 1 if item.get('is_top') else 0,
+        'share_url': item.get('share_url') or (item.get('share_info') or {}).get('share_url', ''),
+        'scrape_time': format_time(scrape_time)
+    }
+
+
+class CursorStore:
+    """每个用户的翻页进度（SQLite，put() 只写入事务，commit() 时落盘）"""
+
+    def __init__(self, db_path: str, timeout: float = 30.0):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=timeout)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cursors (
+                sec_uid TEXT PRIMARY KEY,
+                username TEXT,
+                newest INTEGER,
+                cursor INTEGER NOT NULL DEFAULT 0,
+                complete INTEGER NOT NULL DEFAULT 0,
+                posts INTEGER NOT NULL DEFAULT 0,
+                updated INTEGER
+            ) WITHOUT ROWID;
+        """)
+
+    def get(self, sec_uid: str) -> dict:
+        row = self.conn.execute(
+            "SELECT newest, cursor, complete, posts FROM cursors WHERE sec_uid = ?", (sec_uid,)
+        ).fetchone()
+        if row is None:
+            return {'newest': None, 'cursor': 0, 'complete': False, 'posts': 0}
+        return {'newest': row[0], 'cursor': row[1], 'complete': bool(row[2]), 'posts': row[3]}
+
+    def put(self, sec_uid: str, username: str, state: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO cursors (sec_uid, username, newest, cursor, complete, posts, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sec_uid, username, state['newest'], state['cursor'], int(state['complete']), state['posts'], int(time.time()))
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def summary(self) -> dict:
+        users, complete, posts = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(complete), 0), COALESCE(SUM(posts), 0) FROM cursors"
+        ).fetchone()
+        return {'users': users, 'complete': complete, 'posts': posts}
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def _created(item: dict) -> int:
+    return item.get('create_time') or 0
+
+
+async def scrape_user_posts(scraper, username: str, sec_uid: str, state: dict, writer, max_pages: int, shutdown) -> dict:
+    """
+    翻页获取一个用户的作品（state 按页原地更新）
+
+    先取新作品（已有 newest 时从第一页翻到已保存的作品为止），再沿保存的 cursor 向更早的作品回填，
+    两部分合计不超过 max_pages 页。
+
+    Returns:
+        {'pages': 请求页数, 'posts': 写入的作品数, 'failed': 是否有一页请求失败}
+    """
+    result = {'pages': 0, 'posts': 0, 'failed': False}
+
+    async def fetch(cursor: int):
+        result['pages'] += 1
+        data = await scraper.fetch_user_posts(sec_uid, max_cursor=cursor)
+        if data is None:
+            result['failed'] = True
+        return data
+
+    async def save(items: list):
+        now = int(time.time())
+        for item in items:
+            await writer.put(post_row(username, sec_uid, item, now))
+        result['posts'] += len(items)
+        state['posts'] += len(items)
+
+    # 1. 新作品: 从第一页翻到已保存的最新作品
+    if state['newest'] is not None:
+        known = state['newest']
+        newest = known
+        cursor = 0
+        while result['pages'] < max_pages and not shutdown.requested:
+            data = await fetch(cursor)
+            if data is None:
+                return result
+            items = data.get('aweme_list') or []
+            fresh = [item for item in items if _created(item) > known]
+            await save(fresh)
+            newest = max([newest] + [_created(item) for item in fresh])
+            # 置顶作品可能很旧，不作为"已翻到旧作品"的依据
+            reached = any(not item.get('is_top') and _created(item) <= known for item in items)
+            next_cursor = data.get('max_cursor') or 0
+            if reached or not data.get('has_more') or not items or next_cursor == cursor:
+                # 只在新作品取全时前移 newest；中途达到页数上限时下次重新取，避免留下缺口
+                state['newest'] = newest
+                break
+            cursor = next_cursor
+
+    # 2. 回填更早的作品
+    while not state['complete'] and result['pages'] < max_pages and not shutdown.requested:
+        cursor = state['cursor']
+        data = await fetch(cursor)
+        if data is None:
+            return result
+        items = data.get('aweme_list') or []
+        await save(items)
+        if state['newest'] is None:
+            state['newest'] = max((_created(item) for item in items), default=0)
+        next_cursor = data.get('max_cursor') or 0
+        if not data.get('has_more') or not items or next_cursor == cursor:
+            state['complete'] = True
+        else:
+            state['cursor'] = next_cursor
+
+    return result
+
+
+def load_users(csv_path: str, max_users: int = None) -> list:
+    """结果 CSV 中成功且有 sec_uid 的用户 [(username, sec_uid), ...]（按 sec_uid 去重）"""
+    users = {}
+    for record in read_records(csv_path):
+        if record.scrape_status == 'success' and record.sec_uid:
+            users.setdefault(record.sec_uid, record.username)
+    users = [(username, sec_uid) for sec_uid, username in users.items()]
+    return users[:max_users] if max_users else users
+
+
+async def scrape_users_videos(
+    input_csv: str,
+    output: str,
+    api_token: str,
+    api_base_url: str = "https://api.tikhub.io",
+    concurrency: int = 10,
+    max_rps: float = None,
+    max_pages: int = MAX_PAGES,
+    max_users: int = None,
+    budget: float = None,
+    budget_mode: str = 'stop',
+    cursor_db: str = None,
+    ledger_file: str = None,
+    grace_period: float = DEFAULT_GRACE_PERIOD,
+    transport=None
+):
+    """
+    批量获取用户作品列表
+
+    Args:
+        input_csv: 资料爬取的结果 CSV（或分片数据集目录）
+        output: 作品输出文件（.jsonl / .csv，可加 .gz / .zst），只追加
+        api_token: TikHub API Token
+        api_base_url: API 基础 URL
+        concurrency: 同时翻页的用户数
+        max_rps: 每秒最多请求数（None 表示不限流）
+        max_pages: 每个用户每次运行最多请求的页数
+        max_users: 最多处理的用户数（None 表示全部）
+        budget: 费用预算（美元），用完后不再请求新页，进度照常保存
+        budget_mode: 'stop' / 'slow'
+        cursor_db: 翻页进度数据库（默认 <output>.cursors.db）
+        ledger_file: 费用账本（默认输出目录下的 cost_ledger.json）
+        grace_period: Ctrl+C / SIGTERM 后等待进行中请求的时间（秒）
+        transport: 自定义 httpx 传输层
+    """
+    print("="*60)
+    print("批量获取 TikTok 用户作品列表")
+    print("="*60)
+    print()
+
+    print(f"读取用户: {input_csv}")
+    users = deque(load_users(input_csv, max_users))
+    total = len(users)
+    print(f"✓ {total} 个用户（成功且有 sec_uid）")
+
+    writer = ResultWriter(output, fieldnames=POST_FIELDS, append=True)
+    output_path = writer.path
+    store = CursorStore(cursor_db or str(output_path.with_name(output_path.name + '.cursors.db')))
+    scraper = TikHubUserScraper(
+        api_token=api_token,
+        base_url=api_base_url,
+        transport=transport,
+        max_rps=max_rps,
+        max_connections=max(100, concurrency),
+        ledger_file=ledger_file or output_path.with_name('cost_ledger.json'),
+        budget=budget,
+        budget_mode=budget_mode,
+        run_label=output_path.name
+    )
+    ledger = scraper.ledger
+    print(f"✓ 同时翻页: {concurrency} 个用户，每个用户最多 {max_pages} 页")
+    print(f"✓ 最多 {total * max_pages:,} 次请求（约 ${ledger.estimate(total * max_pages):.2f}），"
+          f"已翻完的用户通常只需 1 页")
+    if budget is not None:
+        print(f"✓ 费用预算: ${budget:.2f}")
+    print()
+
+    counts = {'users': 0, 'pages': 0, 'posts': 0, 'failed': 0, 'complete': 0}
+    shutdown = GracefulShutdown(grace_period)
+
+    async def worker():
+        while users and not ledger.exhausted and not shutdown.requested:
+            username, sec_uid = users.popleft()
+            state = store.get(sec_uid)
+            try:
+                result = await scrape_user_posts(scraper, username, sec_uid, state, writer, max_pages, shutdown)
+            except BudgetExceeded:
+                users.appendleft((username, sec_uid))
+                return
+            finally:
+                # 已写入的页对应的进度（中断时也保存，下次从这里继续）
+                store.put(sec_uid, username, state)
+
+            counts['users'] += 1
+            counts['pages'] += result['pages']
+            counts['posts'] += result['posts']
+            counts['failed'] += result['failed']
+            counts['complete'] += state['complete']
+            mark = '✗' if result['failed'] else '✓'
+            print(f"[{counts['users']}/{total}] {mark} @{username}: {result['posts']} 个作品，{result['pages']} 页"
+                  + ("" if state['complete'] else f"（未翻完，cursor={state['cursor']}）"))
+            if counts['users'] % COMMIT_EVERY == 0:
+                await writer.sync()
+                store.commit()
+
+    try:
+        with shutdown:
+            await shutdown.gather(*(worker() for _ in range(min(concurrency, max(1, total)))))
+    finally:
+        # 作品写入磁盘后再保存进度
+        await writer.aclose()
+        store.close()
+        await scraper.aclose()
+
+    summary = CursorStore(store.db_path)
+    totals = summary.summary()
+    summary.close()
+
+    print()
+    print("="*60)
+    print("作品列表统计")
+    print("="*60)
+    print(f"处理用户: {counts['users']} / {total}")
+    print(f"请求页数: {counts['pages']}")
+    print(f"新写入作品: {counts['posts']}")
+    print(f"已翻完的用户: {counts['complete']}")
+    if counts['failed']:
+        print(f"✗ 翻页失败的用户: {counts['failed']}（下次运行从保存的 cursor 继续）")
+    if scraper.retried:
+        print(f"↻ 重试请求: {scraper.retried}")
+    print(ledger.format_summary())
+    if shutdown.requested:
+        print(shutdown.format_summary())
+    if users:
+        print(f"{len(users)} 个用户未处理；再次运行即可从保存的进度继续")
+    print(f"累计: {totals['users']} 个用户，{totals['complete']} 个已翻完，{totals['posts']:,} 个作品")
+    print(f"✓ 作品文件: {output_path}")
+    print("="*60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量获取用户作品列表（cursor 翻页，增量更新）")
+    parser.add_argument('input_csv', help="资料爬取的结果 CSV")
+    parser.add_argument('output', help="作品输出文件（.jsonl / .csv，可加 .gz / .zst）")
+    parser.add_argument('--token', required=True)
+    parser.add_argument('--base-url', default="https://api.tikhub.io")
+    parser.add_argument('--concurrency', type=int, default=10, help="同时翻页的用户数")
+    parser.add_argument('--max-rps', type=float)
+    parser.add_argument('--max-pages', type=int, default=MAX_PAGES, help="每个用户每次最多请求的页数")
+    parser.add_argument('--max-users', type=int)
+    parser.add_argument('--budget', type=float, help="费用预算（美元）")
+    parser.add_argument('--budget-mode', choices=['stop', 'slow'], default='stop')
+    parser.add_argument('--cursor-db', help="翻页进度数据库（默认 <output>.cursors.db）")
+    args = parser.parse_args()
+
+    runtime.run(scrape_users_videos(
+        input_csv=args.input_csv,
+        output=args.output,
+        api_token=args.token,
+        api_base_url=args.base_url,
+        concurrency=args.concurrency,
+        max_rps=args.max_rps,
+        max_pages=args.max_pages,
+        max_users=args.max_users,
+        budget=args.budget,
+        budget_mode=args.budget_mode,
+        cursor_db=args.cursor_db
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+分片输出 - 结果写成按用户名哈希或按时间分区的多个分片文件，并附带 manifest.json
+
+数据集目录:
+    output/nova01_users/
+        manifest.json        schema 版本、分区方式，以及每个分片的行数、成功数、键范围、SHA-256
+        part-00.csv ...      哈希分区（与多进程分片爬取的分片方式相同）
+        part-2026-10.csv     按月分区（--by month）
+
+    - 输出路径以 / 结尾时写成数据集目录（爬取、合并），各分片可以同时写入
+    - 合并、对比、查询、分析遇到含 manifest.json 的目录时多进程并行读取各分片，
+      并按 manifest 跳过不可能包含结果的分片（例如粉丝数范围不满足条件、按用户名查询时只读一个哈希分区）
+
+用法:
+    python3 sharded_output.py split output/merged_all_users.csv output/merged_users/ --parts 16
+    python3 sharded_output.py split output/merged_all_users.csv output/by_month/ --by month --suffix .csv.gz
+    python3 sharded_output.py info output/merged_users
+    python3 sharded_output.py verify output/merged_users
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from compressed_io import open_text, output_path as resolve_output_path
+from schema import CSV_FIELDS, SCHEMA_VERSION
+
+MANIFEST_FILE = 'manifest.json'
+
+# 默认哈希分区数
+DEFAULT_PARTS = 16
+
+# 分片文件扩展名（.csv.gz / .csv.zst 时压缩）
+PART_SUFFIX = '.csv'
+
+# manifest 中记录取值范围的列（按范围跳过分片）
+RANGE_FIELDS = [
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count'
+]
+
+# 时间分区: 取 scrape_time 的前几个字符
+TIME_PARTITIONS = {'month': 7, 'day': 10}
+
+
+def is_dataset(path) -> bool:
+    """是否为分片数据集目录（含 manifest.json）"""
+    path = Path(path)
+    return path.is_dir() and (path / MANIFEST_FILE).exists()
+
+
+def is_dataset_output(path) -> bool:
+    """输出路径是否应写成数据集（以 / 结尾，或已经是数据集）"""
+    return str(path).endswith(('/', os.sep)) or is_dataset(path)
+
+
+def hash_partition(username: str, parts: int) -> int:
+    """按用户名哈希分区（crc32 在各进程间稳定，不受 PYTHONHASHSEED 影响）"""
+    return zlib.crc32(username.lower().encode('utf-8')) % parts
+
+
+def part_name(index: int, suffix: str = PART_SUFFIX) -> str:
+    return f"part-{index:02d}{suffix}"
+
+
+def load_manifest(path) -> dict:
+    with open(Path(path) / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('schema_version', 0) > SCHEMA_VERSION:
+        raise ValueError(f"数据集 schema 版本 {manifest['schema_version']} 比当前版本 {SCHEMA_VERSION} 新: {path}")
+    return manifest
+
+
+def dataset_files(path) -> list:
+    """数据集中的分片文件（普通文件返回自身）"""
+    if not is_dataset(path):
+        return [Path(path)]
+    return [Path(path) / shard['file'] for shard in load_manifest(path)['shards']]
+
+
+def _checksum(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _to_int(value: str):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def describe_shard(path) -> dict:
+    """扫描一个分片: 行数、成功数、用户名 / 爬取时间 / 计数列的范围、校验和"""
+    path = Path(path)
+    rows = success = 0
+    ranges = {}
+    with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        positions = {field: i for i, field in enumerate(header)}
+        username_index = positions.get('username')
+        time_index = positions.get('scrape_time')
+        status_index = positions.get('scrape_status')
+        range_columns = [(field, positions[field]) for field in RANGE_FIELDS if field in positions]
+        width = len(header)
+
+        def widen(field, value):
+            bounds = ranges.get(field)
+            if bounds is None:
+                ranges[field] = [value, value]
+            elif value < bounds[0]:
+                bounds[0] = value
+            elif value > bounds[1]:
+                bounds[1] = value
+
+        for row in reader:
+            if len(row) < width:
+                row += [''] * (width - len(row))
+            rows += 1
+            if status_index is not None and row[status_index] == 'success':
+                success += 1
+            if username_index is not None and row[username_index]:
+                widen('username', row[username_index].lower())
+            if time_index is not None and row[time_index]:
+                widen('scrape_time', row[time_index])
+            for field, i in range_columns:
+                # 空值按 0 记入范围（与 query_users 的比较方式一致）
+                value = _to_int(row[i] or '0')
+                if value is not None:
+                    widen(field, value)
+
+    return {
+        'file': path.name,
+        'rows': rows,
+        'success': success,
+        'bytes': path.stat().st_size,
+        'sha256': _checksum(path),
+        'ranges': ranges
+    }
+
+
+def map_shards(fn, items: list, workers: int = None):
+    """多进程对每个分片调用 fn（按顺序产生结果）；只有一个分片时在当前进程执行"""
+    if len(items) <= 1 or workers == 1:
+        yield from map(fn, items)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(items))) as pool:
+        yield from pool.map(fn, items)
+
+
+def write_manifest(directory, files: list, partitioning: dict) -> dict:
+    """
+    扫描分片文件（并行）并写入 manifest.json
+
+    Args:
+        directory: 数据集目录
+        files: 分片文件路径
+        partitioning: 分区方式，例如 {'by': 'hash', 'key': 'username', 'parts': 16} 或 {'by': 'month'}
+    """
+    directory = Path(directory)
+    files = [Path(f) for f in files if Path(f).exists()]
+    manifest = {
+        'schema_version': SCHEMA_VERSION,
+        'fields': CSV_FIELDS,
+        'partitioning': partitioning,
+        'created': int(time.time()),
+        'shards': list(map_shards(describe_shard, files))
+    }
+    manifest['rows'] = sum(shard['rows'] for shard in manifest['shards'])
+    tmp = directory / (MANIFEST_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, directory / MANIFEST_FILE)
+    return manifest
+
+
+def write_dataset(rows, directory, by: str = 'hash', parts: int = DEFAULT_PARTS, suffix: str = PART_SUFFIX) -> dict:
+    """
+    把行写成数据集（覆盖目录中已有的 manifest）
+
+    Args:
+        rows: UserRecord 或字典
+        directory: 数据集目录
+        by: 'hash' 按用户名哈希 / 'month' / 'day' 按 scrape_time
+        parts: 哈希分区数
+        suffix: 分片扩展名（.csv / .csv.gz / .csv.zst）
+    """
+    if by != 'hash' and by not in TIME_PARTITIONS:
+        raise ValueError(f"不支持的分区方式: {by}")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    suffix = resolve_output_path('part' + suffix).name[len('part'):]
+
+    files = {}
+    writers = {}
+    try:
+        for row in rows:
+            if by == 'hash':
+                name = part_name(hash_partition(row.get('username') or '', parts), suffix)
+            else:
+                name = f"part-{(row.get('scrape_time') or 'unknown')[:TIME_PARTITIONS[by]]}{suffix}"
+            writer = writers.get(name)
+            if writer is None:
+                f = files[name] = open_text(directory / name, 'w', newline='', encoding='utf-8-sig')
+                writer = writers[name] = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+                writer.writeheader()
+            writer.writerow(row)
+    finally:
+        for f in files.values():
+            f.close()
+
+    partitioning = {'by': 'hash', 'key': 'username', 'parts': parts} if by == 'hash' else {'by': by, 'key': 'scrape_time'}
+    return write_manifest(directory, [directory / name for name in sorted(files)], partitioning)
+
+
+def _may_match(shard: dict, predicate, partitioning: dict) -> bool:
+    """按 manifest 判断分片中是否可能有满足条件的行"""
+    field, op = predicate.field, predicate.op
+    if field == 'scrape_status' and op == '=' and predicate.value == 'success':
+        return shard['success'] > 0
+    if field == 'username' and op == '=':
+        if partitioning.get('by') == 'hash' and partitioning.get('key') == 'username':
+            # 空的哈希分区没有文件，按文件名对应分区号
+            return shard['file'].split('.')[0] == part_name(hash_partition(predicate.value, partitioning['parts']), '')
+        bounds = shard['ranges'].get('username')
+        return bounds is not None and bounds[0] <= predicate.value.lower() <= bounds[1]
+    bounds = shard['ranges'].get(field)
+    if bounds is None or predicate.number is None or op in ('!=', '~'):
+        return True
+    low, high = bounds
+    value = predicate.number
+    return {
+        '=': low <= value <= high,
+        '>': high > value,
+        '>=': high >= value,
+        '<': low < value,
+        '<=': low <= value
+    }[op]
+
+
+def select_shards(path, predicates: list = None) -> tuple:
+    """
+    按条件（query_users.Predicate）从 manifest 中选出需要读取的分片
+
+    Returns:
+        (分片文件列表, 跳过的分片数)
+    """
+    manifest = load_manifest(path)
+    partitioning = manifest.get('partitioning', {})
+    selected = []
+    for shard in manifest['shards']:
+        if shard['rows'] and all(_may_match(shard, p, partitioning) for p in predicates or []):
+            selected.append(Path(path) / shard['file'])
+    return selected, len(manifest['shards']) - len(selected)
+
+
+def _read_shard(path) -> list:
+    from records import read_records
+    return list(read_records(path))
+
+
+def read_dataset(path, workers: int = None):
+    """并行读取数据集的所有分片，按分片顺序产生 UserRecord"""
+    for records in map_shards(_read_shard, dataset_files(path), workers):
+        yield from records
+
+
+def verify(path) -> bool:
+    """按 manifest 校验每个分片的 SHA-256 和行数"""
+    manifest = load_manifest(path)
+    ok = True
+    for shard, actual in zip(manifest['shards'], map_shards(describe_shard, dataset_files(path))):
+        if actual['sha256'] != shard['sha256'] or actual['rows'] != shard['rows']:
+            print(f"✗ {shard['file']}: 内容与 manifest 不一致")
+            ok = False
+    return ok
+
+
+def print_info(path):
+    manifest = load_manifest(path)
+    partitioning = manifest['partitioning']
+    print(f"数据集: {path}")
+    print(f"  schema 版本: {manifest['schema_version']}")
+    print(f"  分区: {partitioning['by']}" + (f" × {partitioning['parts']}" if 'parts' in partitioning else ""))
+    print(f"  总行数: {manifest['rows']:,}")
+    for shard in manifest['shards']:
+        followers = shard['ranges'].get('follower_count', ['-', '-'])
+        print(f"  {shard['file']:<24}{shard['rows']:>10,} 行  成功 {shard['success']:>10,}  "
+              f"粉丝 {followers[0]} ~ {followers[1]}  {shard['bytes'] / 1024:.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片数据集（manifest.json）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('split', help="把 CSV 拆分为数据集")
+    p.add_argument('input', help="结果 CSV（或其他数据集）")
+    p.add_argument('output', help="数据集目录")
+    p.add_argument('--by', choices=['hash', 'month', 'day'], default='hash')
+    p.add_argument('--parts', type=int, default=DEFAULT_PARTS, help="哈希分区数")
+    p.add_argument('--suffix', default=PART_SUFFIX, help="分片扩展名（.csv / .csv.gz / .csv.zst）")
+
+    p = subparsers.add_parser('info', help="查看 manifest")
+    p.add_argument('dataset')
+
+    p = subparsers.add_parser('verify', help="校验分片校验和")
+    p.add_argument('dataset')
+
+    p = subparsers.add_parser('rebuild', help="重新扫描分片并生成 manifest（手动修改分片后）")
+    p.add_argument('dataset')
+
+    args = parser.parse_args()
+
+    if args.command == 'split':
+        from records import read_records
+        rows = read_dataset(args.input) if is_dataset(args.input) else read_records(args.input)
+        manifest = write_dataset(rows, args.output, args.by, args.parts, args.suffix)
+        print(f"✓ {manifest['rows']:,} 行写入 {len(manifest['shards'])} 个分片: {args.output}")
+    elif args.command == 'info':
+        print_info(args.dataset)
+    elif args.command == 'verify':
+        if not verify(args.dataset):
+            raise SystemExit(1)
+        print(f"✓ 所有分片与 manifest 一致: {args.dataset}")
+    elif args.command == 'rebuild':
+        manifest = load_manifest(args.dataset)
+        manifest = write_manifest(args.dataset, dataset_files(args.dataset), manifest['partitioning'])
+        print(f"✓ 已重新生成 manifest: {manifest['rows']:,} 行")
+
+
+if __name__ == "__main__":
+    main()
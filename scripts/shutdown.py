@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+优雅退出 - Ctrl+C / SIGTERM 时保存已完成的结果，而不是全部丢弃
+
+    第一次信号: 停止分发新任务，进行中的请求在宽限期内继续完成，
+               之后取消仍未完成的请求；调用方照常写出已完成的行和检查点（剩余用户列表、统计）
+    第二次信号: 立即取消进行中的请求，只保存已完成的结果
+    第三次信号: 恢复默认处理（KeyboardInterrupt），用于保存阶段本身卡住的情况
+
+用法（异步入口中）:
+    with GracefulShutdown(grace_period=30) as shutdown:
+        results = await shutdown.gather(*(worker() for _ in range(concurrency)))
+    # worker 中每次取任务前检查 shutdown.requested；被取消的任务在 results 中为 None
+
+多进程分片模式下 Ctrl+C 会同时发给所有分片进程（同一进程组），每个分片各自保存；
+用 kill 停止时请发给整个进程组: kill -TERM -<进程组号>。
+"""
+
+import asyncio
+import signal
+
+# 收到第一次信号后等待进行中请求的时间（秒）
+DEFAULT_GRACE_PERIOD = 30.0
+
+SIGNALS = tuple(sig for sig in (signal.SIGINT, getattr(signal, 'SIGTERM', None)) if sig is not None)
+
+
+class GracefulShutdown:
+    """信号处理和进行中任务的收尾"""
+
+    def __init__(self, grace_period: float = DEFAULT_GRACE_PERIOD, signals: tuple = SIGNALS):
+        """
+        Args:
+            grace_period: 第一次信号后等待进行中任务的最长时间（秒）
+            signals: 处理的信号
+        """
+        self.grace_period = grace_period
+        self.signals = signals
+        self.signal_name = None
+        self.completed = 0      # 收到信号后在宽限期内完成的任务数
+        self.cancelled = 0      # 宽限期结束或中止时取消的任务数
+        self._requested = asyncio.Event()
+        self._aborted = asyncio.Event()
+        self._loop = None
+        self._previous = {}
+
+    @property
+    def requested(self) -> bool:
+        """是否已收到退出信号（收到后不应再分发新任务）"""
+        return self._requested.is_set()
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted.is_set()
+
+    def request(self, name: str = "请求"):
+        """收到信号（也可在代码中调用，例如预算用完时）"""
+        if not self.requested:
+            self.signal_name = name
+            self._requested.set()
+            print(f"\n⏹ 收到 {name}，停止分发新任务，进行中的请求最多再等 {self.grace_period:.0f} 秒"
+                  f"（再按一次 Ctrl+C 立即中止）")
+        elif not self.aborted:
+            self._aborted.set()
+            print(f"\n✗ 再次收到 {name}，取消进行中的请求，只保存已完成的结果")
+            # 之后的信号恢复默认处理，防止保存阶段卡住时无法退出
+            self.uninstall()
+
+    def _on_signal(self, signum: int):
+        self.request(signal.Signals(signum).name)
+
+    def install(self):
+        """在当前事件循环上安装信号处理（必须在协程中调用）"""
+        self._loop = asyncio.get_running_loop()
+        for sig in self.signals:
+            self._previous[sig] = signal.getsignal(sig)
+            try:
+                self._loop.add_signal_handler(sig, self._on_signal, sig)
+            except (NotImplementedError, RuntimeError):
+                # Windows 等不支持 add_signal_handler 的平台
+                signal.signal(sig, lambda signum, frame: self._loop.call_soon_threadsafe(self._on_signal, signum))
+        return self
+
+    def uninstall(self):
+        """恢复安装前的信号处理"""
+        for sig, previous in self._previous.items():
+            try:
+                self._loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+            if previous is not None:
+                signal.signal(sig, previous)
+        self._previous = {}
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, *exc_info):
+        self.uninstall()
+
+    async def gather(self, *aws) -> list:
+        """
+        并发运行任务，直到全部完成；收到信号后最多再等 grace_period 秒，然后取消剩余任务
+
+        Returns:
+            各任务的结果（按顺序），被取消的任务为 None；任务抛出的其他异常会重新抛出
+        """
+        tasks = [asyncio.ensure_future(aw) for aw in aws]
+        if not tasks:
+            return []
+        everything = asyncio.gather(*tasks, return_exceptions=True)
+        stop = asyncio.ensure_future(self._requested.wait())
+        abort = asyncio.ensure_future(self._aborted.wait())
+        try:
+            await asyncio.wait([everything, stop], return_when=asyncio.FIRST_COMPLETED)
+            if not everything.done():
+                running = sum(1 for task in tasks if not task.done())
+                print(f"⏳ 等待 {running} 个进行中的任务...")
+                await asyncio.wait([everything, abort], timeout=self.grace_period, return_when=asyncio.FIRST_COMPLETED)
+                self.completed = running - sum(1 for task in tasks if not task.done())
+        finally:
+            stop.cancel()
+            abort.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    self.cancelled += 1
+            await asyncio.wait(tasks)
+
+        results = []
+        for task in tasks:
+            if task.cancelled():
+                results.append(None)
+            elif task.exception() is not None:
+                raise task.exception()
+            else:
+                results.append(task.result())
+        return results
+
+    def format_summary(self) -> str:
+        line = f"⏹ 因 {self.signal_name} 提前结束: 宽限期内完成 {self.completed} 个进行中的任务"
+        if self.cancelled:
+            line += f"，取消 {self.cancelled} 个"
+        return line
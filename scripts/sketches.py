@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+流式统计草图 - 爬取过程中实时统计分布，内存 O(1)，可序列化、可跨分片合并
+
+    - KLLSketch: 分位数草图（中位数、p99 等），误差约 1/k
+    - HyperLogLog: 去重计数（不同 uid 数）
+    - LiveStats: 在 scrape_single_user 产出每一行时更新的实时统计
+                 （粉丝数分位数、认证占比、私密/空账号占比、去重用户数）
+"""
+
+import base64
+import hashlib
+import json
+import math
+import random
+from pathlib import Path
+
+
+class KLLSketch:
+    """KLL 分位数草图（Karnin, Lang, Liberty 2016）"""
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = None):
+        """
+        Args:
+            k: 最高层压缩器容量，越大越精确（误差约 1/k）
+            c: 相邻层容量衰减系数
+            seed: 压缩时随机选择奇偶位置的种子
+        """
+        self.k = k
+        self.c = c
+        self.compactors = [[]]
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._random = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _size(self) -> int:
+        return sum(len(compactor) for compactor in self.compactors)
+
+    def _compress(self):
+        """从最低层开始，把第一个超出容量的压缩器压缩一半到上一层"""
+        while self._size() >= self._max_size():
+            for level, compactor in enumerate(self.compactors):
+                if len(compactor) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    compactor.sort()
+                    offset = self._random.randint(0, 1)
+                    # 奇数个元素时保留最后一个，其余每两个保留一个，权重翻倍
+                    keep = compactor[-1:] if len(compactor) % 2 else []
+                    self.compactors[level + 1].extend(compactor[offset:len(compactor) - len(keep):2])
+                    self.compactors[level] = keep
+                    break
+
+    def update(self, value: float):
+        self.compactors[0].append(value)
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if self._size() >= self._max_size():
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """合并另一个草图（例如其他分片的统计）"""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        self.count += other.count
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+
+    def quantile(self, q: float) -> float:
+        """近似分位数，q 取值 0-1"""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        weighted = sorted(
+            (value, 1 << level)
+            for level, compactor in enumerate(self.compactors)
+            for value in compactor
+        )
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        cumulative = 0
+        for value, weight in weighted:
+            cumulative += weight
+            if cumulative >= target:
+                return value
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.k,
+            "c": self.c,
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "compactors": self.compactors
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        sketch = cls(k=data["k"], c=data["c"])
+        sketch.count = data["count"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.compactors = [list(compactor) for compactor in data["compactors"]] or [[]]
+        return sketch
+
+
+class HyperLogLog:
+    """HyperLogLog 去重计数，2^p 个寄存器，标准误差约 1.04/sqrt(2^p)"""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = h >> (64 - self.p)
+        remaining = (h << self.p) & ((1 << 64) - 1)
+        rank = 64 - self.p + 1 if remaining == 0 else 64 - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("HyperLogLog 精度不同，无法合并")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # 小基数时使用线性计数修正
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> dict:
+        return {"p": self.p, "registers": base64.b64encode(bytes(self.registers)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HyperLogLog":
+        hll = cls(p=data["p"])
+        hll.registers = bytearray(base64.b64decode(data["registers"]))
+        return hll
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class LiveStats:
+    """爬取过程中的实时统计，每产出一行更新一次"""
+
+    def __init__(self):
+        self.total = 0
+        self.success = 0
+        self.verified = 0
+        self.private = 0
+        self.empty = 0
+        self.followers = KLLSketch()
+        self.distinct_uids = HyperLogLog()
+
+    def update(self, row: dict):
+        """用一行结果（scrape_single_user 的返回值或 CSV 行）更新统计"""
+        self.total += 1
+        if row.get('scrape_status') != 'success':
+            return
+
+        self.success += 1
+        self.followers.update(_to_int(row.get('follower_count')))
+        if row.get('verified') == 'Yes':
+            self.verified += 1
+
+        aweme_count = _to_int(row.get('aweme_count'))
+        if aweme_count == 0:
+            self.empty += 1
+        elif _to_int(row.get('visible_videos_count')) == 0:
+            # 有作品但一个都不可见，视为私密账号
+            self.private += 1
+
+        uid = row.get('uid')
+        if uid:
+            self.distinct_uids.add(str(uid))
+
+    def merge(self, other: "LiveStats"):
+        self.total += other.total
+        self.success += other.success
+        self.verified += other.verified
+        self.private += other.private
+        self.empty += other.empty
+        self.followers.merge(other.followers)
+        self.distinct_uids.merge(other.distinct_uids)
+
+    def summary(self) -> dict:
+        share = (lambda n: n / self.success if self.success else 0.0)
+        return {
+            "total": self.total,
+            "success": self.success,
+            "distinct_uids": self.distinct_uids.count(),
+            "followers_p50": self.followers.quantile(0.5),
+            "followers_p99": self.followers.quantile(0.99),
+            "verified_share": share(self.verified),
+            "private_share": share(self.private),
+            "empty_share": share(self.empty)
+        }
+
+    def format_summary(self) -> str:
+        s = self.summary()
+        if not s["success"]:
+            return f"实时统计: {s['total']} 行，暂无成功记录"
+        return (
+            f"实时统计: 成功 {s['success']:,}/{s['total']:,} | 去重 uid ≈{s['distinct_uids']:,} | "
+            f"粉丝中位数 {s['followers_p50']:,} p99 {s['followers_p99']:,} | "
+            f"认证 {s['verified_share']:.1%} 私密 {s['private_share']:.1%} 空号 {s['empty_share']:.1%}"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "success": self.success,
+            "verified": self.verified,
+            "private": self.private,
+            "empty": self.empty,
+            "followers": self.followers.to_dict(),
+            "distinct_uids": self.distinct_uids.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LiveStats":
+        stats = cls()
+        for key in ("total", "success", "verified", "private", "empty"):
+            setattr(stats, key, data[key])
+        stats.followers = KLLSketch.from_dict(data["followers"])
+        stats.distinct_uids = HyperLogLog.from_dict(data["distinct_uids"])
+        return stats
+
+    def save(self, path):
+        """原子写入（先写临时文件再替换），中断时不会留下损坏的统计文件"""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path) -> "LiveStats":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def stats_path_for(output_csv) -> Path:
+    """输出 CSV 对应的统计文件路径"""
+    output_csv = Path(output_csv)
+    return output_csv.with_name(output_csv.name + ".stats.json")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python3 sketches.py <output.csv.stats.json> [更多分片统计文件...]")
+        sys.exit(1)
+
+    merged = LiveStats.load(sys.argv[1])
+    for stats_file in sys.argv[2:]:
+        merged.merge(LiveStats.load(stats_file))
+    print(merged.format_summary())
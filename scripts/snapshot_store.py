@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+用户资料时间序列快照库 - 每次重新爬取都追加一份计数快照，用于计算增长
+
+目录结构:
+    snapshots/
+        latest.npz                    每个 uid 最新的计数绝对值、首次/最近一次快照时间
+        date=2026-10-19/
+            part-20261019_153000.npz  该日期分区的一批快照（按列存储）
+
+每个分区文件按列存储（uid、ts、first 和各计数列），计数列保存的是相对该 uid 上一次快照的差值
+（首次出现时为绝对值）。因此 (start, end] 时间窗口内的增长 = 窗口内各分区差值之和，
+查询只需读取窗口内分区的 uid/ts 和所需计数列，不需要扫描完整 CSV 或更早的历史。
+
+用法:
+    python3 snapshot_store.py append snapshots output/merged_all_users.csv
+    python3 snapshot_store.py growth snapshots --days 30 --column follower_count --uids uids.txt
+"""
+
+import argparse
+import csv
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from compressed_io import open_text
+from sharded_output import dataset_files
+
+COUNTER_FIELDS = [
+    'follower_count',
+    'following_count',
+    'total_favorited',
+    'aweme_count',
+    'visible_videos_count'
+]
+
+LATEST_FILE = "latest.npz"
+SECONDS_PER_DAY = 86400
+
+
+def _parse_times(values: list) -> np.ndarray:
+    """'YYYY-MM-DD HH:MM:SS' 字符串列表 → epoch 秒（int64）"""
+    # 同一批爬取的时间戳重复度很高，只解析不同的值
+    unique, inverse = np.unique(np.array(values, dtype=np.str_), return_inverse=True)
+    parsed = np.array([v.replace(' ', 'T') for v in unique], dtype='datetime64[s]').astype(np.int64)
+    return parsed[inverse]
+
+
+def _now_ts() -> int:
+    """当前本地时间的 epoch 秒（与 scrape_time 一样按无时区时间解析）"""
+    return int(np.datetime64(datetime.now().strftime('%Y-%m-%dT%H:%M:%S'), 's').astype(np.int64))
+
+
+def _partition_name(day: int) -> str:
+    return "date=" + str(np.datetime64(int(day) * SECONDS_PER_DAY, 's').astype('datetime64[D]'))
+
+
+def _write_npz(path: Path, **columns):
+    """原子写入压缩的列文件"""
+    tmp = path.with_name(path.name + ".tmp.npz")
+    np.savez_compressed(tmp, **columns)
+    tmp.replace(path)
+
+
+def load_rows_from_csv(csv_path: str) -> dict:
+    """读取 CSV（或分片数据集）中成功且有 uid 的行，返回列数组"""
+    uids, times = [], []
+    counters = {field: [] for field in COUNTER_FIELDS}
+
+    for path in dataset_files(csv_path):
+        with open_text(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            uid_index = header.index('uid')
+            time_index = header.index('scrape_time')
+            status_index = header.index('scrape_status')
+            counter_columns = [(counters[field], header.index(field)) for field in COUNTER_FIELDS]
+
+            for row in reader:
+                if row[status_index] != 'success' or not row[uid_index]:
+                    continue
+                uids.append(row[uid_index])
+                times.append(row[time_index])
+                for values, index in counter_columns:
+                    values.append(row[index] or '0')
+
+    return {
+        'uid': np.array(uids, dtype=np.str_).astype(np.uint64) if uids else np.zeros(0, np.uint64),
+        'ts': _parse_times(times) if times else np.zeros(0, np.int64),
+        **{
+            field: np.array(values, dtype=np.str_).astype(np.int64) if values else np.zeros(0, np.int64)
+            for field, values in counters.items()
+        }
+    }
+
+
+class SnapshotStore:
+    """按时间分区、按列存储、差值编码的快照库"""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    def _load_latest(self) -> dict:
+        path = self.store_dir / LATEST_FILE
+        if not path.exists():
+            empty = np.zeros(0, np.int64)
+            return {
+                'uid': np.zeros(0, np.uint64), 'first_ts': empty, 'last_ts': empty,
+                **{field: empty for field in COUNTER_FIELDS}
+            }
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def append(self, rows: dict) -> int:
+        """
+        追加一批快照
+
+        Args:
+            rows: 列数组 {'uid', 'ts', 计数列...}（例如 load_rows_from_csv 的返回值）
+
+        Returns:
+            写入的快照数（时间不晚于已有最新快照的记录会被跳过，重复导入同一份 CSV 不会重复写入）
+        """
+        if rows['uid'].size == 0:
+            return 0
+
+        # 同一批内同一 uid 只保留最新一条
+        order = np.lexsort((rows['ts'], rows['uid']))
+        uid = rows['uid'][order]
+        last_of_uid = np.append(uid[1:] != uid[:-1], True)
+        batch = {key: values[order][last_of_uid] for key, values in rows.items()}
+
+        latest = self._load_latest()
+        if latest['uid'].size:
+            index = np.minimum(np.searchsorted(latest['uid'], batch['uid']), latest['uid'].size - 1)
+            found = latest['uid'][index] == batch['uid']
+        else:
+            index = np.zeros(batch['uid'].size, dtype=np.int64)
+            found = np.zeros(batch['uid'].size, dtype=bool)
+
+        def previous(column, default):
+            """该 uid 上一次快照的值（没有时为 default）"""
+            if not latest['uid'].size:
+                return np.full(index.size, default, dtype=np.int64)
+            return np.where(found, latest[column][index], default)
+
+        newer = batch['ts'] > previous('last_ts', -1)
+        if not newer.any():
+            return 0
+
+        # 差值编码：相对该 uid 上一次快照
+        deltas = {field: (batch[field] - previous(field, 0))[newer] for field in COUNTER_FIELDS}
+        batch = {key: values[newer] for key, values in batch.items()}
+        index, found = index[newer], found[newer]
+
+        # 按日期写入分区
+        days = batch['ts'] // SECONDS_PER_DAY
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        for day in np.unique(days):
+            in_day = days == day
+            partition = self.store_dir / _partition_name(day)
+            partition.mkdir(exist_ok=True)
+            _write_npz(
+                partition / f"part-{stamp}.npz",
+                uid=batch['uid'][in_day],
+                ts=batch['ts'][in_day],
+                first=~found[in_day],
+                **{field: deltas[field][in_day] for field in COUNTER_FIELDS}
+            )
+
+        # 更新最新状态（已有 uid 原地更新，新 uid 合并后重新排序）
+        for field in ['last_ts'] + COUNTER_FIELDS:
+            source = batch['ts'] if field == 'last_ts' else batch[field]
+            latest[field][index[found]] = source[found]
+        new = ~found
+        merged = {
+            'uid': np.concatenate([latest['uid'], batch['uid'][new]]),
+            'first_ts': np.concatenate([latest['first_ts'], batch['ts'][new]]),
+            'last_ts': np.concatenate([latest['last_ts'], batch['ts'][new]]),
+            **{field: np.concatenate([latest[field], batch[field][new]]) for field in COUNTER_FIELDS}
+        }
+        order = np.argsort(merged['uid'], kind='stable')
+        _write_npz(self.store_dir / LATEST_FILE, **{key: values[order] for key, values in merged.items()})
+
+        return int(batch['uid'].size)
+
+    def partitions(self, start_ts: int = None, end_ts: int = None) -> list:
+        """日期范围内的分区文件（按目录名裁剪，不打开范围外的分区）"""
+        files = []
+        first_day = str(np.datetime64(start_ts, 's').astype('datetime64[D]')) if start_ts is not None else None
+        last_day = str(np.datetime64(end_ts, 's').astype('datetime64[D]')) if end_ts is not None else None
+        for partition in sorted(self.store_dir.glob("date=*")):
+            day = partition.name.split("=", 1)[1]
+            if (first_day and day < first_day) or (last_day and day > last_day):
+                continue
+            files.extend(sorted(partition.glob("part-*.npz")))
+        return files
+
+    def read_columns(self, columns: list, start_ts: int = None, end_ts: int = None, uids: np.ndarray = None) -> dict:
+        """
+        读取时间范围 (start_ts, end_ts] 内的快照，只解压需要的列
+
+        Args:
+            columns: 需要的列（uid 和 ts 总是返回）
+            start_ts / end_ts: epoch 秒，None 表示不限
+            uids: 只返回这些 uid（已排序的 uint64 数组）
+        """
+        needed = ['uid', 'ts'] + [c for c in columns if c not in ('uid', 'ts')]
+        parts = {column: [] for column in needed}
+
+        for path in self.partitions(start_ts, end_ts):
+            with np.load(path) as data:
+                ts = data['ts']
+                mask = np.ones(ts.size, dtype=bool)
+                if start_ts is not None:
+                    mask &= ts > start_ts
+                if end_ts is not None:
+                    mask &= ts <= end_ts
+                if uids is not None:
+                    mask &= np.isin(data['uid'], uids, assume_unique=False)
+                if not mask.any():
+                    continue
+                for column in needed:
+                    parts[column].append(ts[mask] if column == 'ts' else data[column][mask])
+
+        return {
+            column: np.concatenate(values) if values else np.zeros(0, np.uint64 if column == 'uid' else np.int64)
+            for column, values in parts.items()
+        }
+
+    def growth(
+        self,
+        days: int = 30,
+        end_ts: int = None,
+        uids=None,
+        column: str = 'follower_count',
+        baseline_only: bool = False
+    ) -> dict:
+        """
+        计算 (end - days, end] 窗口内每个 uid 的计数增长
+
+        窗口内首次出现的 uid 从首次快照开始计算增长（首次快照的绝对值不计入）；
+        baseline_only=True 时只返回窗口开始前已有快照的 uid。
+
+        Returns:
+            {'uid': uint64 数组, 'growth': int64 数组}
+        """
+        end_ts = int(end_ts if end_ts is not None else _now_ts())
+        start_ts = end_ts - days * SECONDS_PER_DAY
+        uids = np.unique(np.asarray(uids, dtype=np.uint64)) if uids is not None else None
+
+        # 只读取最新状态的 uid 和首次快照时间两列
+        with np.load(self.store_dir / LATEST_FILE) as latest:
+            known_uid = latest['uid']
+            first_ts = latest['first_ts']
+        candidates = known_uid[first_ts <= (start_ts if baseline_only else end_ts)]
+        if uids is not None:
+            candidates = candidates[np.isin(candidates, uids)]
+
+        window = self.read_columns([column, 'first'], start_ts, end_ts, candidates)
+        deltas = np.where(window['first'].astype(bool), 0, window[column])
+        result_uid, inverse = np.unique(window['uid'], return_inverse=True)
+        growth = np.bincount(inverse, weights=deltas, minlength=result_uid.size).astype(np.int64)
+
+        # 窗口内没有新快照的 uid 增长为 0
+        unchanged = candidates[~np.isin(candidates, result_uid)]
+        all_uid = np.concatenate([result_uid, unchanged])
+        all_growth = np.concatenate([growth, np.zeros(unchanged.size, np.int64)])
+        order = np.argsort(all_uid)
+        return {'uid': all_uid[order], 'growth': all_growth[order]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户资料时间序列快照库")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("append", help="追加 CSV 中的快照")
+    p.add_argument("store_dir")
+    p.add_argument("csv_files", nargs="+")
+
+    p = subparsers.add_parser("growth", help="计算时间窗口内的增长")
+    p.add_argument("store_dir")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--end", help="窗口结束日期 YYYY-MM-DD（默认现在）")
+    p.add_argument("--column", default="follower_count", choices=COUNTER_FIELDS)
+    p.add_argument("--uids", help="uid 列表文件（每行一个）")
+    p.add_argument("--top", type=int, default=20)
+    p.add_argument("--baseline-only", action="store_true", help="只统计窗口开始前已有快照的用户")
+
+    args = parser.parse_args()
+    store = SnapshotStore(args.store_dir)
+
+    if args.command == "append":
+        for csv_file in args.csv_files:
+            started = time.perf_counter()
+            written = store.append(load_rows_from_csv(csv_file))
+            print(f"✓ {csv_file}: 写入 {written} 条快照（{time.perf_counter() - started:.2f} 秒）")
+
+    elif args.command == "growth":
+        end_ts = None
+        if args.end:
+            end_ts = int(np.datetime64(args.end, 's').astype(np.int64)) + SECONDS_PER_DAY
+        uids = None
+        if args.uids:
+            with open(args.uids, 'r', encoding='utf-8') as f:
+                uids = [int(line) for line in f if line.strip()]
+
+        started = time.perf_counter()
+        result = store.growth(
+            days=args.days,
+            end_ts=end_ts,
+            uids=uids,
+            column=args.column,
+            baseline_only=args.baseline_only
+        )
+        elapsed = time.perf_counter() - started
+
+        print(f"✓ {result['uid'].size:,} 个用户, {args.days} 天 {args.column} 增长（{elapsed:.2f} 秒）")
+        if result['uid'].size:
+            print(f"  总增长: {int(result['growth'].sum()):,}")
+            print(f"  中位数: {float(np.median(result['growth'])):,.0f}")
+            for i in np.argsort(-result['growth'])[:args.top]:
+                print(f"  {result['uid'][i]}: {int(result['growth'][i]):+,}")
+
+
+if __name__ == "__main__":
+    main()
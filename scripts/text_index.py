@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+昵称 / 简介 / 邮箱全文索引 - 倒排索引存放在 SQLite 中，查询毫秒级返回
+
+分词（Unicode 感知）:
+    - NFKC 规范化 + casefold，按 \\w+ 切词
+    - 带声调的越南语等拉丁字母词额外索引去掉声调的形式（phương → phuong，đ → d）
+    - 中日韩文字按二元组切分，每个字也单独索引（查询单个字时使用，多字查询只用二元组）
+    - 邮箱索引完整地址和域名（someone@gmail.com、gmail.com），简介中的 @handle 保留 @ 前缀
+
+存储:
+    docs      每个用户一行（更新时旧行标记删除）
+    postings  (词, 段) → 文档 ID 列表（升序、差值 + varint 编码的 BLOB）
+    sources   已索引的 CSV 及读取到的字节位置
+每次 add 只索引 CSV 新增的部分并写入一个新段；段过多时运行 optimize 合并。
+.csv.gz / .csv.zst 同样支持（偏移按解压后的字节计算，需要从头解压到上次的位置）；
+分片数据集目录按分片文件分别记录索引位置。
+
+用法:
+    python3 text_index.py add index.db output/nova01_users.csv [更多 CSV...]
+    python3 text_index.py query index.db "gmail.com shop" [--limit 20]
+    python3 text_index.py optimize index.db
+"""
+
+import argparse
+import csv
+import hashlib
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+from compressed_io import open_binary
+from sharded_output import dataset_files, is_dataset
+
+INDEXED_FIELDS = ['nickname', 'signature', 'bio_email']
+
+# 每多少行写入一个段
+SEGMENT_ROWS = 100000
+
+# 判断源文件是否被重写时比较的前缀长度
+FINGERPRINT_BYTES = 65536
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+EMAIL_RE = re.compile(r'[\w.+-]+@([\w-]+(?:\.[\w-]+)+)', re.UNICODE)
+HANDLE_RE = re.compile(r'(?<![\w.])@([\w.]{2,30})', re.UNICODE)
+
+
+def _is_cjk(char: str) -> bool:
+    code = ord(char)
+    return (
+        0x3040 <= code <= 0x30FF or      # 日文假名
+        0x3400 <= code <= 0x4DBF or      # 扩展 A
+        0x4E00 <= code <= 0x9FFF or      # 中日韩统一表意文字
+        0xAC00 <= code <= 0xD7AF or      # 韩文音节
+        0xF900 <= code <= 0xFAFF
+    )
+
+
+def strip_accents(word: str) -> str:
+    """去掉声调和附加符号（越南语 đ 单独处理，它不是组合字符）"""
+    decomposed = unicodedata.normalize('NFD', word.replace('đ', 'd'))
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _word_tokens(word: str, unigrams: bool = True):
+    """
+    单个词的词元: CJK 连续段切为二元组，其余部分整体作为一个词
+
+    Args:
+        unigrams: CJK 的每个字是否也作为词元（建索引时为 True；查询时为 False，只有单字时才用单字）
+    """
+    run = []
+    rest = []
+
+    def flush_cjk():
+        if unigrams or len(run) == 1:
+            yield from run
+        for i in range(len(run) - 1):
+            yield run[i] + run[i + 1]
+        run.clear()
+
+    for char in word:
+        if _is_cjk(char):
+            if rest:
+                yield ''.join(rest)
+                rest.clear()
+            run.append(char)
+        else:
+            if run:
+                yield from flush_cjk()
+            rest.append(char)
+    if run:
+        yield from flush_cjk()
+    if rest:
+        yield ''.join(rest)
+
+
+def tokenize(text: str, variants: bool = True) -> list:
+    """
+    文本 → 词元列表（去重，保持首次出现的顺序）
+
+    Args:
+        variants: 是否加入去声调形式和 CJK 单字（建索引时为 True，查询时为 False：
+                  查询不带声调的词会匹配到文档的去声调形式，多字查询只需要二元组）
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKC', text).casefold()
+    tokens = {}
+
+    for match in EMAIL_RE.finditer(text):
+        tokens[match.group(0)] = None
+        tokens[match.group(1)] = None
+    for match in HANDLE_RE.finditer(text):
+        tokens['@' + match.group(1).rstrip('.')] = None
+
+    for word in WORD_RE.findall(text):
+        for token in _word_tokens(word, unigrams=variants):
+            tokens[token] = None
+            if variants:
+                stripped = strip_accents(token)
+                if stripped != token:
+                    tokens[stripped] = None
+
+    return list(tokens)
+
+
+def encode_postings(doc_ids: list) -> bytes:
+    """升序文档 ID → 差值 varint 编码"""
+    out = bytearray()
+    previous = 0
+    for doc_id in doc_ids:
+        delta = doc_id - previous
+        previous = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> list:
+    doc_ids = []
+    current = shift = value = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        current += value
+        doc_ids.append(current)
+        value = shift = 0
+    return doc_ids
+
+
+def _skip_to(f, position: int):
+    """向前跳到 position（zstd 解压流不支持 seek，读取并丢弃）"""
+    if f.seekable():
+        f.seek(position)
+        return
+    while f.tell() < position:
+        if not f.read(min(position - f.tell(), 1 << 20)):
+            break
+
+
+class TextIndex:
+    """SQLite 倒排索引"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                doc_id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                username TEXT,
+                unique_id TEXT,
+                nickname TEXT,
+                follower_count INTEGER,
+                bio_email TEXT,
+                signature TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS docs_key ON docs (key) WHERE deleted = 0;
+            CREATE TABLE IF NOT EXISTS postings (
+                token TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (token, segment)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                header TEXT NOT NULL,
+                fingerprint TEXT NOT NULL
+            );
+        """)
+
+    def _next_segment(self) -> int:
+        row = self.conn.execute("SELECT MAX(segment) FROM postings").fetchone()
+        return (row[0] or 0) + 1
+
+    def _write_segment(self, rows: list):
+        """把一批行写入新段（单个事务）"""
+        segment = self._next_segment()
+        postings = {}
+        with self.conn:
+            for row in rows:
+                key = row.get('uid') or row.get('username', '').lower()
+                # 同一用户重新索引时，旧文档标记删除，查询时过滤
+                self.conn.execute("UPDATE docs SET deleted = 1 WHERE key = ? AND deleted = 0", (key,))
+                cursor = self.conn.execute(
+                    "INSERT INTO docs (key, username, unique_id, nickname, follower_count, bio_email, signature) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key, row.get('username', ''), row.get('unique_id', ''), row.get('nickname', ''),
+                        int(row.get('follower_count') or 0), row.get('bio_email', ''), row.get('signature', '')
+                    )
+                )
+                doc_id = cursor.lastrowid
+                for field in INDEXED_FIELDS:
+                    for token in tokenize(row.get(field, '')):
+                        doc_ids = postings.setdefault(token, [])
+                        if not doc_ids or doc_ids[-1] != doc_id:
+                            doc_ids.append(doc_id)
+            self.conn.executemany(
+                "INSERT INTO postings (token, segment, data) VALUES (?, ?, ?)",
+                ((token, segment, encode_postings(doc_ids)) for token, doc_ids in postings.items())
+            )
+
+    def _resume_offset(self, csv_path: str, source: tuple) -> int:
+        """上次索引到的偏移；源文件被重写（变短或已索引部分的前缀变化）时返回 0"""
+        offset, _, fingerprint = source
+        with open_binary(csv_path) as f:
+            prefix = f.read(min(offset, FINGERPRINT_BYTES))
+            if hashlib.sha1(prefix).hexdigest() != fingerprint:
+                return 0
+            if offset > len(prefix):
+                # 压缩流不能向后 seek，只向前跳到偏移前一个字节
+                _skip_to(f, offset - 1)
+                prefix = f.read(1)
+        # 偏移处必须仍是一条记录的结尾
+        return offset if prefix.endswith(b'\n') else 0
+
+    def add_csv(self, csv_path: str, segment_rows: int = SEGMENT_ROWS) -> int:
+        """
+        增量索引一个 CSV: 只读取上次索引位置之后新增的行
+
+        源文件被重写（变短或已索引部分的内容变化）时从头重新索引，旧文档会被新文档替换。
+        csv_path 为分片数据集目录时依次索引 manifest 中的各个分片。
+
+        Returns:
+            新索引的行数
+        """
+        if is_dataset(csv_path):
+            return sum(self.add_csv(str(part), segment_rows) for part in dataset_files(csv_path))
+
+        path = str(Path(csv_path).resolve())
+        source = self.conn.execute(
+            "SELECT offset, header, fingerprint FROM sources WHERE path = ?", (path,)
+        ).fetchone()
+
+        indexed = 0
+        with open_binary(csv_path) as f:
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode('utf-8-sig')]))
+            start = f.tell()
+            if source and source[1] == ','.join(header):
+                start = max(start, self._resume_offset(csv_path, source))
+                _skip_to(f, start)
+
+            batch = []
+            offset = start
+            record = b''
+            while True:
+                line = f.readline()
+                if not line or not line.endswith(b'\n'):
+                    # 正在写入的最后一条记录不完整，下次再读
+                    break
+                record += line
+                if record.count(b'"') % 2:
+                    # 引号内的换行（例如多行简介），记录还没有结束
+                    continue
+                offset += len(record)
+                values = next(csv.reader([record.decode('utf-8')]), None)
+                record = b''
+                if not values:
+                    continue
+                row = dict(zip(header, values))
+                if row.get('scrape_status') == 'success':
+                    batch.append(row)
+                if len(batch) >= segment_rows:
+                    self._write_segment(batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                self._write_segment(batch)
+                indexed += len(batch)
+
+        with open_binary(csv_path) as f:
+            fingerprint = hashlib.sha1(f.read(min(offset, FINGERPRINT_BYTES))).hexdigest()
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources (path, offset, header, fingerprint) VALUES (?, ?, ?, ?)",
+                (path, offset, ','.join(header), fingerprint)
+            )
+        return indexed
+
+    def _doc_ids(self, token: str) -> set:
+        doc_ids = set()
+        for (data,) in self.conn.execute("SELECT data FROM postings WHERE token = ?", (token,)):
+            doc_ids.update(decode_postings(data))
+        return doc_ids
+
+    def search(self, query: str, limit: int = 20) -> tuple:
+        """
+        查询: 所有词都要匹配（AND），结果按索引时间从新到旧排列
+
+        Returns:
+            (匹配总数, [{'username', 'unique_id', 'nickname', 'follower_count', 'bio_email', 'signature'}])
+            匹配总数包含已被更新替换的旧文档，只是近似值
+        """
+        tokens = tokenize(query, variants=False)
+        if not tokens:
+            return 0, []
+
+        # 先取最短的倒排列表，再依次求交集
+        postings = sorted((self._doc_ids(token) for token in tokens), key=len)
+        matched = postings[0]
+        for doc_ids in postings[1:]:
+            if not matched:
+                break
+            matched &= doc_ids
+
+        # 只读取需要返回的文档（跳过已删除的旧文档）
+        results = []
+        candidates = sorted(matched, reverse=True)
+        for start in range(0, len(candidates), limit * 2):
+            chunk = candidates[start:start + limit * 2]
+            cursor = self.conn.execute(
+                "SELECT username, unique_id, nickname, follower_count, bio_email, signature FROM docs "
+                f"WHERE deleted = 0 AND doc_id IN ({','.join('?' * len(chunk))}) ORDER BY doc_id DESC",
+                chunk
+            )
+            columns = [d[0] for d in cursor.description]
+            results.extend(dict(zip(columns, row)) for row in cursor)
+            if len(results) >= limit:
+                break
+        return len(matched), results[:limit]
+
+    def optimize(self):
+        """合并所有段并清理已删除的文档"""
+        with self.conn:
+            deleted = {doc_id for (doc_id,) in self.conn.execute("SELECT doc_id FROM docs WHERE deleted = 1")}
+            tokens = [token for (token,) in self.conn.execute(
+                "SELECT token FROM postings GROUP BY token HAVING COUNT(*) > 1 OR ?", (bool(deleted),)
+            )]
+            for token in tokens:
+                doc_ids = sorted(self._doc_ids(token) - deleted)
+                self.conn.execute("DELETE FROM postings WHERE token = ?", (token,))
+                if doc_ids:
+                    self.conn.execute(
+                        "INSERT INTO postings (token, segment, data) VALUES (?, 0, ?)",
+                        (token, encode_postings(doc_ids))
+                    )
+            self.conn.execute("DELETE FROM docs WHERE deleted = 1")
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="昵称 / 简介 / 邮箱全文索引")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help="增量索引 CSV")
+    add_parser.add_argument('db')
+    add_parser.add_argument('csv_files', nargs='+')
+
+    query_parser = subparsers.add_parser('query', help="查询")
+    query_parser.add_argument('db')
+    query_parser.add_argument('query')
+    query_parser.add_argument('--limit', type=int, default=20)
+
+    optimize_parser = subparsers.add_parser('optimize', help="合并段、清理已删除文档")
+    optimize_parser.add_argument('db')
+
+    args = parser.parse_args()
+    index = TextIndex(args.db)
+
+    if args.command == 'add':
+        for csv_file in args.csv_files:
+            started = time.perf_counter()
+            count = index.add_csv(csv_file)
+            print(f"✓ {csv_file}: 新索引 {count:,} 行（{time.perf_counter() - started:.1f} 秒）")
+
+    elif args.command == 'query':
+        started = time.perf_counter()
+        total, results = index.search(args.query, args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        writer = csv.writer(sys.stdout)
+        writer.writerow(['username', 'nickname', 'follower_count', 'bio_email', 'signature'])
+        for row in results:
+            writer.writerow([row['username'], row['nickname'], row['follower_count'], row['bio_email'], row['signature']])
+        print(f"共 {total:,} 个匹配，显示 {len(results)} 个（{elapsed:.1f} ms）", file=sys.stderr)
+
+    else:
+        index.optimize()
+        print("✓ 索引已合并")
+
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
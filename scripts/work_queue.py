@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+基于租约的工作队列 - 多台机器共同消费同一个用户列表
+
+语义:
+    - lease(): 领取一批待处理用户，租约在 visibility_timeout 秒后过期
+    - heartbeat(): 处理中定期续约，防止长时间请求被其他 worker 重复领取
+    - ack(): 提交结果，用户标记为完成
+    - nack(): 处理失败，重新入队（超过最大尝试次数后标记为失败）
+    - 租约过期未续约的用户会自动重新入队（worker 崩溃时不会丢失用户）
+
+SQLiteWorkQueue 使用单个 SQLite 文件作为后端，可放在共享文件系统上供多台机器使用，
+也可作为本地替身，替换成真正的消息队列时只需实现相同接口。
+"""
+
+import json
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+
+
+class WorkQueue(ABC):
+    """工作队列接口"""
+
+    @abstractmethod
+    def enqueue(self, keys) -> int:
+        """添加用户（已存在的用户会被忽略），返回新增数量"""
+
+    @abstractmethod
+    def lease(self, worker_id: str, batch_size: int, visibility_timeout: float) -> list:
+        """领取最多 batch_size 个待处理用户"""
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, keys, visibility_timeout: float) -> int:
+        """为仍在处理的用户续约，返回续约成功的数量"""
+
+    @abstractmethod
+    def ack(self, worker_id: str, key: str, result: dict) -> bool:
+        """提交结果；租约已被其他 worker 接管时返回 False"""
+
+    @abstractmethod
+    def nack(self, worker_id: str, key: str, error: str, result: dict = None) -> bool:
+        """处理失败，重新入队或标记为最终失败"""
+
+    @abstractmethod
+    def requeue_expired(self) -> int:
+        """把租约过期的用户重新入队，返回重新入队的数量"""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """各状态的用户数"""
+
+    @abstractmethod
+    def results(self):
+        """遍历已完成和最终失败用户的结果"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """SQLite 文件后端的工作队列"""
+
+    def __init__(self, db_path: str, max_attempts: int = 3, timeout: float = 30.0):
+        """
+        Args:
+            db_path: SQLite 文件路径（可位于共享文件系统）
+            max_attempts: 每个用户最多尝试次数
+            timeout: 等待数据库锁的超时时间（秒）
+        """
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        # 手动管理事务，领取时使用 BEGIN IMMEDIATE 保证同一用户只会被一个 worker 领取
+        self.conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                key TEXT PRIMARY KEY COLLATE NOCASE,
+                state TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                updated REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_items_state ON items (state, lease_expires);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self, sql_fn):
+        """在写事务中执行 sql_fn(conn)"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = sql_fn(self.conn)
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return result
+
+    def enqueue(self, keys) -> int:
+        now = time.time()
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (key, updated) VALUES (?, ?)",
+                ((key, now) for key in keys)
+            )
+            return conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def _requeue_expired(self, conn, now: float) -> int:
+        return conn.execute(
+            "UPDATE items SET state = 'pending', owner = NULL, updated = ? "
+            "WHERE state = 'leased' AND lease_expires < ?",
+            (now, now)
+        ).rowcount
+
+    def requeue_expired(self) -> int:
+        now = time.time()
+        return self._transaction(lambda conn: self._requeue_expired(conn, now))
+
+    def lease(self, worker_id: str, batch_size: int, visibility_timeout: float) -> list:
+        now = time.time()
+
+        def claim(conn):
+            self._requeue_expired(conn, now)
+            keys = [row[0] for row in conn.execute(
+                "SELECT key FROM items WHERE state = 'pending' ORDER BY rowid LIMIT ?",
+                (batch_size,)
+            )]
+            conn.executemany(
+                "UPDATE items SET state = 'leased', owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE key = ?",
+                ((worker_id, now + visibility_timeout, now, key) for key in keys)
+            )
+            return keys
+
+        return self._transaction(claim)
+
+    def heartbeat(self, worker_id: str, keys, visibility_timeout: float) -> int:
+        now = time.time()
+
+        def extend(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE items SET lease_expires = ?, updated = ? "
+                "WHERE key = ? AND owner = ? AND state = 'leased'",
+                ((now + visibility_timeout, now, key, worker_id) for key in keys)
+            )
+            return conn.total_changes - before
+
+        return self._transaction(extend)
+
+    def ack(self, worker_id: str, key: str, result: dict) -> bool:
+        now = time.time()
+        # 租约过期但尚未被其他 worker 领取时，结果仍然有效
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE items SET state = 'done', result = ?, error = NULL, owner = ?, updated = ? "
+            "WHERE key = ? AND ((state = 'leased' AND owner = ?) OR state = 'pending')",
+            (json.dumps(result, ensure_ascii=False), worker_id, now, key, worker_id)
+        ).rowcount == 1)
+
+    def nack(self, worker_id: str, key: str, error: str, result: dict = None) -> bool:
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE items SET "
+            "state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "owner = NULL, error = ?, result = ?, updated = ? "
+            "WHERE key = ? AND state = 'leased' AND owner = ?",
+            (
+                self.max_attempts, error,
+                json.dumps(result, ensure_ascii=False) if result else None,
+                now, key, worker_id
+            )
+        ).rowcount == 1)
+
+    def stats(self) -> dict:
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for state, count in self.conn.execute("SELECT state, COUNT(*) FROM items GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def results(self):
+        for key, result in self.conn.execute(
+            "SELECT key, result FROM items WHERE state IN ('done', 'failed') ORDER BY rowid"
+        ):
+            yield json.loads(result) if result else {
+                'username': key,
+                'scrape_status': 'failed',
+                'error_message': 'No result'
+            }
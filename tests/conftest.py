@@ -0,0 +1,52 @@
+"""
+测试公共设置: scripts/ 中的模块使用平铺导入，这里把 scripts/ 加入 sys.path
+
+网络相关的测试都离线运行: 先用 RecordingTransport 包装 httpx.MockTransport 录制一份 cassette，
+再用 ReplayTransport 回放给被测代码。
+"""
+
+import asyncio
+import sys
+import zlib
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+
+from cassette import RecordingTransport  # noqa: E402
+
+PROFILE_PATH = '/api/v1/tiktok/app/v3/handler_user_profile'
+
+
+def profile_body(username: str, uid: str = None, **user) -> dict:
+    """handler_user_profile 的成功响应"""
+    user = {'unique_id': username, 'uid': uid or str(zlib.crc32(username.encode('utf-8'))), 'follower_count': 0, **user}
+    return {'code': 200, 'data': {'user': user}}
+
+
+@pytest.fixture
+def record_cassette(tmp_path):
+    """
+    录制 cassette: record_cassette(handler, requests, delay=0.0) → cassette 路径
+
+    handler(request) 返回 httpx.Response（同 httpx.MockTransport），requests 为 [(路径, 查询参数)]，
+    delay 为每个请求的模拟耗时（回放时按 speed 缩放）。
+    """
+    def record(handler, requests: list, delay: float = 0.0, name: str = 'cassette.jsonl.gz') -> Path:
+        async def delayed(request):
+            if delay:
+                await asyncio.sleep(delay)
+            return handler(request)
+
+        async def main():
+            transport = RecordingTransport(tmp_path / name, inner=httpx.MockTransport(delayed))
+            async with httpx.AsyncClient(transport=transport, base_url='https://api.tikhub.io') as client:
+                for path, params in requests:
+                    await client.get(path, params=params, headers={'Authorization': 'Bearer secret'})
+
+        asyncio.run(main())
+        return tmp_path / name
+
+    return record
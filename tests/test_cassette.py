@@ -0,0 +1,46 @@
+import asyncio
+
+import httpx
+
+from cassette import ReplayTransport, load_cassette
+from conftest import PROFILE_PATH, profile_body
+
+
+def handler(request):
+    username = request.url.params['unique_id']
+    if username == 'missing':
+        return httpx.Response(404, json={'code': 404, 'message': 'user not found'})
+    return httpx.Response(200, json=profile_body(username, uid='1'))
+
+
+def test_record_then_replay(record_cassette):
+    path = record_cassette(handler, [
+        (PROFILE_PATH, {'unique_id': 'alice'}),
+        (PROFILE_PATH, {'unique_id': 'missing'})
+    ])
+    entries = load_cassette(path)
+    assert [entry['q']['unique_id'] for entry in entries] == ['alice', 'missing']
+    # Authorization 头不会写入 cassette
+    assert 'secret' not in path.read_bytes().decode('latin-1')
+
+    async def replay():
+        transport = ReplayTransport(path, speed=None, strict=True)
+        async with httpx.AsyncClient(transport=transport, base_url='https://api.tikhub.io') as client:
+            found = await client.get(PROFILE_PATH, params={'unique_id': 'alice'})
+            missing = await client.get(PROFILE_PATH, params={'unique_id': 'missing'})
+            unknown = await client.get(PROFILE_PATH, params={'unique_id': 'bob'})
+        return found, missing, unknown, transport
+
+    found, missing, unknown, transport = asyncio.run(replay())
+    assert found.json()['data']['user']['unique_id'] == 'alice'
+    assert missing.status_code == 404
+    assert unknown.status_code == 404 and transport.misses == 1
+    assert transport.served == 2
+
+
+def test_recording_flushes_in_batches(record_cassette, monkeypatch):
+    import cassette
+
+    monkeypatch.setattr(cassette, 'FLUSH_EVERY', 3)
+    path = record_cassette(handler, [(PROFILE_PATH, {'unique_id': f'user{i}'}) for i in range(10)])
+    assert [entry['q']['unique_id'] for entry in load_cassette(path)] == [f'user{i}' for i in range(10)]
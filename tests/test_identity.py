@@ -0,0 +1,57 @@
+from identity import IdentityIndex, identity_keys
+
+
+def test_identity_keys_share_handle_namespace():
+    assert identity_keys('1', 'MS4x', 'Alice', '@alice') == ['uid:1', 'sec:MS4x', 'handle:alice']
+    assert identity_keys(username='bob') == ['handle:bob']
+
+
+def test_rename_joins_entity(tmp_path):
+    index = IdentityIndex(str(tmp_path / 'identity.db'))
+    # 第一次爬取: alice；改名后 username 仍是旧名，unique_id 是新名
+    index.add(uid='1', unique_id='alice', username='alice')
+    index.add(uid='1', unique_id='alice_new', username='alice')
+    assert index.entity_of(username='alice_new') == 'uid:1'
+    assert index.entity_of(unique_id='ALICE') == 'uid:1'
+    index.close()
+
+    # 重新打开后从数据库读取
+    index = IdentityIndex(str(tmp_path / 'identity.db'))
+    assert index.entity_of(username='alice_new') == 'uid:1'
+    index.close()
+
+
+def test_reused_handle_does_not_merge_different_uids(tmp_path):
+    index = IdentityIndex(str(tmp_path / 'identity.db'))
+    index.add(uid='1', unique_id='shop')
+    # 旧账号改名后，另一个账号注册了 shop
+    index.add(uid='1', unique_id='shop_old', username='shop')
+    index.add(uid='2', unique_id='shop', username='shop')
+    assert index.conflicts >= 1
+    assert index.entity_of(uid='1') == 'uid:1'
+    assert index.entity_of(uid='2') == 'uid:2'
+    assert index.entity_of(username='shop_old') == 'uid:1'
+    index.close()
+
+
+def test_cluster_without_uid_gains_uid_on_union(tmp_path):
+    index = IdentityIndex(str(tmp_path / 'identity.db'), cache_limit=2)
+    index.add(unique_id='carol', username='carol_list')
+    assert index.entity_of(username='carol_list').startswith('handle:')
+    index.add(uid='3', unique_id='carol')
+    assert index.entity_of(username='carol_list') == 'uid:3'
+    index.close()
+
+
+def test_read_only_index_is_not_modified(tmp_path):
+    db = tmp_path / 'identity.db'
+    index = IdentityIndex(str(db))
+    index.add(uid='1', unique_id='alice')
+    index.close()
+    before = db.read_bytes()
+
+    reader = IdentityIndex(str(db), read_only=True)
+    assert reader.entity_of(unique_id='alice') == 'uid:1'
+    assert reader.entity_of(unique_id='nobody') == 'handle:nobody'
+    reader.close()
+    assert db.read_bytes() == before
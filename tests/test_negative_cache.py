@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import negative_cache
+from cassette import ReplayTransport
+from conftest import PROFILE_PATH, profile_body
+from negative_cache import CLASS_TTL, SECONDS_PER_DAY, NegativeCache, classify_failure
+from scrape_user_tikhub import TikHubUserScraper
+
+
+@pytest.mark.parametrize('status, message, expected', [
+    (200, 'User not found', 'not_found'),
+    (400, "This account doesn't exist", 'not_found'),
+    (200, '该账号已注销', 'not_found'),
+    (200, 'Account banned for violating guidelines', 'banned'),
+    (200, 'This account is private', 'private'),
+    # 暂时性错误和无法识别的错误不记录
+    (429, 'user not found', None),
+    (503, 'account banned', None),
+    (403, 'private', None),
+    (400, 'invalid parameter', None),
+    (200, '', None),
+])
+def test_classify_failure(status, message, expected):
+    assert classify_failure(status, None, message) == expected
+
+
+def test_class_ttl(tmp_path, monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(negative_cache.time, 'time', lambda: now[0])
+    cache = NegativeCache(str(tmp_path / 'dead.db'))
+    cache.record('@Gone', 'not_found', 'user not found')
+    cache.record('locked', 'private', 'private account')
+    assert cache.lookup('gone') == 'not_found' and 'LOCKED' in cache
+
+    now[0] += CLASS_TTL['private'] + 1
+    assert cache.lookup('locked') is None and cache.lookup('gone') == 'not_found'
+    now[0] += 30 * SECONDS_PER_DAY
+    assert len(cache) == 0
+    assert cache.purge() == 2
+    cache.close()
+
+
+def test_discard_only_deletes_existing_records_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(negative_cache, 'DISCARD_BATCH', 2)
+    db = str(tmp_path / 'dead.db')
+    writer = NegativeCache(db)
+    cache = NegativeCache(db)
+    # 另一个进程在本进程打开之后写入的记录
+    writer.record('other', 'banned', 'banned')
+    writer.close()
+    cache.record('a', 'banned', 'banned')
+    cache.record('b', 'not_found', 'not found')
+
+    cache.discard('never_failed')
+    cache.discard('a')
+    assert cache._pending_discards == {'a'}
+    # 又失败的账号不会被等待中的删除移除
+    cache.record('a', 'private', 'private')
+    cache.discard('other')
+    cache.close()
+
+    reopened = NegativeCache(db)
+    assert sorted(entry[0] for entry in reopened.entries()) == ['a', 'b']
+    reopened.close()
+
+
+def test_scraper_skips_cached_dead_accounts(tmp_path, record_cassette):
+    def handler(request):
+        username = request.url.params['unique_id']
+        if username == 'gone':
+            return httpx.Response(400, json={'code': 400, 'message': 'User not found'})
+        if username == 'flaky':
+            return httpx.Response(500, text='upstream error')
+        return httpx.Response(200, json=profile_body(username))
+
+    cassette_path = record_cassette(
+        handler, [(PROFILE_PATH, {'unique_id': name, 'sec_user_id': '', 'user_id': ''}) for name in ('gone', 'flaky', 'alice')]
+    )
+    db = str(tmp_path / 'dead.db')
+
+    async def run(usernames):
+        transport = ReplayTransport(cassette_path, speed=None, strict=True)
+        scraper = TikHubUserScraper(api_token='replay', transport=transport, negative_cache=db)
+        for username in usernames:
+            await scraper.fetch_user_profile(unique_id=username)
+        await scraper.aclose()
+        return transport.served, scraper.skipped
+
+    assert asyncio.run(run(['gone', 'flaky', 'alice'])) == (3, 0)
+    # 第二次运行: 不存在的账号跳过，暂时性错误照常请求
+    assert asyncio.run(run(['gone', 'flaky'])) == (1, 1)
+
+    cache = NegativeCache(db)
+    assert [entry[0] for entry in cache.entries()] == ['gone']
+    assert cache.entries()[0][4] > time.time() + CLASS_TTL['not_found'] - 60
+    cache.close()
@@ -0,0 +1,90 @@
+import json
+
+from query_users import Predicate
+from sharded_output import (
+    dataset_files, hash_partition, load_manifest, read_dataset, select_shards, verify, write_dataset
+)
+from text_index import TextIndex
+
+
+def make_rows(count: int) -> list:
+    return [
+        {
+            'username': f'user{i}',
+            'uid': str(1000 + i),
+            'nickname': f'nick{i}',
+            'follower_count': i * 100,
+            'scrape_status': 'success' if i % 5 else 'failed',
+            'scrape_time': f'2026-{1 + i % 3:02d}-15 12:00:00'
+        }
+        for i in range(count)
+    ]
+
+
+def selected(path, *conditions) -> tuple:
+    files, skipped = select_shards(path, [Predicate.parse(text) for text in conditions])
+    return [file.name for file in files], skipped
+
+
+def test_hash_partitioned_dataset(tmp_path):
+    rows = make_rows(60)
+    manifest = write_dataset(rows, tmp_path / 'ds', parts=8)
+    assert manifest['rows'] == 60
+    assert sorted(row.username for row in read_dataset(tmp_path / 'ds', workers=1)) == sorted(r['username'] for r in rows)
+    assert verify(tmp_path / 'ds')
+
+    # 用户名等值条件只读取对应的哈希分区
+    files, skipped = selected(tmp_path / 'ds', 'username=user7')
+    assert files == [f"part-{hash_partition('user7', 8):02d}.csv"]
+    assert skipped == len(manifest['shards']) - 1
+
+
+def test_time_partitions_pruned_by_ranges(tmp_path):
+    write_dataset(make_rows(30), tmp_path / 'ds', by='month')
+    shards = {shard['file']: shard for shard in load_manifest(tmp_path / 'ds')['shards']}
+    assert set(shards) == {'part-2026-01.csv', 'part-2026-02.csv', 'part-2026-03.csv'}
+
+    # 1 月分区的粉丝数是 0, 300, ... 2700，其余分区的最大值更大
+    assert selected(tmp_path / 'ds', 'follower_count>2750') == (['part-2026-02.csv', 'part-2026-03.csv'], 1)
+    assert selected(tmp_path / 'ds', 'follower_count<0') == ([], 3)
+    # 无法按范围判断的条件不跳过分片
+    assert selected(tmp_path / 'ds', 'nickname~nick')[1] == 0
+
+
+def test_shards_without_success_skipped(tmp_path):
+    rows = [dict(row, scrape_status='failed') for row in make_rows(10)]
+    rows[3]['scrape_status'] = 'success'
+    write_dataset(rows, tmp_path / 'ds', parts=4)
+    files, _ = selected(tmp_path / 'ds', 'scrape_status=success')
+    assert files == [f"part-{hash_partition('user3', 4):02d}.csv"]
+
+
+def test_verify_detects_modified_shard(tmp_path, capsys):
+    write_dataset(make_rows(20), tmp_path / 'ds', parts=2)
+    shard = dataset_files(tmp_path / 'ds')[0]
+    shard.write_text(shard.read_text(encoding='utf-8-sig') + 'extra,row\n', encoding='utf-8-sig')
+    assert not verify(tmp_path / 'ds')
+    assert '✗' in capsys.readouterr().out
+
+
+def test_manifest_schema_version_checked(tmp_path):
+    write_dataset(make_rows(5), tmp_path / 'ds', parts=2)
+    manifest_path = tmp_path / 'ds' / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    manifest['schema_version'] += 1
+    manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+    try:
+        load_manifest(tmp_path / 'ds')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("newer schema version should be rejected")
+
+
+def test_text_index_reads_every_shard(tmp_path):
+    write_dataset(make_rows(40), tmp_path / 'ds', parts=4)
+    index = TextIndex(str(tmp_path / 'index.db'))
+    assert index.add_csv(str(tmp_path / 'ds')) == 32
+    assert index.add_csv(str(tmp_path / 'ds')) == 0
+    assert index.search('nick7')[1][0]['username'] == 'user7'
+    index.close()
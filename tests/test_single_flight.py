@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+
+from cassette import ReplayTransport
+from conftest import PROFILE_PATH, profile_body
+from scrape_user_tikhub import TikHubUserScraper
+
+
+@pytest.fixture
+def slow_cassette(record_cassette):
+    """alice / bob 的资料响应，回放时每个请求约 0.2 秒"""
+    return record_cassette(
+        lambda request: httpx.Response(200, json=profile_body(request.url.params['unique_id'], uid='1')),
+        [(PROFILE_PATH, {'unique_id': name, 'sec_user_id': '', 'user_id': ''}) for name in ('alice', 'bob')],
+        delay=0.2
+    )
+
+
+def run_with_scraper(cassette_path, body):
+    """在回放传输层上运行 body(scraper, transport)"""
+    async def main():
+        transport = ReplayTransport(cassette_path, speed=1, strict=True)
+        scraper = TikHubUserScraper(api_token='replay', transport=transport)
+        try:
+            return await body(scraper, transport)
+        finally:
+            await scraper.aclose()
+
+    return asyncio.run(main())
+
+
+def test_duplicate_lookups_share_one_request(slow_cassette):
+    async def body(scraper, transport):
+        results = await asyncio.gather(
+            scraper.fetch_user_profile(unique_id='alice'),
+            scraper.fetch_user_profile(unique_id='ALICE'),
+            scraper.fetch_user_profile(unique_id='bob')
+        )
+        return results, transport.served, scraper.coalesced
+
+    (alice, alice_again, bob), served, coalesced = run_with_scraper(slow_cassette, body)
+    assert alice is alice_again and alice['data']['user']['unique_id'] == 'alice'
+    assert bob['data']['user']['unique_id'] == 'bob'
+    assert served == 2 and coalesced == 1
+
+
+def test_cancelled_waiter_does_not_cancel_shared_request(slow_cassette):
+    async def body(scraper, transport):
+        first = asyncio.ensure_future(scraper.fetch_user_profile(unique_id='alice'))
+        second = asyncio.ensure_future(scraper.fetch_user_profile(unique_id='alice'))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        result = await second
+        return first.cancelled(), result, transport.served
+
+    cancelled, result, served = run_with_scraper(slow_cassette, body)
+    assert cancelled
+    assert result['data']['user']['unique_id'] == 'alice'
+    assert served == 1
+
+
+def test_request_cancelled_when_all_waiters_cancel(slow_cassette):
+    async def body(scraper, transport):
+        waiters = [asyncio.ensure_future(scraper.fetch_user_profile(unique_id='alice')) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        # 让被取消的请求任务执行完取消流程
+        await asyncio.sleep(0.3)
+        return transport.served, dict(scraper._inflight)
+
+    served, inflight = run_with_scraper(slow_cassette, body)
+    assert served == 0 and inflight == {}
+
+
+def test_aclose_cancels_inflight_requests(slow_cassette):
+    async def body(scraper, transport):
+        task = asyncio.ensure_future(scraper.fetch_user_profile(unique_id='bob'))
+        await asyncio.sleep(0.05)
+        await scraper.aclose()
+        return await asyncio.gather(task, return_exceptions=True), transport.served
+
+    (outcome,), served = run_with_scraper(slow_cassette, body)
+    assert isinstance(outcome, asyncio.CancelledError) and served == 0
@@ -0,0 +1,68 @@
+import random
+
+from sketches import HyperLogLog, KLLSketch, LiveStats
+
+
+def rank_error(values: list, estimate: float, q: float) -> float:
+    """估计值在精确排序中的位置与 q 的差"""
+    return abs(sum(1 for value in values if value <= estimate) / len(values) - q)
+
+
+def test_kll_merge_matches_single_sketch():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(8, 2) for _ in range(40000)]
+    shards = [KLLSketch(seed=i) for i in range(4)]
+    for i, value in enumerate(values):
+        shards[i % 4].update(value)
+
+    merged = KLLSketch(seed=9)
+    for shard in shards:
+        # 经过序列化（分片进程保存的 stats.json）后再合并
+        merged.merge(KLLSketch.from_dict(shard.to_dict()))
+
+    assert merged.count == len(values)
+    assert merged.min == min(values) and merged.max == max(values)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert rank_error(values, merged.quantile(q), q) < 0.02
+
+
+def test_kll_merge_into_empty():
+    sketch = KLLSketch()
+    for value in range(100):
+        sketch.update(value)
+    empty = KLLSketch()
+    empty.merge(sketch)
+    assert empty.count == 100 and empty.quantile(0.5) in range(45, 56)
+    sketch.merge(KLLSketch())
+    assert sketch.count == 100
+
+
+def test_hyperloglog_merge_counts_union():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(30000):
+        a.add(f"uid{i}")
+    for i in range(20000, 50000):
+        b.add(f"uid{i}")
+    a.merge(HyperLogLog.from_dict(b.to_dict()))
+    assert abs(a.count() - 50000) / 50000 < 0.05
+
+
+def test_live_stats_merge_across_shards():
+    rows = [
+        {'scrape_status': 'success', 'uid': str(i), 'follower_count': str(i), 'verified': 'Yes' if i % 10 == 0 else 'No',
+         'aweme_count': str(i % 3), 'visible_videos_count': '0'}
+        for i in range(1000)
+    ] + [{'scrape_status': 'failed'}] * 10
+    shards = [LiveStats(), LiveStats()]
+    for i, row in enumerate(rows):
+        shards[i % 2].update(row)
+
+    merged = LiveStats()
+    for shard in shards:
+        merged.merge(LiveStats.from_dict(shard.to_dict()))
+    summary = merged.summary()
+    assert summary['total'] == 1010 and summary['success'] == 1000
+    assert summary['verified_share'] == 0.1
+    assert merged.empty == 334 and merged.private == 666
+    assert abs(summary['distinct_uids'] - 1000) < 50
+    assert 450 <= summary['followers_p50'] <= 550
@@ -0,0 +1,95 @@
+import csv
+import random
+
+from text_index import TextIndex, decode_postings, encode_postings, tokenize
+
+FIELDS = ['username', 'uid', 'nickname', 'signature', 'bio_email', 'follower_count', 'scrape_status']
+
+
+def write_rows(path, rows, mode='w'):
+    with open(path, mode, encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if mode == 'w':
+            writer.writeheader()
+        for row in rows:
+            writer.writerow({'scrape_status': 'success', 'follower_count': 0, **row})
+
+
+def test_postings_round_trip():
+    rng = random.Random(7)
+    doc_ids = sorted(rng.sample(range(1, 10 ** 9), 5000))
+    for ids in ([], [1], [127, 128, 16383, 16384, 2 ** 35], doc_ids):
+        assert decode_postings(encode_postings(ids)) == ids
+    # 小间隔的差值编码为单字节
+    assert len(encode_postings(list(range(1, 1001)))) == 1000
+
+
+def test_tokenize_variants_and_cjk():
+    tokens = tokenize('Phương 北京烤鸭 shop@gmail.com')
+    assert {'phương', 'phuong', '北京', '烤鸭', '京', 'gmail.com', 'shop@gmail.com'} <= set(tokens)
+    # 查询: 多字只用二元组，单字用单字
+    assert tokenize('北京', variants=False) == ['北京']
+    assert tokenize('京', variants=False) == ['京']
+
+
+def test_incremental_add_and_multiline_records(tmp_path):
+    csv_path = tmp_path / 'users.csv'
+    write_rows(csv_path, [
+        {'username': 'a', 'uid': '1', 'nickname': '北京烤鸭', 'signature': '第一行\n第二行 contact me'},
+        {'username': 'b', 'uid': '2', 'nickname': 'Bob', 'bio_email': 'bob@gmail.com'}
+    ])
+    index = TextIndex(str(tmp_path / 'index.db'))
+    assert index.add_csv(str(csv_path)) == 2
+    assert index.add_csv(str(csv_path)) == 0
+    assert index.search('第二行 contact')[0] == 1
+    assert index.search('京')[0] == 1
+    assert index.search('gmail.com')[1][0]['username'] == 'b'
+
+    # 追加的行增量索引；同一用户的新记录替换旧记录
+    write_rows(csv_path, [{'username': 'b', 'uid': '2', 'nickname': 'Bobby'}], mode='a')
+    assert index.add_csv(str(csv_path)) == 1
+    assert [row['nickname'] for row in index.search('bobby')[1]] == ['Bobby']
+    assert index.search('gmail.com')[1] == []
+    index.optimize()
+    assert index.search('北京')[0] == 1
+    index.close()
+
+
+def test_incomplete_last_record_is_read_later(tmp_path):
+    csv_path = tmp_path / 'users.csv'
+    write_rows(csv_path, [{'username': 'a', 'uid': '1', 'nickname': 'alpha'}])
+    with open(csv_path, 'a', encoding='utf-8') as f:
+        f.write('c,3,carol,"still\n')
+    index = TextIndex(str(tmp_path / 'index.db'))
+    assert index.add_csv(str(csv_path)) == 1
+    with open(csv_path, 'a', encoding='utf-8') as f:
+        f.write('writing",,0,success\n')
+    assert index.add_csv(str(csv_path)) == 1
+    assert index.search('carol')[1][0]['signature'] == 'still\nwriting'
+    index.close()
+
+
+def test_compressed_source(tmp_path):
+    from compressed_io import open_text
+
+    csv_path = tmp_path / 'users.csv.gz'
+    with open_text(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerow({'username': 'a', 'uid': '1', 'nickname': 'alpha', 'scrape_status': 'success'})
+    index = TextIndex(str(tmp_path / 'index.db'))
+    assert index.add_csv(str(csv_path)) == 1
+
+    # 追加写入新的 gzip 成员，只索引新增的行
+    with open_text(csv_path, 'a', newline='') as f:
+        csv.DictWriter(f, fieldnames=FIELDS).writerow({'username': 'b', 'uid': '2', 'nickname': 'beta', 'scrape_status': 'success'})
+    assert index.add_csv(str(csv_path)) == 1
+    assert index.search('beta')[0] == 1
+
+    # 重写后从头索引
+    with open_text(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerow({'username': 'c', 'uid': '3', 'nickname': 'gamma', 'scrape_status': 'success'})
+    assert index.add_csv(str(csv_path)) == 1
+    index.close()
@@ -0,0 +1,105 @@
+import asyncio
+import csv
+import json
+
+import httpx
+import pytest
+
+import scrape_user_tikhub
+from cassette import ReplayTransport
+from schema import CSV_FIELDS
+from scrape_user_tikhub import POSTS_PAGE_SIZE
+from scrape_user_videos import CursorStore, scrape_users_videos
+
+POSTS_PATH = '/api/v1/tiktok/app/v3/fetch_user_post_videos'
+SEC_UID = 'MS4wLjABAAAA'
+
+
+def page(times: list, max_cursor: int, has_more: bool, top: list = ()) -> dict:
+    """作品列表的一页，aweme_id 取发布时间"""
+    items = [{'aweme_id': str(t), 'create_time': t, 'desc': f'post {t}', 'is_top': 1} for t in top]
+    items += [{'aweme_id': str(t), 'create_time': t, 'desc': f'post {t}'} for t in times]
+    return {'code': 200, 'data': {'aweme_list': items, 'max_cursor': max_cursor, 'has_more': has_more}}
+
+
+def posts_cassette(record_cassette, name: str, pages: dict, failures: dict = None):
+    """按 cursor 录制作品列表；failures 为 {cursor: 先返回的错误状态码}"""
+    failures = dict(failures or {})
+
+    def handler(request):
+        cursor = int(request.url.params['max_cursor'])
+        if failures.pop(cursor, None):
+            return httpx.Response(503, text='busy')
+        return httpx.Response(200, json=pages[cursor])
+
+    requests = []
+    for cursor in pages:
+        params = {'sec_user_id': SEC_UID, 'max_cursor': str(cursor), 'count': str(POSTS_PAGE_SIZE)}
+        requests += [(POSTS_PATH, params)] * (2 if cursor in failures else 1)
+    return record_cassette(handler, requests, name=name)
+
+
+@pytest.fixture
+def run_videos(tmp_path, monkeypatch):
+    """用回放的 cassette 运行一次 scrape_users_videos，返回本次新写入的作品发布时间"""
+    monkeypatch.setattr(scrape_user_tikhub, 'RETRY_BACKOFF', 0.0)
+    users_csv = tmp_path / 'users.csv'
+    with open(users_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, restval='')
+        writer.writeheader()
+        writer.writerow({'username': 'alice', 'sec_uid': SEC_UID, 'uid': '1', 'scrape_status': 'success'})
+    output = tmp_path / 'posts.jsonl'
+    written = []
+
+    def run(cassette_path, max_pages: int) -> list:
+        before = len(written)
+        asyncio.run(scrape_users_videos(
+            str(users_csv), str(output), api_token='replay', max_pages=max_pages,
+            transport=ReplayTransport(cassette_path, speed=None, strict=True),
+            ledger_file=str(tmp_path / 'ledger.json')
+        ))
+        with open(output, encoding='utf-8') as f:
+            written[:] = [int(json.loads(line)['aweme_id']) for line in f]
+        return written[before:]
+
+    run.state = lambda: CursorStore(str(tmp_path / 'posts.jsonl.cursors.db')).get(SEC_UID)
+    return run
+
+
+def test_backfill_resumes_from_saved_cursor(record_cassette, run_videos):
+    feed = posts_cassette(record_cassette, 'feed.jsonl.gz', {
+        0: page([600, 500], 500, True),
+        500: page([400, 300], 300, True),
+        300: page([200, 100], 0, False)
+    })
+    assert run_videos(feed, max_pages=2) == [600, 500, 400, 300]
+    state = run_videos.state()
+    assert state == {'newest': 600, 'cursor': 300, 'complete': False, 'posts': 4}
+
+    # 第二次运行: 第一页没有新作品，沿保存的 cursor 回填到最后一页
+    assert run_videos(feed, max_pages=2) == [200, 100]
+    assert run_videos.state()['complete']
+
+
+def test_refresh_fetches_only_new_posts(record_cassette, run_videos):
+    first = posts_cassette(record_cassette, 'first.jsonl.gz', {0: page([500, 400], 0, False)})
+    assert run_videos(first, max_pages=3) == [500, 400]
+
+    # 之后发布了两个新作品，置顶的旧作品不会让刷新提前停止
+    later = posts_cassette(record_cassette, 'later.jsonl.gz', {
+        0: page([700], 700, True, top=[100]),
+        700: page([600, 500], 500, True)
+    })
+    assert run_videos(later, max_pages=3) == [700, 600]
+    state = run_videos.state()
+    assert state['newest'] == 700 and state['complete'] and state['posts'] == 4
+
+
+def test_transient_error_retried(record_cassette, run_videos):
+    feed = posts_cassette(
+        record_cassette, 'flaky.jsonl.gz',
+        {0: page([300, 200], 200, True), 200: page([100], 0, False)},
+        failures={200: 503}
+    )
+    assert run_videos(feed, max_pages=5) == [300, 200, 100]
+    assert run_videos.state()['complete']